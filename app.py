@@ -14,22 +14,54 @@ import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import json
 import os
+import time
+import functools
 
 # Import our helper functions
 from utils_helpers import (
-    fetch_citizen_requests,
-    fetch_infrastructure_assets,
-    fetch_health_surveillance,
+    fetch_query,
     get_request_by_id,
+    fetch_requests_page,
+    search_request_ids,
     insert_citizen_request,
     save_prediction_log,
     analyze_complaint_with_gemini,
+    stream_complaint_analysis,
+    stream_complaint_details,
+    get_fallback_prediction,
     forecast_demand_with_gemini,
     anonymize_citizen_data,
     check_data_compliance,
     log_user_action,
-    calculate_priority_score,
-    get_statistics_summary
+    get_statistics_summary,
+    fetch_log_rows,
+    delete_log_rows
+)
+from search_helpers import ComplaintSearchIndex
+from dedup_helpers import IncidentIndex
+from priority_helpers import PriorityIndex, score_frame
+from routing_helpers import RoutingScheduler, route_department
+from query_helpers import REQUESTS_QUERY, HIGH_RISK_INFRASTRUCTURE_QUERY, HEALTH_ALERTS_QUERY
+from cache_helpers import VersionedCache, BackgroundRefresher, upsert_frame_rows
+from retention_helpers import ParquetArchive, RetentionEngine, RETAINED_TABLES
+from chart_helpers import cached_figure, downsample_lttb
+from gemini_helpers import gemini_admission
+from cascade_helpers import AnalysisCascade, history_frame, prediction_row, CASCADE_ENABLED, CASCADE_HISTORY_DAYS
+from model_helpers import load_models, MODEL_PATH
+from preanalysis_helpers import PreAnalysisQueue
+from realtime_helpers import ChangeFeed, LiveDataset, start_change_feed, LIVE_SESSION_SECONDS, LIVE_WAIT_SECONDS
+from metrics_helpers import (
+    span,
+    increment,
+    set_gauge,
+    gauge_values,
+    sum_counter,
+    histogram_summary,
+    export_prometheus,
+    export_otel_json,
+    reset_metrics,
+    metrics_started_at,
+    write_metrics_file
 )
 
 
@@ -179,33 +211,23 @@ with st.sidebar:
             "⚡ Dynamic Prioritization",
             "📝 Citizen Portal",
             "🔒 Privacy & Security",
-            "📈 GaaS Transparency"
+            "📈 GaaS Transparency",
+            "🩺 Performance Diagnostics"
         ],
         label_visibility="collapsed"
     )
     
     st.markdown("---")
     
-    # System status
+    # System status (filled in once data has loaded, from measured metrics)
     st.markdown("### 🔧 System Status")
-    st.success("✅ Google Gemini AI: Active")
-    st.success("✅ Vertex AI: Operational")
-    st.success("✅ BigQuery: Connected")
-    st.info("🔒 Cloud IAM: Secured")
+    system_status = st.container()
     
     st.markdown("---")
     
-    # Quick stats
+    # Quick stats (filled in once data has loaded, from the cached requests)
     st.markdown("### 📊 Quick Stats")
-    
-    try:
-        stats = get_statistics_summary()
-        if stats:
-            st.metric("Active Requests", stats.get('total_requests', 0))
-            st.metric("Critical Cases", stats.get('critical_requests', 0))
-            st.metric("Citizens Impacted", f"{stats.get('total_affected', 0):,}")
-    except:
-        st.metric("Active Requests", "Loading...")
+    quick_stats = st.container()
     
     st.markdown("---")
     
@@ -215,28 +237,441 @@ with st.sidebar:
     st.caption("🏛️ Maharashtra State Government")
 
 # ==================== LOAD DATA ====================
-@st.cache_data(ttl=300)  # Cache for 5 minutes
+def load_requests_table():
+    """Citizen requests with naive timestamps and days_open"""
+    requests_df = fetch_query(REQUESTS_QUERY, raise_errors=True)
+    
+    # Add days_open column with FIXED timezone handling
+    if not requests_df.empty:
+        # Remove timezone info from date_submitted
+        requests_df['date_submitted'] = pd.to_datetime(requests_df['date_submitted']).dt.tz_localize(None)
+        requests_df['resolved_date'] = pd.to_datetime(requests_df['resolved_date']).dt.tz_localize(None)
+        # Now calculate days_open
+        requests_df['days_open'] = (datetime.now() - requests_df['date_submitted']).dt.days
+    return requests_df
+
+def measured(dataset, loader):
+    """Wrap a loader so every load records its size for the diagnostics page"""
+    def load():
+        df = loader()
+        set_gauge('dataset_rows', len(df), dataset=dataset)
+        set_gauge('dataset_memory_bytes', int(df.memory_usage(deep=True).sum()), dataset=dataset)
+        return df
+    return load
+
+DATASETS = [REQUESTS_QUERY.name, HIGH_RISK_INFRASTRUCTURE_QUERY.name, HEALTH_ALERTS_QUERY.name]
+
+@st.cache_resource
+def get_data_cache():
+    """Datasets shared by every session, each refreshed, invalidated and patched on its own"""
+    cache = VersionedCache()
+    # Loaders raise on backend errors so a failed reload never replaces good data with empty frames.
+    # Timeouts cap how long a cold start waits on each table before rendering without it.
+    cache.register('citizen_requests', measured('citizen_requests', load_requests_table), ttl=300, timeout=30)
+    for spec in [HIGH_RISK_INFRASTRUCTURE_QUERY, HEALTH_ALERTS_QUERY]:
+        cache.register(spec.name, measured(spec.name, functools.partial(fetch_query, spec, raise_errors=True)),
+                       ttl=300, timeout=15)
+    # Reload on a schedule so readers are always served a ready snapshot
+    BackgroundRefresher(cache).start()
+    return cache
+
 def load_all_data():
-    """Load all data from BigQuery with caching"""
-    try:
-        requests_df = fetch_citizen_requests()
-        infrastructure_df = fetch_infrastructure_assets()
-        health_df = fetch_health_surveillance()
-        
-        # Add days_open column with FIXED timezone handling
-        if not requests_df.empty:
-            # Remove timezone info from date_submitted
-            requests_df['date_submitted'] = pd.to_datetime(requests_df['date_submitted']).dt.tz_localize(None)
-            # Now calculate days_open
-            requests_df['days_open'] = (datetime.now() - requests_df['date_submitted']).dt.days
-        
-        return requests_df, infrastructure_df, health_df
-    except Exception as e:
-        st.error(f"Error loading data: {e}")
-        return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
+    """
+    Load all data from BigQuery through the shared versioned cache. The
+    three tables load concurrently on a cold start, and a table that misses
+    its timeout is left out of this run while it finishes loading. After
+    that this never waits on BigQuery: expired datasets are served as is
+    while they reload, and failed reloads keep the last good one.
+    """
+    loaded = data_cache.get_many(DATASETS)
+    frames = []
+    for dataset in DATASETS:
+        df = loaded[dataset]
+        if df is None:
+            if data_cache.last_error(dataset):
+                st.error(f"Error loading {dataset}: {data_cache.last_error(dataset)}")
+            else:
+                st.warning(f"⏳ {dataset} is still loading; showing everything else for now")
+            df = pd.DataFrame()
+        frames.append(df)
+    return tuple(frames)
 
 # Load data
-requests_df, infrastructure_df, health_df = load_all_data()
+data_cache = get_data_cache()
+with span('data_load', cache='load_all_data'):
+    requests_df, infrastructure_df, health_df = load_all_data()
+
+@st.cache_data(ttl=60)
+def load_requests_page(filters, cursor, page_size=25):
+    """One page of the request browser, filtered and paginated in BigQuery"""
+    return fetch_requests_page(filters, cursor, page_size)
+
+@st.cache_data(ttl=60)
+def lookup_request_ids(prefix):
+    """Request IDs matching a typed prefix, for the searchable ID picker"""
+    return search_request_ids(prefix)
+
+@st.cache_data(ttl=300)
+def load_request(request_id):
+    """Single request by ID with days_open filled in"""
+    request = get_request_by_id(request_id)
+    if request:
+        submitted = pd.Timestamp(request['date_submitted'])
+        if submitted.tzinfo is not None:
+            submitted = submitted.tz_localize(None)
+        request['days_open'] = (datetime.now() - submitted).days
+    return request
+
+@st.cache_resource
+def get_search_index():
+    """Complaint search index shared by every session in this process"""
+    return ComplaintSearchIndex()
+
+@st.cache_resource
+def get_incident_index():
+    """Near-duplicate complaint clusters shared by every session in this process"""
+    return IncidentIndex()
+
+@st.cache_resource
+def get_incident_analyses():
+    """Gemini analyses keyed by incident ID (request ID outside incidents), reused for every duplicate report"""
+    return {}
+
+@st.cache_resource
+def get_priority_index():
+    """Open incidents ranked by priority score, shared by every session"""
+    return PriorityIndex()
+
+@st.cache_resource
+def get_routing_scheduler():
+    """Team assignments, open loads and resolution speeds, shared by every session"""
+    return RoutingScheduler()
+
+# Indexes only resync after a full reload; writes reach them through the change feed
+snapshot_version = data_cache.loaded_at('citizen_requests')
+search_index = get_search_index()
+search_index.sync(requests_df, version=snapshot_version)
+incident_index = get_incident_index()
+incident_index.sync(requests_df, version=snapshot_version)
+priority_index = get_priority_index()
+if priority_index.synced_version != snapshot_version or snapshot_version is None:
+    priority_index.sync(((incident['incident_id'], incident)
+                         for incident in incident_index.incidents_frame().to_dict('records')),
+                        version=snapshot_version)
+routing_scheduler = get_routing_scheduler()
+routing_scheduler.sync(requests_df, version=snapshot_version)
+
+def apply_request_change(event, search_index, incident_index, priority_index, routing_scheduler):
+    """Apply one citizen request change to the shared indexes (runs on the publishing thread)"""
+    record = event['record']
+    request_id = record.get('request_id')
+    if event['type'] == 'DELETE':
+        search_index.remove(request_id)
+        return
+    search_index.add(record)
+    incident_id = incident_index.assign(record)
+    priority_index.upsert(incident_id, incident_index.incident(incident_id))
+    if routing_scheduler.assignment(request_id):
+        routing_scheduler.update_status(request_id, record.get('status'), record.get('resolved_date'))
+    elif (record.get('status') or 'Open') != 'Resolved':
+        routing_scheduler.assign(record)
+
+@st.cache_resource
+def get_live_dataset():
+    """Snapshot plus live changes behind the dashboard KPIs and alerts"""
+    return LiveDataset()
+
+def apply_dataset_change(event, data_cache):
+    """Patch the cached requests frame with one change instead of reloading it"""
+    data_cache.patch('citizen_requests', functools.partial(
+        upsert_frame_rows, records=[event['record']], delete=event['type'] == 'DELETE'))
+
+@st.cache_resource
+def get_change_feed():
+    """Change feed applying inserts and updates to the shared indexes as they happen"""
+    feed = ChangeFeed()
+    feed.subscribe(functools.partial(apply_dataset_change, data_cache=get_data_cache()), table='citizen_requests')
+    feed.subscribe(functools.partial(apply_request_change, search_index=get_search_index(),
+                                     incident_index=get_incident_index(), priority_index=get_priority_index(),
+                                     routing_scheduler=get_routing_scheduler()),
+                   table='citizen_requests')
+    feed.subscribe(get_live_dataset().apply, table='citizen_requests')
+    start_change_feed(feed)
+    return feed
+
+# Changes received since the snapshot was loaded are applied on top of it
+change_feed = get_change_feed()
+live_dataset = get_live_dataset()
+live_dataset.rebase(requests_df, snapshot_version)
+
+@st.cache_resource
+def get_retention_engine():
+    """Reads the log tables across the live rows and the archive (passes run from run_retention.py)"""
+    return RetentionEngine(ParquetArchive(), fetch_log_rows, delete_log_rows)
+
+retention_engine = get_retention_engine()
+
+@st.cache_resource
+def get_request_models(modified_at):
+    """Trained resolution-time and escalation models, reloaded when train_models.py saves a new file"""
+    return load_models(MODEL_PATH)
+
+def current_request_models():
+    """The latest trained request models, or None before the first training run"""
+    if not os.path.exists(MODEL_PATH):
+        return None
+    return get_request_models(os.path.getmtime(MODEL_PATH))
+
+def local_prediction(complaint):
+    """Rule-based prediction, with resolution days and escalation risk from the trained models when present"""
+    prediction = get_fallback_prediction(complaint)
+    models = current_request_models()
+    return models.refine(prediction, complaint) if models else prediction
+
+PRIORITY_EMOJI = {'Critical': '🔴', 'High': '🟠', 'Medium': '🟡', 'Low': '🟢'}
+
+def render_prediction_metrics(prediction):
+    """Urgency, escalation risk, priority and resolution time; fields not parsed yet show as pending"""
+    pending = "…"
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("🎯 Urgency Score", f"{prediction['urgency_score']:.1f}/10" if 'urgency_score' in prediction else pending)
+    with col2:
+        st.metric("⚠️ Escalation Risk", f"{prediction['escalation_risk_percent']}%"
+                  if 'escalation_risk_percent' in prediction else pending)
+    with col3:
+        priority = prediction.get('predicted_priority')
+        st.metric("📊 AI Priority", f"{PRIORITY_EMOJI.get(priority, '⚪')} {priority}" if priority else pending)
+    with col4:
+        st.metric("⏱️ Est. Resolution", f"{prediction['estimated_resolution_days']} days"
+                  if 'estimated_resolution_days' in prediction else pending)
+
+def render_prediction_details(prediction):
+    """Narrative fields of an analysis; fields not written yet show as pending"""
+    pending = "…"
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("### 🔧 Resource Requirements")
+        st.markdown(f"<div class='info-card'>{prediction.get('resource_requirements') or pending}</div>", unsafe_allow_html=True)
+    with col2:
+        st.markdown("### 🧠 AI Reasoning")
+        st.write(prediction.get('reasoning') or pending)
+        st.markdown("### 📊 Impact Analysis")
+        st.warning(prediction.get('impact_analysis') or pending)
+    st.markdown("### 🔄 Similar Patterns Identified")
+    st.info(prediction.get('similar_patterns') or pending)
+    st.markdown("### 🛡️ Prevention Measures")
+    st.info(prediction.get('prevention_measures') or pending)
+
+def load_prediction_history():
+    """
+    Recent Gemini predictions joined to their requests, for fitting the
+    cascade. Reads requests from the shared cache, not this session's
+    frame, so pre-analysis workers can refit too.
+    """
+    predictions = fetch_log_rows('predictions_log', start=datetime.now() - timedelta(days=CASCADE_HISTORY_DAYS))
+    return history_frame(predictions, data_cache.get('citizen_requests'))
+
+@st.cache_resource
+def get_analysis_cascade():
+    """Local-first complaint analysis shared by every session, refitted hourly from predictions_log"""
+    return AnalysisCascade(local_prediction, analyze_complaint_with_gemini, load_prediction_history)
+
+def load_backlog_predictions(models):
+    """Resolution time and escalation risk of every open request, recomputed when requests or the models change"""
+    def compute(requests_df):
+        started = time.perf_counter()
+        backlog = requests_df[requests_df['status'].astype(str) != 'Resolved']
+        predicted = backlog[['request_id', 'complaint_type', 'city', 'severity', 'affected_count', 'days_open']].join(
+            models.predict(backlog))
+        predicted['days_remaining'] = (predicted['predicted_resolution_days'] - predicted['days_open']).round(1)
+        return predicted.sort_values('escalation_risk_percent', ascending=False), time.perf_counter() - started
+    return data_cache.derive(f"backlog_predictions:{models.metadata['trained_at']}", ['citizen_requests'], compute)
+
+analysis_cascade = get_analysis_cascade()
+
+def preanalyze(cascade, complaint):
+    """Background analysis of one submission, refitting the cascade first when it is stale"""
+    cascade.refresh()
+    return cascade.analyze(complaint, enabled=CASCADE_ENABLED)
+
+def persist_preanalysis(request_id, prediction):
+    """Log a background analysis like one an officer generated"""
+    save_prediction_log(prediction_row(request_id, prediction))
+    log_user_action("AI Prediction Generated", "System", request_id)
+
+@st.cache_resource
+def get_preanalysis_queue():
+    """Background analysis of new High and Critical submissions, fed by the change feed"""
+    incident_index = get_incident_index()
+    queue = PreAnalysisQueue(functools.partial(preanalyze, get_analysis_cascade()),
+                             persist_preanalysis, get_incident_analyses(), incident_index.incident_of,
+                             incident_index.incident)
+    get_change_feed().subscribe(queue.on_change, table='citizen_requests')
+    return queue
+
+preanalysis_queue = get_preanalysis_queue()
+
+def load_priority_analytics():
+    """Scores for the analytics charts, recomputed only when requests change (or the day rolls over)"""
+    def compute(requests_df):
+        frame = incident_index.incidents_frame()
+        if not frame.empty:
+            frame['priority_score'] = score_frame(frame)
+        return frame
+    return data_cache.derive(f"priority_analytics:{datetime.now().date()}", ['citizen_requests'], compute)
+
+# Sidebar quick stats from the cached frame instead of refetching the table on every rerun
+with quick_stats:
+    with span('page_section', page='Sidebar', section='quick_stats'):
+        stats = data_cache.derive('statistics_summary', ['citizen_requests'], get_statistics_summary)
+    if stats:
+        st.metric("Active Requests", stats.get('total_requests', 0))
+        st.metric("Critical Cases", stats.get('critical_requests', 0))
+        st.metric("Citizens Impacted", f"{stats.get('total_affected', 0):,}")
+    else:
+        st.metric("Active Requests", "Loading...")
+
+# System status from measured data instead of fixed labels
+with system_status:
+    query_errors = sum_counter('backend_query_errors_total', backend='bigquery')
+    query_latency = histogram_summary('backend_query_seconds', backend='bigquery', table='citizen_requests')
+    if requests_df.empty:
+        st.error(f"❌ BigQuery: No data ({query_errors} query errors)")
+    elif query_latency:
+        st.success(f"✅ BigQuery: Connected (p50 {query_latency[0]['p50'] * 1000:.0f} ms)")
+    else:
+        st.success("✅ BigQuery: Connected")
+    
+    gemini_calls = sum(s['count'] for s in histogram_summary('gemini_call_seconds'))
+    gemini_fallbacks = sum_counter('gemini_fallback_total')
+    if gemini_calls == 0:
+        st.info("🤖 Gemini AI: No calls yet")
+    elif gemini_fallbacks / gemini_calls > 0.2:
+        st.warning(f"⚠️ Gemini AI: {gemini_fallbacks / gemini_calls:.0%} fallback rate")
+    else:
+        st.success(f"✅ Gemini AI: Active ({gemini_calls} calls)")
+    
+    failed = [entry for entry in data_cache.describe() if entry['last_error'] and entry['generation']]
+    if failed:
+        st.warning(f"⚠️ Refresh failing for {', '.join(entry['dataset'] for entry in failed)}; serving last good data")
+    
+    snapshot_ts = data_cache.loaded_at('citizen_requests')
+    if snapshot_ts:
+        st.caption(f"🕒 Data snapshot age: {(datetime.now().timestamp() - snapshot_ts) / 60:.1f} min")
+
+def render_kpis(kpis):
+    """Dashboard KPI row"""
+    col1, col2, col3, col4, col5 = st.columns(5)
+    total_requests = kpis['total_requests']
+    with col1:
+        st.metric("Total Requests", f"{total_requests}", delta="+15% vs last week")
+    with col2:
+        st.metric("Open Cases", kpis['open_requests'],
+                  delta=f"{(kpis['open_requests']/total_requests*100):.0f}%" if total_requests else None)
+    with col3:
+        st.metric("🚨 Critical", kpis['critical_requests'], delta="+2 today", delta_color="inverse")
+    with col4:
+        st.metric("Avg Affected", f"{kpis['avg_affected']}")
+    with col5:
+        st.metric("Total Impacted", f"{kpis['total_affected']:,}")
+
+def render_critical_alerts(alerts):
+    """Newest critical requests as alert cards"""
+    for req in alerts:
+        days_open = (datetime.now() - pd.Timestamp(req['date_submitted']).to_pydatetime()).days
+        st.markdown(f"""
+        <div class="alert-critical">
+            <strong style='font-size: 1.1em;'>🔴 CRITICAL: {req['complaint_type']}</strong><br>
+            <strong>ID:</strong> {req['request_id']} | <strong>Location:</strong> {req['city']}, {req['ward']}<br>
+            <strong>Description:</strong> {str(req['description'])[:150]}...<br>
+            👥 <strong>{int(req['affected_count']):,} citizens affected</strong> | 
+            🏢 <strong>{req['department']}</strong> | 
+            ⏱️ <strong>Open for {days_open} days</strong>
+        </div>
+        """, unsafe_allow_html=True)
+
+# ==================== FIGURES ====================
+# Built once per citizen_requests version and shared by every session
+
+def show_figure(name, build):
+    """Render a request figure from the shared figure cache"""
+    st.plotly_chart(cached_figure(data_cache, name, ['citizen_requests'], build), use_container_width=True)
+
+def requests_by_type_figure(requests_df):
+    type_counts = requests_df['complaint_type'].value_counts()
+    fig = px.pie(values=type_counts.values, names=type_counts.index, 
+                 title="Request Distribution", hole=0.4,
+                 color_discrete_sequence=px.colors.qualitative.Set3)
+    fig.update_traces(textposition='inside', textinfo='percent+label')
+    return fig
+
+def requests_by_city_figure(requests_df):
+    city_data = requests_df.groupby('city').agg({'request_id': 'count', 'affected_count': 'sum'}).reset_index()
+    city_data.columns = ['City', 'Requests', 'Total Affected']
+    fig = px.bar(city_data, x='City', y='Requests', color='Total Affected',
+                 title="Requests by City", color_continuous_scale='Reds', text='Requests')
+    fig.update_traces(textposition='outside')
+    return fig
+
+def department_workload_figure(requests_df):
+    # Count incidents, not the duplicate reports inside them
+    incidents_df = incident_index.incidents_frame(open_only=True)
+    dept_data = incidents_df['department'].value_counts().head(6) if not incidents_df.empty else pd.Series(dtype=int)
+    fig = px.bar(x=dept_data.values, y=dept_data.index, orientation='h',
+                 title="Active Incidents by Department", color=dept_data.values,
+                 color_continuous_scale='Blues', text=dept_data.values)
+    fig.update_traces(textposition='outside')
+    fig.update_layout(showlegend=False)
+    return fig
+
+def severity_figure(requests_df):
+    severity_counts = requests_df['severity'].value_counts()
+    colors_map = {'Critical': '#dc2626', 'High': '#f59e0b', 'Medium': '#3b82f6', 'Low': '#10b981'}
+    fig = go.Figure(data=[go.Bar(x=severity_counts.index, y=severity_counts.values,
+                                 marker_color=[colors_map.get(x, '#6b7280') for x in severity_counts.index],
+                                 text=severity_counts.values, textposition='outside')])
+    fig.update_layout(title="Cases by Severity", showlegend=False)
+    return fig
+
+def daily_volume_figure(requests_df):
+    daily_data = requests_df.groupby(requests_df['date_submitted'].dt.date).size().reset_index(name='count')
+    # Long ranges are thinned server-side; markers only while points stay readable
+    daily_data = downsample_lttb(daily_data, 'date_submitted', 'count')
+    fig = px.line(daily_data, x='date_submitted', y='count', title="Daily Request Volume",
+                  markers=len(daily_data) <= 60, line_shape='spline')
+    fig.update_traces(line_color='#3b82f6', line_width=3)
+    return fig
+
+def resolution_trend_figure(requests_df):
+    resolved_df = requests_df[requests_df['status'] == 'Resolved'].copy()
+    resolved_df['month'] = pd.to_datetime(resolved_df['date_submitted']).dt.to_period('M').astype(str)
+    monthly_avg = resolved_df.groupby('month')['days_open'].mean().reset_index()
+    fig = px.line(monthly_avg, x='month', y='days_open', 
+                  title="Average Resolution Time Trend",
+                  markers=True, line_shape='spline')
+    fig.update_traces(line_color='#10b981', line_width=3)
+    fig.update_layout(yaxis_title="Days", xaxis_title="Month")
+    return fig
+
+def department_performance_figure(requests_df):
+    dept_performance = requests_df.groupby('department').agg({
+        'request_id': 'count',
+        'days_open': 'mean'
+    }).reset_index()
+    dept_performance.columns = ['Department', 'Total Cases', 'Avg Days']
+    return px.scatter(dept_performance, x='Total Cases', y='Avg Days', 
+                      size='Total Cases', color='Avg Days',
+                      hover_data=['Department'],
+                      title="Department Performance Matrix",
+                      color_continuous_scale='RdYlGn_r')
+
+# Set on the dashboard when the session wants pushed updates
+live_updates = False
+
+# Time the whole page render (label without the emoji prefix)
+page_name = page.split(' ', 1)[-1]
+page_span = span('page_render', page=page_name).start()
 
 
 # ==================== PAGE 1: EXECUTIVE DASHBOARD ====================
@@ -247,101 +682,118 @@ if page == "📊 Executive Dashboard":
     if requests_df.empty:
         st.warning("⚠️ No data available. Please check BigQuery connection.")
     else:
-        # KPI Metrics Row
-        col1, col2, col3, col4, col5 = st.columns(5)
+        live_col1, live_col2 = st.columns([1, 3])
+        with live_col1:
+            live_updates = st.toggle("🔴 Live updates", value=False,
+                                     help="Push new submissions and status changes to this page as they happen")
+        with live_col2:
+            live_status = st.empty()
         
-        total_requests = len(requests_df)
-        open_requests = len(requests_df[requests_df['status'] == 'Open'])
-        critical_requests = len(requests_df[requests_df['severity'] == 'Critical'])
-        total_affected = int(requests_df['affected_count'].sum())
-        avg_affected = int(requests_df['affected_count'].mean())
+        # Seen before rendering, so nothing published meanwhile is missed by the live loop
+        live_seq = change_feed.latest_seq
         
-        with col1:
-            st.metric("Total Requests", f"{total_requests}", delta="+15% vs last week")
-        with col2:
-            st.metric("Open Cases", open_requests, delta=f"{(open_requests/total_requests*100):.0f}%")
-        with col3:
-            st.metric("🚨 Critical", critical_requests, delta="+2 today", delta_color="inverse")
-        with col4:
-            st.metric("Avg Affected", f"{avg_affected}")
-        with col5:
-            st.metric("Total Impacted", f"{total_affected:,}")
+        with span('page_section', page=page_name, section='kpis'):
+            # KPI Metrics Row (kept up to date incrementally by the live dataset)
+            kpi_placeholder = st.empty()
+            with kpi_placeholder.container():
+                render_kpis(live_dataset.kpis())
         
-        st.markdown("---")
+            st.markdown("---")
         
         # Critical Alerts
         st.subheader("🚨 Real-Time Critical Alerts")
-        critical_df = requests_df[requests_df['severity'] == 'Critical'].head(3)
-        
-        for _, req in critical_df.iterrows():
-            st.markdown(f"""
-            <div class="alert-critical">
-                <strong style='font-size: 1.1em;'>🔴 CRITICAL: {req['complaint_type']}</strong><br>
-                <strong>ID:</strong> {req['request_id']} | <strong>Location:</strong> {req['city']}, {req['ward']}<br>
-                <strong>Description:</strong> {req['description'][:150]}...<br>
-                👥 <strong>{req['affected_count']:,} citizens affected</strong> | 
-                🏢 <strong>{req['department']}</strong> | 
-                ⏱️ <strong>Open for {req['days_open']} days</strong>
-            </div>
-            """, unsafe_allow_html=True)
+        with span('page_section', page=page_name, section='critical_alerts'):
+            alerts_placeholder = st.empty()
+            with alerts_placeholder.container():
+                render_critical_alerts(live_dataset.critical_alerts())
         
         st.markdown("---")
         
-        # Visualizations
-        col1, col2 = st.columns(2)
+        with span('page_section', page=page_name, section='charts'):
+            # Visualizations
+            col1, col2 = st.columns(2)
         
-        with col1:
-            st.subheader("📊 Requests by Type")
-            type_counts = requests_df['complaint_type'].value_counts()
-            fig1 = px.pie(values=type_counts.values, names=type_counts.index, 
-                         title="Request Distribution", hole=0.4,
-                         color_discrete_sequence=px.colors.qualitative.Set3)
-            fig1.update_traces(textposition='inside', textinfo='percent+label')
-            st.plotly_chart(fig1, use_container_width=True)
+            with col1:
+                st.subheader("📊 Requests by Type")
+                show_figure('requests_by_type', requests_by_type_figure)
         
-        with col2:
-            st.subheader("🗺️ Geographic Distribution")
-            city_data = requests_df.groupby('city').agg({'request_id': 'count', 'affected_count': 'sum'}).reset_index()
-            city_data.columns = ['City', 'Requests', 'Total Affected']
-            fig2 = px.bar(city_data, x='City', y='Requests', color='Total Affected',
-                         title="Requests by City", color_continuous_scale='Reds', text='Requests')
-            fig2.update_traces(textposition='outside')
-            st.plotly_chart(fig2, use_container_width=True)
+            with col2:
+                st.subheader("🗺️ Geographic Distribution")
+                show_figure('requests_by_city', requests_by_city_figure)
         
-        col1, col2 = st.columns(2)
+            col1, col2 = st.columns(2)
         
-        with col1:
-            st.subheader("⏱️ Department Workload")
-            dept_data = requests_df['department'].value_counts().head(6)
-            fig3 = px.bar(x=dept_data.values, y=dept_data.index, orientation='h',
-                         title="Active Cases by Department", color=dept_data.values,
-                         color_continuous_scale='Blues', text=dept_data.values)
-            fig3.update_traces(textposition='outside')
-            fig3.update_layout(showlegend=False)
-            st.plotly_chart(fig3, use_container_width=True)
+            with col1:
+                st.subheader("⏱️ Department Workload")
+                show_figure('department_workload', department_workload_figure)
         
-        with col2:
-            st.subheader("📈 Severity Breakdown")
-            severity_counts = requests_df['severity'].value_counts()
-            colors_map = {'Critical': '#dc2626', 'High': '#f59e0b', 'Medium': '#3b82f6', 'Low': '#10b981'}
-            fig4 = go.Figure(data=[go.Bar(x=severity_counts.index, y=severity_counts.values,
-                                         marker_color=[colors_map.get(x, '#6b7280') for x in severity_counts.index],
-                                         text=severity_counts.values, textposition='outside')])
-            fig4.update_layout(title="Cases by Severity", showlegend=False)
-            st.plotly_chart(fig4, use_container_width=True)
-        
-        # Trend Analysis
-        st.subheader("📈 Request Trends")
-        daily_data = requests_df.groupby(requests_df['date_submitted'].dt.date).size().reset_index(name='count')
-        fig5 = px.line(daily_data, x='date_submitted', y='count', title="Daily Request Volume",
-                      markers=True, line_shape='spline')
-        fig5.update_traces(line_color='#3b82f6', line_width=3)
-        st.plotly_chart(fig5, use_container_width=True)
-        
-        # Recent Requests Table
-        st.subheader("📋 Recent Service Requests")
-        display_df = requests_df[['request_id', 'complaint_type', 'city', 'severity', 'status', 'affected_count', 'department']].head(15)
-        st.dataframe(display_df, use_container_width=True, hide_index=True)
+            with col2:
+                st.subheader("📈 Severity Breakdown")
+                show_figure('severity_breakdown', severity_figure)
+        
+            # Trend Analysis
+            st.subheader("📈 Request Trends")
+            show_figure('daily_volume', daily_volume_figure)
+        
+        # Request Browser (filtered and paginated server-side)
+        st.subheader("📋 Service Request Browser")
+        with span('page_section', page=page_name, section='request_browser'):
+            with st.expander("🔎 Filters"):
+                fcol1, fcol2, fcol3 = st.columns(3)
+                with fcol1:
+                    filter_city = st.multiselect("City", sorted(requests_df['city'].dropna().unique()))
+                    filter_ward = st.text_input("Ward", placeholder="e.g., Ward 12")
+                with fcol2:
+                    filter_severity = st.multiselect("Severity", ["Critical", "High", "Medium", "Low"])
+                    filter_status = st.multiselect("Status", ["Open", "In Progress", "Resolved"])
+                with fcol3:
+                    filter_department = st.multiselect("Department", sorted(requests_df['department'].dropna().unique()))
+                    filter_dates = st.date_input("Submitted Between", value=())
+            
+            browser_filters = {
+                'city': filter_city,
+                'ward': [filter_ward.strip()] if filter_ward.strip() else [],
+                'severity': filter_severity,
+                'status': filter_status,
+                'department': filter_department,
+                'date_from': filter_dates[0] if len(filter_dates) > 0 else None,
+                'date_to': filter_dates[1] if len(filter_dates) > 1 else None
+            }
+            
+            # Keyset cursors for every page visited so far; reset when filters change
+            if st.session_state.get('browser_filters') != browser_filters:
+                st.session_state['browser_filters'] = browser_filters
+                st.session_state['browser_cursors'] = [None]
+            cursors = st.session_state['browser_cursors']
+            
+            page_df, next_cursor = load_requests_page(browser_filters, cursors[-1])
+            st.dataframe(page_df, use_container_width=True, hide_index=True)
+            
+            nav1, nav2, nav3 = st.columns([1, 3, 1])
+            with nav1:
+                if st.button("⬅️ Previous", disabled=len(cursors) == 1, use_container_width=True):
+                    cursors.pop()
+                    st.rerun()
+            with nav2:
+                st.caption(f"Page {len(cursors)} | {len(page_df)} requests shown")
+            with nav3:
+                if st.button("Next ➡️", disabled=next_cursor is None, use_container_width=True):
+                    cursors.append(next_cursor)
+                    st.rerun()
+        
+        # Full-text complaint search (uses the browser filters above)
+        st.subheader("🔎 Complaint Search")
+        with span('page_section', page=page_name, section='complaint_search'):
+            search_query = st.text_input("Search complaint descriptions",
+                                         placeholder="e.g., pipeline burst in Ward 12")
+            if search_query:
+                results = search_index.search(search_query, filters=browser_filters, limit=25)
+                if results:
+                    results_df = pd.DataFrame(results)[['score', 'request_id', 'complaint_type', 'city', 'ward',
+                                                        'severity', 'status', 'snippet']]
+                    st.dataframe(results_df, use_container_width=True, hide_index=True)
+                else:
+                    st.info("No complaints match your search")
 
 # ==================== PAGE 2: PREDICTIVE ANALYTICS ====================
 elif page == "🔮 Predictive Analytics":
@@ -357,79 +809,127 @@ elif page == "🔮 Predictive Analytics":
         if requests_df.empty:
             st.warning("No requests available for analysis")
         else:
-            selected_id = st.selectbox("Select Request ID:", requests_df['request_id'].tolist())
-            selected_request = requests_df[requests_df['request_id'] == selected_id].iloc[0]
+            # Search IDs in the backend instead of preloading every ID into the picker
+            search_col, pick_col = st.columns([1, 2])
+            with search_col:
+                id_prefix = st.text_input("Search Request ID:", placeholder="e.g., R12")
+            with pick_col:
+                selected_id = st.selectbox("Select Request ID:", lookup_request_ids(id_prefix))
+            
+            request = load_request(selected_id) if selected_id else None
+            if request is None:
+                st.warning(f"No requests found matching '{id_prefix}'")
+            else:
+                selected_request = pd.Series(request)
             
-            col1, col2 = st.columns([2, 1])
+                col1, col2 = st.columns([2, 1])
             
-            with col1:
-                st.markdown(f"""
-                <div class="info-card">
-                    <strong style='font-size: 1.2em;'>📋 Request Details</strong><br><br>
-                    <strong>Type:</strong> {selected_request['complaint_type']}<br>
-                    <strong>Description:</strong> {selected_request['description']}<br>
-                    <strong>Location:</strong> {selected_request['city']}, {selected_request['ward']}<br>
-                    <strong>Current Severity:</strong> {selected_request['severity']}<br>
-                    <strong>Status:</strong> {selected_request['status']}<br>
-                    <strong>Citizens Affected:</strong> {selected_request['affected_count']:,}<br>
-                    <strong>Department:</strong> {selected_request['department']}<br>
-                    <strong>Days Open:</strong> {selected_request['days_open']}
-                </div>
-                """, unsafe_allow_html=True)
+                with col1:
+                    st.markdown(f"""
+                    <div class="info-card">
+                        <strong style='font-size: 1.2em;'>📋 Request Details</strong><br><br>
+                        <strong>Type:</strong> {selected_request['complaint_type']}<br>
+                        <strong>Description:</strong> {selected_request['description']}<br>
+                        <strong>Location:</strong> {selected_request['city']}, {selected_request['ward']}<br>
+                        <strong>Current Severity:</strong> {selected_request['severity']}<br>
+                        <strong>Status:</strong> {selected_request['status']}<br>
+                        <strong>Citizens Affected:</strong> {selected_request['affected_count']:,}<br>
+                        <strong>Department:</strong> {selected_request['department']}<br>
+                        <strong>Days Open:</strong> {selected_request['days_open']}
+                    </div>
+                    """, unsafe_allow_html=True)
             
-            with col2:
-                severity_class = "alert-critical" if selected_request['severity'] == 'Critical' else "alert-high" if selected_request['severity'] == 'High' else "info-card"
-                st.markdown(f"""<div class="{severity_class}">
-                <h3>{'🔴 CRITICAL' if selected_request['severity'] == 'Critical' else '🟠 HIGH PRIORITY' if selected_request['severity'] == 'High' else '🟢 STANDARD'}</h3>
-                <p>{'Immediate attention required!' if selected_request['severity'] == 'Critical' else 'Urgent action needed' if selected_request['severity'] == 'High' else 'Regular processing'}</p>
-                </div>""", unsafe_allow_html=True)
+                with col2:
+                    severity_class = "alert-critical" if selected_request['severity'] == 'Critical' else "alert-high" if selected_request['severity'] == 'High' else "info-card"
+                    st.markdown(f"""<div class="{severity_class}">
+                    <h3>{'🔴 CRITICAL' if selected_request['severity'] == 'Critical' else '🟠 HIGH PRIORITY' if selected_request['severity'] == 'High' else '🟢 STANDARD'}</h3>
+                    <p>{'Immediate attention required!' if selected_request['severity'] == 'Critical' else 'Urgent action needed' if selected_request['severity'] == 'High' else 'Regular processing'}</p>
+                    </div>""", unsafe_allow_html=True)
             
-            st.markdown("<br>", unsafe_allow_html=True)
+                st.markdown("<br>", unsafe_allow_html=True)
             
-            if st.button("🚀 Generate AI Prediction with Gemini", type="primary", use_container_width=True):
-                with st.spinner("🤖 Analyzing with Google Gemini AI... This may take 10-15 seconds..."):
-                    complaint_dict = selected_request.to_dict()
-                    prediction = analyze_complaint_with_gemini(complaint_dict)
+                # Duplicate reports of one incident share a single analysis
+                incident_id = incident_index.incident_of(selected_id)
+                incident = incident_index.incident(incident_id) if incident_id else None
+                if incident and incident['report_count'] > 1:
+                    st.info(f"📎 Part of incident {incident_id}: {incident['report_count']} similar reports "
+                            f"in {incident['city']}, {incident['ward']} (analysed once for all of them)")
+                
+                incident_analyses = get_incident_analyses()
+                analysis_key = incident_id or selected_id
+                prediction = incident_analyses.get(analysis_key)
+                if prediction is None and preanalysis_queue.pending(analysis_key):
+                    # Submitted moments ago: its background analysis is already under way
+                    with st.spinner("⏳ Finishing the analysis started at submission..."):
+                        prediction = preanalysis_queue.wait(analysis_key)
+                use_cascade = st.toggle("⚡ Answer routine requests locally", value=CASCADE_ENABLED,
+                                        help="Low-impact requests whose type and severity Gemini has rated "
+                                             "consistently before are answered from history; the rest go to Gemini")
+                
+                complaint_dict = selected_request.to_dict()
+                if incident:
+                    # Analyse the incident as a whole rather than one duplicate report
+                    complaint_dict['affected_count'] = max(int(complaint_dict.get('affected_count') or 0),
+                                                           incident['affected_count'])
+                    complaint_dict['severity'] = incident['severity']
+                
+                # A rule fallback (Gemini was unavailable) can be retried
+                if (prediction is None or prediction.get('source') == 'rules') and st.button(
+                        "🚀 Generate AI Prediction with Gemini", type="primary", use_container_width=True):
+                    analysis_cascade.refresh()
+                    local, answered = analysis_cascade.decide(complaint_dict, enabled=use_cascade)
+                    if answered:
+                        prediction = local
+                    else:
+                        # Urgency and priority render as soon as they are parsed from the stream
+                        streaming = st.empty()
+                        with streaming.container():
+                            st.info("🤖 Analyzing with Google Gemini AI...")
+                        for prediction in stream_complaint_analysis(complaint_dict):
+                            with streaming.container():
+                                st.info("🤖 Analyzing with Google Gemini AI...")
+                                render_prediction_metrics(prediction)
+                                if prediction.get('recommended_action'):
+                                    st.markdown(f"<div class='success-card'>{prediction['recommended_action']}</div>",
+                                                unsafe_allow_html=True)
+                        streaming.empty()
+                        analysis_cascade.compare(local, prediction)
                     
                     if prediction:
-                        st.success("✅ AI Analysis Complete! Powered by Google Gemini")
-                        st.markdown("---")
-                        
-                        col1, col2, col3, col4 = st.columns(4)
-                        with col1:
-                            st.metric("🎯 Urgency Score", f"{prediction['urgency_score']:.1f}/10")
-                        with col2:
-                            st.metric("⚠️ Escalation Risk", f"{prediction['escalation_risk_percent']}%")
-                        with col3:
-                            priority_emoji = {'Critical': '🔴', 'High': '🟠', 'Medium': '🟡', 'Low': '🟢'}
-                            st.metric("📊 AI Priority", f"{priority_emoji.get(prediction['predicted_priority'], '⚪')} {prediction['predicted_priority']}")
-                        with col4:
-                            st.metric("⏱️ Est. Resolution", f"{prediction['estimated_resolution_days']} days")
-                        
-                        st.markdown("---")
-                        
-                        col1, col2 = st.columns(2)
-                        with col1:
-                            st.markdown("### 💡 Recommended Action")
-                            st.markdown(f"<div class='success-card'>{prediction['recommended_action']}</div>", unsafe_allow_html=True)
-                            st.markdown("### 🔧 Resource Requirements")
-                            st.markdown(f"<div class='info-card'>{prediction['resource_requirements']}</div>", unsafe_allow_html=True)
-                        
-                        with col2:
-                            st.markdown("### 🧠 AI Reasoning")
-                            st.write(prediction['reasoning'])
-                            st.markdown("### 📊 Impact Analysis")
-                            st.warning(prediction['impact_analysis'])
-                        
-                        st.markdown("### 🔄 Similar Patterns Identified")
-                        st.info(prediction['similar_patterns'])
-                        st.markdown("### 🛡️ Prevention Measures")
-                        st.info(prediction['prevention_measures'])
-                        
-                        # Log prediction
+                        incident_analyses[analysis_key] = prediction
+                        # Log prediction (Gemini's answers are what the cascade learns from)
+                        save_prediction_log(prediction_row(selected_id, prediction))
                         log_user_action("AI Prediction Generated", "Analyst", selected_id)
                     else:
                         st.error("❌ Error generating prediction. Please try again.")
+                
+                if prediction:
+                    if prediction.get('source') == 'local':
+                        st.success("✅ Analysis Complete! Routine request answered locally from past Gemini analyses")
+                    elif prediction.get('source') == 'rules':
+                        st.warning("⚠️ Gemini unavailable: showing the rule-based analysis")
+                    else:
+                        st.success("✅ AI Analysis Complete! Powered by Google Gemini")
+                    if prediction.get('preanalysed_at'):
+                        st.caption(f"⚡ Analysed automatically at submission ({prediction['preanalysed_at'].replace('T', ' ')})")
+                    st.markdown("---")
+                    render_prediction_metrics(prediction)
+                    st.markdown("---")
+                    
+                    st.markdown("### 💡 Recommended Action")
+                    st.markdown(f"<div class='success-card'>{prediction['recommended_action']}</div>", unsafe_allow_html=True)
+                    
+                    # Compact analyses fetch the narrative fields only when asked for, streamed in as written
+                    if prediction.get('reasoning') is None and st.button("📖 Load Detailed Analysis", use_container_width=True):
+                        streaming = st.empty()
+                        for details in stream_complaint_details(complaint_dict, prediction):
+                            with streaming.container():
+                                render_prediction_details(details)
+                        streaming.empty()
+                        prediction.update(details)
+                    
+                    if prediction.get('reasoning') is not None:
+                        render_prediction_details(prediction)
     
     with tab2:
         st.subheader("7-Day Service Demand Forecast")
@@ -506,8 +1006,8 @@ elif page == "🔮 Predictive Analytics":
         with col1:
             st.markdown("### 🏗️ High-Risk Infrastructure")
             if not infrastructure_df.empty:
-                high_risk = infrastructure_df[infrastructure_df['risk_score'] > 7.0].sort_values('risk_score', ascending=False)
-                for _, asset in high_risk.iterrows():
+                # Already filtered to risk_score > 7 and sorted by BigQuery
+                for _, asset in infrastructure_df.iterrows():
                     st.markdown(f"""
                     <div class="alert-critical">
                         <strong>{asset['asset_type']}</strong><br>
@@ -519,8 +1019,8 @@ elif page == "🔮 Predictive Analytics":
         with col2:
             st.markdown("### 🏥 Health Surveillance Alerts")
             if not health_df.empty:
-                alerts = health_df[health_df['alert_level'].isin(['Orange', 'Red'])].sort_values('cases_reported', ascending=False)
-                for _, record in alerts.iterrows():
+                # Already filtered to Orange/Red alerts and sorted by BigQuery
+                for _, record in health_df.iterrows():
                     alert_class = "alert-critical" if record['alert_level'] == 'Red' else "alert-high"
                     st.markdown(f"""
                     <div class="{alert_class}">
@@ -529,6 +1029,24 @@ elif page == "🔮 Predictive Analytics":
                         Action: {record['action_taken']}
                     </div>
                     """, unsafe_allow_html=True)
+        
+        st.markdown("### 📈 Open Backlog Escalation Risk")
+        request_models = current_request_models()
+        if request_models is None:
+            st.info("No trained models yet: run `python train_models.py` to predict resolution time and "
+                    "escalation risk for the whole backlog")
+        elif not requests_df.empty:
+            backlog, elapsed = load_backlog_predictions(request_models)
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Open Requests Scored", f"{len(backlog):,}", help=f"Scored in {elapsed * 1000:.1f} ms")
+            with col2:
+                st.metric("Expected Escalations", f"{backlog['escalation_risk_percent'].sum() / 100:,.0f}")
+            with col3:
+                st.metric("Past Predicted Resolution", int((backlog['days_remaining'] < 0).sum()))
+            st.dataframe(backlog.head(20), use_container_width=True, hide_index=True)
+            st.caption(f"Local models trained {request_models.metadata['trained_at'][:10]} on "
+                       f"{request_models.metadata['requests']:,} requests; hold-out: {request_models.metadata.get('holdout', {})}")
 
 # ==================== PAGE 3: DYNAMIC PRIORITIZATION ====================
 elif page == "⚡ Dynamic Prioritization":
@@ -540,26 +1058,26 @@ elif page == "⚡ Dynamic Prioritization":
     else:
         st.info("🤖 Priority scores calculated using AI algorithms considering severity, affected citizens, and time factors")
         
-        # Calculate priority scores
-        prioritized_data = []
-        for _, req in requests_df.iterrows():
-            score = calculate_priority_score(req.to_dict())
-            prioritized_data.append({
-                'request_id': req['request_id'],
-                'complaint_type': req['complaint_type'],
-                'city': req['city'],
-                'severity': req['severity'],
-                'affected_count': req['affected_count'],
-                'days_open': req['days_open'],
-                'department': req['department'],
-                'priority_score': score
-            })
-        
-        priority_df = pd.DataFrame(prioritized_data).sort_values('priority_score', ascending=False)
-        
         st.markdown("### 🎯 Priority Queue (Auto-Ranked)")
         
-        for idx, row in priority_df.head(10).iterrows():
+        qcol1, qcol2 = st.columns(2)
+        with qcol1:
+            queue_department = st.selectbox("Department", ["All"] + sorted(requests_df['department'].dropna().unique()))
+        with qcol2:
+            queue_city = st.selectbox("City", ["All"] + sorted(requests_df['city'].dropna().unique()))
+        
+        with span('page_section', page=page_name, section='priority_scoring'):
+            # Read the top of the maintained priority index instead of scoring the whole backlog
+            top_incidents = priority_index.top_k(
+                10,
+                department=None if queue_department == "All" else queue_department,
+                city=None if queue_city == "All" else queue_city
+            )
+        
+        if not top_incidents:
+            st.info("No open incidents for this selection")
+        
+        for row in top_incidents:
             if row['priority_score'] >= 8:
                 card_class = "alert-critical"
                 icon = "🔴"
@@ -572,7 +1090,7 @@ elif page == "⚡ Dynamic Prioritization":
             
             st.markdown(f"""
             <div class="{card_class}">
-                {icon} <strong>Priority Score: {row['priority_score']:.2f}</strong> | <strong>{row['request_id']}</strong><br>
+                {icon} <strong>Priority Score: {row['priority_score']:.2f}</strong> | <strong>{row['representative_id']}</strong> | 📎 {row['report_count']} report(s)<br>
                 <strong>Type:</strong> {row['complaint_type']} | <strong>Location:</strong> {row['city']}<br>
                 <strong>Severity:</strong> {row['severity']} | <strong>Affected:</strong> {row['affected_count']:,} citizens | <strong>Days Open:</strong> {row['days_open']}<br>
                 <strong>Assigned:</strong> {row['department']}
@@ -581,6 +1099,7 @@ elif page == "⚡ Dynamic Prioritization":
         
         st.markdown("---")
         st.markdown("### 📊 Prioritization Analytics")
+        priority_df = load_priority_analytics()
         
         col1, col2 = st.columns(2)
         
@@ -595,6 +1114,45 @@ elif page == "⚡ Dynamic Prioritization":
                         title="Average Priority by Department", color=dept_priority.values,
                         color_continuous_scale='Reds')
             st.plotly_chart(fig, use_container_width=True)
+        
+        st.markdown("---")
+        st.markdown("### 🚚 Team Workload & Routing")
+        st.caption("New requests go to the department team with the earliest expected completion, "
+                   "based on open load, priority and historical resolution speed")
+        
+        team_loads = routing_scheduler.team_loads()
+        if team_loads.empty:
+            st.info("No team workload recorded yet")
+        else:
+            tcol1, tcol2, tcol3 = st.columns(3)
+            tcol1.metric("Teams", len(team_loads))
+            tcol2.metric("Open Assignments", f"{int(team_loads['open_requests'].sum()):,}")
+            tcol3.metric("Longest Backlog", f"{team_loads['backlog_days'].max():.1f} days")
+            
+            busiest = team_loads.sort_values('backlog_days', ascending=False).head(15)
+            fig = px.bar(busiest, x='backlog_days', y='team', orientation='h',
+                        title="Busiest Teams (backlog in days)", color='avg_resolution_days',
+                        color_continuous_scale='Oranges', hover_data=['open_requests', 'resolved'])
+            fig.update_layout(yaxis={'categoryorder': 'total ascending'})
+            st.plotly_chart(fig, use_container_width=True)
+        
+        with st.expander("📅 Capacity Planning: Simulate a Week"):
+            observed_rate = routing_scheduler.observed_arrival_rate()
+            scol1, scol2 = st.columns(2)
+            with scol1:
+                arrivals_per_day = st.number_input("Submissions per day", min_value=0.0,
+                                                   value=float(round(observed_rate, 1)), step=10.0)
+            with scol2:
+                crews_per_team = st.slider("Crews per team", 1, 10, routing_scheduler.crews_per_team)
+            
+            if st.button("▶️ Run Simulation", use_container_width=True):
+                with span('page_section', page=page_name, section='routing_simulation'):
+                    simulation = routing_scheduler.simulate_week(arrivals_per_day=arrivals_per_day,
+                                                                 crews_per_team=crews_per_team)
+                if simulation.empty:
+                    st.info("Not enough history to simulate submissions")
+                else:
+                    st.dataframe(simulation, use_container_width=True, hide_index=True)
 
        # ==================== PAGE 4: CITIZEN PORTAL ====================
 elif page == "📝 Citizen Portal":
@@ -645,19 +1203,6 @@ elif page == "📝 Citizen Portal":
                     # Generate new request ID
                     new_id = f"R{str(len(requests_df) + 1).zfill(3)}"
                     
-                    # Determine department
-                    dept_mapping = {
-                        "Water Supply": "Water Department",
-                        "Electricity": "MSEDCL",
-                        "Road Repair": "PWD",
-                        "Healthcare": "Health Department",
-                        "Garbage Collection": "Sanitation Department",
-                        "Street Lights": "Municipal Corporation",
-                        "Drainage": "PWD",
-                        "Public Transport": "Transport Department",
-                        "Other": "General Department"
-                    }
-                    
                     # Create request data
                     request_data = {
                         "request_id": new_id,
@@ -672,7 +1217,7 @@ elif page == "📝 Citizen Portal":
                         "severity": severity,
                         "status": "Open",
                         "affected_count": affected_count,
-                        "department": dept_mapping.get(complaint_type, "General Department"),
+                        "department": route_department(complaint_type),
                         "date_submitted": datetime.now(),
                         "priority_score": None,
                         "resolved_date": None
@@ -682,25 +1227,37 @@ elif page == "📝 Citizen Portal":
                     success = insert_citizen_request(request_data)
                     
                     if success:
+                        # Publish the change: indexes, routing and live dashboards pick it up right away
+                        change_feed.publish('citizen_requests', 'INSERT', request_data)
+                        incident_id = incident_index.incident_of(new_id)
+                        linked_reports = incident_index.incident(incident_id)['report_count'] if incident_id else 1
+                        routing = routing_scheduler.assignment(new_id) or {
+                            'team': request_data['department'], 'expected_resolution_days': '2-3'
+                        }
+
                         st.balloons()
                         st.success("✅ Complaint Submitted Successfully!")
                         st.markdown(f"""
                         <div class="success-card">
                             <h3>📋 Your Reference Details</h3>
                             <strong>Request ID:</strong> {new_id}<br>
-                            <strong>Department:</strong> {dept_mapping.get(complaint_type)}<br>
-                            <strong>Status:</strong> Open<br><br>
+                            <strong>Department:</strong> {request_data['department']}<br>
+                            <strong>Assigned Team:</strong> {routing['team']}<br>
+                            <strong>Status:</strong> Open<br>
+                            {f"<strong>Linked Incident:</strong> {incident_id} ({linked_reports} similar reports)<br>" if linked_reports > 1 else ""}<br>
                             <p>Your complaint has been registered and assigned to the concerned department. 
                             You will receive updates via SMS/Email.</p>
-                            <p><strong>Estimated Response Time:</strong> 2-3 business days</p>
+                            <p><strong>Estimated Response Time:</strong> {routing['expected_resolution_days']} days</p>
                         </div>
                         """, unsafe_allow_html=True)
                         
                         # Log action
                         log_user_action("New Complaint Submitted", "Citizen", new_id)
                         
-                        # Clear cache to refresh data
-                        st.cache_data.clear()
+                        # The change feed already patched the shared requests frame; only the
+                        # browser pages and ID picker results need to forget older results
+                        load_requests_page.clear()
+                        lookup_request_ids.clear()
                     else:
                         st.error("❌ Error submitting complaint. Please try again or contact support.")
                 else:
@@ -865,6 +1422,30 @@ elif page == "🔒 Privacy & Security":
   "success": true
 }
         """, language="json")
+        
+        st.markdown("#### 🗄️ Retention & Archive")
+        st.caption(f"Last {retention_engine.hot_days} days stay in the live tables; older entries are archived "
+                   f"as compressed Parquet and purged after {retention_engine.retention_days // 365} years")
+        if retention_engine.archive.durable:
+            st.dataframe(pd.DataFrame(retention_engine.archive.describe()), use_container_width=True, hide_index=True)
+        else:
+            st.warning("⚠️ No durable archive configured (RETENTION_ARCHIVE_DIR): log rows stay in the live tables")
+        
+        st.markdown("#### 🔎 Search Audit Trail")
+        col1, col2 = st.columns(2)
+        with col1:
+            log_table = st.selectbox("Log", list(RETAINED_TABLES))
+        with col2:
+            log_dates = st.date_input("Date range", value=(datetime.now().date() - timedelta(days=7), datetime.now().date()))
+        if st.button("Search Logs") and len(log_dates) == 2:
+            # Spans the live table and the archive transparently
+            log_rows = retention_engine.query(
+                log_table,
+                start=datetime.combine(log_dates[0], datetime.min.time()),
+                end=datetime.combine(log_dates[1], datetime.min.time()) + timedelta(days=1)
+            )
+            st.caption(f"{len(log_rows)} entries")
+            st.dataframe(log_rows, use_container_width=True, hide_index=True)
     
     st.markdown("---")
     
@@ -971,39 +1552,22 @@ elif page == "📈 GaaS Transparency":
         
         st.markdown("---")
         
-        # Performance Trends
-        st.subheader("📈 Performance Trends")
+        with span('page_section', page=page_name, section='charts'):
+            # Performance Trends
+            st.subheader("📈 Performance Trends")
         
-        col1, col2 = st.columns(2)
+            col1, col2 = st.columns(2)
         
-        with col1:
-            # Resolution time trend
-            resolved_df = requests_df[requests_df['status'] == 'Resolved'].copy()
-            if not resolved_df.empty:
-                resolved_df['month'] = pd.to_datetime(resolved_df['date_submitted']).dt.to_period('M').astype(str)
-                monthly_avg = resolved_df.groupby('month')['days_open'].mean().reset_index()
-                fig = px.line(monthly_avg, x='month', y='days_open', 
-                            title="Average Resolution Time Trend",
-                            markers=True, line_shape='spline')
-                fig.update_traces(line_color='#10b981', line_width=3)
-                fig.update_layout(yaxis_title="Days", xaxis_title="Month")
-                st.plotly_chart(fig, use_container_width=True)
+            with col1:
+                # Resolution time trend
+                if resolved > 0:
+                    show_figure('resolution_trend', resolution_trend_figure)
         
-        with col2:
-            # Department performance
-            dept_performance = requests_df.groupby('department').agg({
-                'request_id': 'count',
-                'days_open': 'mean'
-            }).reset_index()
-            dept_performance.columns = ['Department', 'Total Cases', 'Avg Days']
-            fig = px.scatter(dept_performance, x='Total Cases', y='Avg Days', 
-                           size='Total Cases', color='Avg Days',
-                           hover_data=['Department'],
-                           title="Department Performance Matrix",
-                           color_continuous_scale='RdYlGn_r')
-            st.plotly_chart(fig, use_container_width=True)
+            with col2:
+                # Department performance
+                show_figure('department_performance', department_performance_figure)
         
-        st.markdown("---")
+            st.markdown("---")
         
         # Open Data Section
         st.subheader("📂 Open Data Access")
@@ -1101,6 +1665,210 @@ elif page == "📈 GaaS Transparency":
         </div>
         """, unsafe_allow_html=True)
 
+# ==================== PAGE 7: PERFORMANCE DIAGNOSTICS ====================
+elif page == "🩺 Performance Diagnostics":
+    st.header("🩺 Performance Diagnostics")
+    st.caption(f"Live measurements from this app process since {metrics_started_at().strftime('%Y-%m-%d %H:%M:%S')}")
+    
+    def latency_frame(metric_name, label_columns, **labels):
+        """Histogram summaries as a table with latencies in milliseconds"""
+        rows = histogram_summary(metric_name, **labels)
+        if not rows:
+            return pd.DataFrame()
+        frame = pd.DataFrame(rows)
+        for col in ['mean', 'p50', 'p90', 'p99', 'max']:
+            frame[col] = (frame[col] * 1000).round(1)
+        frame = frame.rename(columns={'mean': 'mean_ms', 'p50': 'p50_ms', 'p90': 'p90_ms',
+                                      'p99': 'p99_ms', 'max': 'max_ms'})
+        columns = [c for c in label_columns if c in frame.columns]
+        return frame[columns + ['count', 'mean_ms', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms']].sort_values('p90_ms', ascending=False)
+    
+    # Data snapshot and cache KPIs
+    col1, col2, col3, col4 = st.columns(4)
+    
+    snapshot_ts = data_cache.loaded_at('citizen_requests')
+    cache_hits = sum(sum_counter('cache_lookups_total', cache=dataset, result='hit') for dataset in DATASETS)
+    cache_misses = sum(sum_counter('cache_lookups_total', cache=dataset, result='miss') for dataset in DATASETS)
+    cache_stale = sum(sum_counter('cache_lookups_total', cache=dataset, result='stale') for dataset in DATASETS)
+    total_rows = sum(value for _, value in gauge_values('dataset_rows'))
+    total_bytes = sum(value for _, value in gauge_values('dataset_memory_bytes'))
+    
+    with col1:
+        age = f"{(datetime.now().timestamp() - snapshot_ts) / 60:.1f} min" if snapshot_ts else "N/A"
+        st.metric("Data Snapshot Age", age)
+    with col2:
+        lookups = cache_hits + cache_misses + cache_stale
+        st.metric("Cache Hit Ratio", f"{((cache_hits + cache_stale) / lookups * 100):.0f}%" if lookups else "N/A",
+                  help=f"{cache_hits} hits / {cache_stale} served stale during refresh / {cache_misses} misses")
+    with col3:
+        st.metric("Rows Loaded", f"{total_rows:,}")
+    with col4:
+        st.metric("Cached Frame Memory", f"{total_bytes / 1024 / 1024:.1f} MB")
+    
+    st.markdown("---")
+    
+    tab1, tab2, tab3, tab4 = st.tabs(["🗄️ Backend Queries", "🤖 Gemini Calls", "🖥️ Page Renders", "📤 Export"])
+    
+    with tab1:
+        st.subheader("Backend Query Latency")
+        query_df = latency_frame('backend_query_seconds', ['backend', 'table'])
+        if query_df.empty:
+            st.info("No backend queries recorded yet")
+        else:
+            st.dataframe(query_df, use_container_width=True, hide_index=True)
+        
+        insert_df = latency_frame('backend_insert_seconds', ['backend', 'table'])
+        if not insert_df.empty:
+            st.markdown("#### Inserts")
+            st.dataframe(insert_df, use_container_width=True, hide_index=True)
+        
+        st.markdown("#### Datasets in Memory")
+        dataset_rows = {labels['dataset']: value for labels, value in gauge_values('dataset_rows')}
+        dataset_bytes = {labels['dataset']: value for labels, value in gauge_values('dataset_memory_bytes')}
+        st.dataframe(pd.DataFrame([
+            {**entry, 'rows': dataset_rows.get(entry['dataset'], 0),
+             'memory_mb': round(dataset_bytes.get(entry['dataset'], 0) / 1024 / 1024, 2),
+             'query_errors': sum_counter('backend_query_errors_total', table=entry['dataset'])}
+            for entry in data_cache.describe()
+        ]), use_container_width=True, hide_index=True)
+    
+    with tab2:
+        st.subheader("Gemini Call Latency and Fallbacks")
+        gemini_df = latency_frame('gemini_call_seconds', ['operation'])
+        if gemini_df.empty:
+            st.info("No Gemini calls recorded yet")
+        else:
+            gemini_df['fallbacks'] = gemini_df['operation'].map(
+                lambda op: sum_counter('gemini_fallback_total', operation=op))
+            gemini_df['fallback_rate'] = (gemini_df['fallbacks'] / gemini_df['count'] * 100).round(1)
+            gemini_df['output_tokens_mean'] = gemini_df['operation'].map(
+                lambda op: round(sum(s['mean'] for s in histogram_summary('gemini_output_tokens', operation=op))))
+            # Streamed calls: time until the first chunk (urgency and priority follow within it)
+            gemini_df['first_chunk_p50_ms'] = gemini_df['operation'].map(
+                lambda op: round(sum(s['p50'] for s in histogram_summary('gemini_first_chunk_seconds', operation=op)) * 1000))
+            st.dataframe(gemini_df, use_container_width=True, hide_index=True)
+            
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("API Errors", sum_counter('gemini_fallback_total', reason='api_error'))
+            with col2:
+                st.metric("JSON Parse Errors", sum_counter('gemini_fallback_total', reason='parse_error'))
+            with col3:
+                saved = sum_counter('gemini_coalesced_calls_total')
+                upstream = sum_counter('gemini_upstream_calls_total')
+                st.metric("Calls Saved by Coalescing", saved,
+                          help=f"Identical concurrent requests that shared one of {upstream} upstream calls")
+        
+        st.subheader("Gemini Admission Control")
+        budget = gemini_admission.describe()
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Requests Available", f"{budget['requests_available']:.0f} / {budget['rpm']}",
+                      help="Requests-per-minute budget (GEMINI_RPM)")
+        with col2:
+            st.metric("Tokens Available", f"{budget['tokens_available']:,} / {budget['tpm']:,}",
+                      help="Tokens-per-minute budget (GEMINI_TPM)")
+        with col3:
+            st.metric("Queue Depth", budget['queue_depth'],
+                      help=f"Waiting calls by priority (0 = critical, 3 = forecast): {budget['queued_by_priority']}")
+        with col4:
+            st.metric("Calls Shed", sum_counter('gemini_shed_total'),
+                      help=f"Quota errors: {sum_counter('gemini_quota_errors_total')}")
+        if budget['cooldown_seconds'] > 0:
+            st.warning(f"⚠️ Gemini quota exhausted, admitting calls again in {budget['cooldown_seconds']}s")
+        
+        st.subheader("Analysis Cascade")
+        live = analysis_cascade.report()
+        replay = analysis_cascade.evaluate()
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Answered Locally", live['answered_locally'],
+                      help=f"{live['escalated']} requests escalated to Gemini")
+        with col2:
+            st.metric("Call Reduction", f"{live['call_reduction']:.0%}" if live['call_reduction'] is not None else "N/A")
+        with col3:
+            st.metric("Agreement with Gemini", f"{live['agreement']:.0%}" if live['agreement'] is not None else "N/A",
+                      help="Escalated requests where the local answer had the same priority as Gemini's")
+        with col4:
+            st.metric("Replayed Call Reduction",
+                      f"{replay['call_reduction']:.0%}" if replay['call_reduction'] is not None else "N/A",
+                      help=f"Over {replay['requests']} past Gemini analyses; local answers agreed "
+                           f"{replay['agreement']:.0%} of the time" if replay['agreement'] is not None
+                      else "No prediction history fitted yet")
+        reasons = pd.DataFrame([
+            {'route': route, 'reason': reason, 'count': sum_counter('cascade_decisions_total', route=route, reason=reason)}
+            for route, reason in [('local', 'confident'), ('gemini', 'high_severity'), ('gemini', 'high_impact'),
+                                  ('gemini', 'no_history'), ('gemini', 'uncertain'), ('gemini', 'disabled')]
+        ])
+        st.dataframe(reasons[reasons['count'] > 0], use_container_width=True, hide_index=True)
+        
+        st.subheader("Pre-Analysis at Submission")
+        queue = preanalysis_queue.describe()
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Pending", f"{queue['pending']} / {queue['max_pending']}",
+                      help=f"New High and Critical requests waiting for {queue['workers']} background workers")
+        with col2:
+            st.metric("Pre-Analysed", sum_counter('preanalysis_completed_total'),
+                      help=f"Answered locally: {sum_counter('preanalysis_completed_total', source='local')}; "
+                           f"dropped as rule fallbacks (left for officers): {sum_counter('preanalysis_fallbacks_total')}")
+        with col3:
+            st.metric("Skipped (Queue Full)", sum_counter('preanalysis_skipped_total', reason='queue_full'))
+        with col4:
+            st.metric("Failed", sum_counter('preanalysis_failed_total'))
+    
+    with tab3:
+        st.subheader("Page Render Times")
+        render_df = latency_frame('page_render_seconds', ['page'])
+        if render_df.empty:
+            st.info("No page renders recorded yet")
+        else:
+            st.dataframe(render_df, use_container_width=True, hide_index=True)
+        
+        st.markdown("#### Page Sections")
+        section_df = latency_frame('page_section_seconds', ['page', 'section'])
+        if not section_df.empty:
+            st.dataframe(section_df, use_container_width=True, hide_index=True)
+
+        figure_bytes = gauge_values('figure_payload_bytes')
+        if figure_bytes:
+            st.markdown("#### Cached Figures")
+            st.dataframe(pd.DataFrame([{
+                'figure': labels['figure'],
+                'payload_kb': round(value / 1024, 1),
+                'served_from_cache': sum_counter('cache_lookups_total', cache=f"figure:{labels['figure']}", result='hit'),
+                'builds': sum_counter('cache_lookups_total', cache=f"figure:{labels['figure']}", result='miss')
+            } for labels, value in figure_bytes]), use_container_width=True, hide_index=True)
+
+        load_df = latency_frame('data_load_seconds', ['cache'])
+        if not load_df.empty:
+            st.markdown("#### Data Load (including cache lookups)")
+            st.dataframe(load_df, use_container_width=True, hide_index=True)
+    
+    with tab4:
+        st.subheader("Export Metrics")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.download_button(
+                label="📥 Prometheus Text",
+                data=export_prometheus().encode('utf-8'),
+                file_name='governance_metrics.prom',
+                mime='text/plain'
+            )
+        with col2:
+            st.download_button(
+                label="📥 OpenTelemetry JSON",
+                data=json.dumps(export_otel_json(), indent=2).encode('utf-8'),
+                file_name='governance_metrics.json',
+                mime='application/json'
+            )
+        with col3:
+            if st.button("🔄 Reset Metrics"):
+                reset_metrics()
+                st.rerun()
+
+page_span.end()
+
 # ==================== FOOTER ====================
 st.markdown("---")
 st.markdown("""
@@ -1115,6 +1883,26 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
+# Export metrics for external scrapers (no-op unless METRICS_EXPORT_PATH is set)
+write_metrics_file()
 
-
-            
+# ==================== LIVE UPDATES ====================
+# Streamlit 1.31 has no partial reruns, so a live session keeps its script
+# running and redraws the KPI and alert placeholders whenever the change
+# feed publishes. The heartbeat caption lets Streamlit interrupt the loop
+# as soon as the user interacts with the page.
+if live_updates:
+    live_until = time.time() + LIVE_SESSION_SECONDS
+    while time.time() < live_until:
+        events = change_feed.wait_for_events(live_seq, timeout=LIVE_WAIT_SECONDS)
+        if events:
+            live_seq = events[-1]['seq']
+            with span('live_update', page=page_name):
+                with kpi_placeholder.container():
+                    render_kpis(live_dataset.kpis())
+                if any(event['record'].get('severity') == 'Critical' for event in events):
+                    with alerts_placeholder.container():
+                        render_critical_alerts(live_dataset.critical_alerts())
+            increment('live_updates_pushed_total', len(events))
+        live_status.caption(f"🔴 Live ({change_feed.mode} feed) · checked {datetime.now().strftime('%H:%M:%S')}")
+    live_status.caption(f"Live updates paused after {LIVE_SESSION_SECONDS // 60} minutes; toggle again to resume")
@@ -0,0 +1,150 @@
+"""
+Benchmark: complaint analysis under concurrent load without the Gemini API
+
+Runs --requests compact analyses from --concurrency threads against a
+replayed recording or the synthetic stand-in (replay_helpers), through
+stream_compact (the streamed path the analysis page uses) and
+analyze_compact (pre-analysis and the cascade). Complaints are drawn
+from a pool of --distinct requests, so repeated ones exercise request
+coalescing, and admission control runs with the --rpm / --tpm budgets.
+Reports latency percentiles (and time to the first parsed urgency when
+streaming), upstream vs coalesced calls, shed calls and fallbacks. Runs
+are repeatable for a given --seed; --time-scale shrinks every latency,
+the quota backoff included.
+
+Usage:
+    python benchmark_gemini.py [--mode synthetic|replay] [--recording ./recordings/gemini.jsonl]
+                               [--requests 200] [--distinct 50] [--concurrency 8] [--rpm 600] [--tpm 1000000]
+                               [--time-scale 0.1] [--error-rate 0.02] [--quota-rate 0.01] [--seed 42]
+                               [--path both|stream|analyze]
+"""
+
+import time
+import random
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import gemini_helpers
+from gemini_helpers import AdmissionController, QUOTA_BACKOFF_SECONDS
+from metrics_helpers import sum_counter, reset_metrics
+from cascade_helpers import get_fallback_prediction
+from structured_helpers import analyze_compact, stream_compact
+from replay_helpers import SyntheticModel, ReplayModel, load_recording, RECORDINGS_PATH
+
+SEVERITIES = ['Critical', 'High', 'Medium', 'Low']
+CITIES = ['Mumbai', 'Pune', 'Nagpur', 'Nashik', 'Aurangabad', 'Thane']
+TYPES = {'Water Supply': 'Water Department', 'Roads': 'PWD', 'Electricity': 'MSEDCL',
+         'Sanitation': 'Municipal Corporation', 'Health': 'Health Department'}
+
+
+def generate_complaints(count, seed=42):
+    rng = random.Random(seed)
+    complaints = []
+    for i in range(count):
+        complaint_type = rng.choice(list(TYPES))
+        complaints.append({
+            'complaint_type': complaint_type,
+            'description': f"{complaint_type} problem reported in ward {rng.randint(1, 40)} (case {i})",
+            'city': rng.choice(CITIES),
+            'ward': f"Ward {rng.randint(1, 40)}",
+            'severity': rng.choices(SEVERITIES, weights=[1, 3, 4, 2])[0],
+            'affected_count': rng.randint(1, 800),
+            'days_open': rng.randint(0, 20),
+            'status': 'Open',
+            'department': TYPES[complaint_type]
+        })
+    return complaints
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(int(len(values) * pct), len(values) - 1)] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark complaint analysis against a Gemini stand-in")
+    parser.add_argument('--mode', choices=['synthetic', 'replay'], default='synthetic')
+    parser.add_argument('--recording', default=RECORDINGS_PATH)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--distinct', type=int, default=50, help="distinct complaints the requests are drawn from")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--rpm', type=int, default=600)
+    parser.add_argument('--tpm', type=int, default=1000000)
+    parser.add_argument('--time-scale', type=float, default=0.1, help="multiplier for every simulated latency")
+    parser.add_argument('--error-rate', type=float, help="synthetic API error rate (default: fitted or 2%%)")
+    parser.add_argument('--quota-rate', type=float, help="synthetic quota error rate (default: fitted or 1%%)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--path', choices=['both', 'stream', 'analyze'], default='both')
+    args = parser.parse_args()
+
+    entries = load_recording(args.recording)
+
+    def make_model():
+        """A fresh stand-in per pass, so every pass sees the same draws"""
+        if args.mode == 'replay':
+            return ReplayModel(entries, time_scale=args.time_scale, seed=args.seed)
+        model = SyntheticModel.from_recording(entries, time_scale=args.time_scale, seed=args.seed)
+        if args.error_rate is not None:
+            model.error_rate = args.error_rate
+        if args.quota_rate is not None:
+            model.quota_rate = args.quota_rate
+        return model
+
+    model = make_model()
+    if args.mode == 'replay':
+        print(f"🔁 Replaying {len(entries):,} recorded calls from {args.recording}")
+    else:
+        print(f"🧪 Synthetic model: median {model.latency_median:.2f}s, sigma {model.latency_sigma:.2f}, "
+              f"{model.error_rate:.1%} errors, {model.quota_rate:.1%} quota errors")
+
+    pool = generate_complaints(args.distinct, args.seed)
+    rng = random.Random(args.seed)
+    workload = [rng.choice(pool) for _ in range(args.requests)]
+    print(f"📍 {args.requests:,} analyses of {args.distinct:,} distinct complaints, {args.concurrency} threads, "
+          f"{args.rpm} RPM, latency x{args.time_scale}")
+
+    def analyze(complaint):
+        started = time.perf_counter()
+        prediction = analyze_compact(model, complaint, get_fallback_prediction)
+        return time.perf_counter() - started, None, prediction
+
+    def stream(complaint):
+        started = time.perf_counter()
+        first = None
+        for prediction in stream_compact(model, complaint, get_fallback_prediction):
+            if first is None and 'urgency_score' in prediction:
+                first = time.perf_counter() - started
+        return time.perf_counter() - started, first, prediction
+
+    paths = [('stream_compact', stream), ('analyze_compact', analyze)]
+    for name, run in paths if args.path == 'both' else [paths[args.path == 'analyze']]:
+        model = make_model()
+        # Fresh budgets per pass instead of the process-wide GEMINI_RPM / GEMINI_TPM
+        gemini_helpers.gemini_admission = AdmissionController(
+            rpm=args.rpm, tpm=args.tpm, backoff_seconds=QUOTA_BACKOFF_SECONDS * args.time_scale)
+        reset_metrics()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            results = list(executor.map(run, workload))
+        wall = time.perf_counter() - started
+
+        latencies = [latency for latency, _, _ in results]
+        firsts = [first for _, first, _ in results if first is not None]
+        print(f"\n{name}")
+        print(f"Wall time:          {wall:.2f} s ({len(results) / wall:.1f} analyses/s)")
+        print(f"Latency p50 / p95:  {percentile(latencies, 0.5) * 1000:.0f} / {percentile(latencies, 0.95) * 1000:.0f} ms")
+        if firsts:
+            print(f"First urgency p50 / p95: {percentile(firsts, 0.5) * 1000:.0f} / "
+                  f"{percentile(firsts, 0.95) * 1000:.0f} ms")
+        print(f"Upstream calls:     {sum_counter('gemini_upstream_calls_total'):.0f}")
+        print(f"Coalesced calls:    {sum_counter('gemini_coalesced_calls_total'):.0f}")
+        print(f"Shed calls:         {sum_counter('gemini_shed_total'):.0f}")
+        print(f"Quota errors:       {sum_counter('gemini_quota_errors_total'):.0f}")
+        print(f"Fallbacks:          {sum_counter('gemini_fallback_total'):.0f} "
+              f"({sum(1 for _, _, p in results if p.get('source') == 'rules')} rule answers)")
+    if args.mode == 'replay':
+        print(f"Recording hits / misses: {model.hits} / {model.misses}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Benchmark: list-of-dicts vs typed columnar frames for Supabase results
+
+Generates PostgREST-style JSON for N citizen requests and times the old
+supabase_helpers path (json rows, list-comprehension stats, per-row
+dateutil parsing for priority scores) against the columnar path
+(typed_frame, request_statistics, score_frame). Both paths must produce
+the same statistics and scores. No database or API key is needed.
+
+Usage:
+    python benchmark_supabase_columnar.py [--rows 100000] [--repeat 5]
+"""
+
+import json
+import time
+import random
+import argparse
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+from dateutil import parser as date_parser
+
+from columnar_helpers import typed_frame, request_statistics
+from priority_helpers import score_frame
+
+SEVERITIES = ['Critical', 'High', 'Medium', 'Low']
+STATUSES = ['Open', 'In Progress', 'Resolved']
+CITIES = ['Mumbai', 'Pune', 'Nagpur', 'Nashik', 'Aurangabad', 'Thane']
+TYPES = ['Water Supply', 'Roads', 'Electricity', 'Sanitation', 'Health', 'Drainage']
+
+
+def generate_payload(rows, seed=42):
+    """PostgREST JSON body for rows citizen requests"""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    data = []
+    for i in range(rows):
+        submitted = now - timedelta(days=rng.randint(0, 30), seconds=rng.randint(0, 86400))
+        data.append({
+            'request_id': f"R{i:06d}",
+            'complaint_type': rng.choice(TYPES),
+            'city': rng.choice(CITIES),
+            'ward': f"Ward {rng.randint(1, 25)}",
+            'severity': rng.choice(SEVERITIES),
+            'status': rng.choice(STATUSES),
+            'affected_count': rng.randint(1, 1200),
+            'department': 'General Department',
+            'date_submitted': submitted.isoformat(),
+            'priority_score': round(rng.uniform(4.0, 10.0), 2)
+        })
+    return json.dumps(data)
+
+# ==================== LEGACY PATH (lists of dicts) ====================
+
+def legacy_statistics(requests):
+    return {
+        "total_requests": len(requests),
+        "open_requests": len([r for r in requests if r['status'] == 'Open']),
+        "critical_requests": len([r for r in requests if r['severity'] == 'Critical']),
+        "total_affected": sum(r['affected_count'] for r in requests)
+    }
+
+
+def legacy_priority_score(complaint_data):
+    severity_weights = {'Critical': 10, 'High': 7, 'Medium': 4, 'Low': 2}
+    base_score = severity_weights.get(complaint_data.get('severity', 'Medium'), 4)
+    citizen_factor = min(complaint_data.get('affected_count', 0) / 100, 5)
+    date_submitted = complaint_data.get('date_submitted')
+    if isinstance(date_submitted, str):
+        date_submitted = date_parser.parse(date_submitted)
+    # UTC "now" so both paths count whole days the same way
+    days_open = (datetime.utcnow() - date_submitted.replace(tzinfo=None)).days if date_submitted else 0
+    return round(base_score + citizen_factor + min(days_open * 0.5, 3), 2)
+
+# ==================== TIMING ====================
+
+def best_of(repeat, func):
+    """Best wall time of repeat runs, and the last result"""
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark list-of-dicts vs columnar Supabase results")
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    payload = generate_payload(args.rows)
+    print(f"📍 {args.rows:,} rows, {len(payload) / 1024 / 1024:.1f} MB of JSON, best of {args.repeat}\n")
+
+    decode_legacy, rows = best_of(args.repeat, lambda: json.loads(payload))
+    decode_columnar, df = best_of(args.repeat, lambda: typed_frame(json.loads(payload)))
+    stats_legacy, legacy_stats = best_of(args.repeat, lambda: legacy_statistics(rows))
+    stats_columnar, stats = best_of(args.repeat, lambda: request_statistics(df))
+    # Per-row parsing is slow, so the legacy scores are timed once
+    scores_legacy, legacy_scores = best_of(1, lambda: [legacy_priority_score(r) for r in rows])
+    # days_open as the legacy path counts it (UTC now, naive UTC timestamps)
+    df['days_open'] = (pd.Timestamp.utcnow().tz_localize(None) - df['date_submitted']).dt.days
+    scores_columnar, scores = best_of(args.repeat, lambda: score_frame(df))
+
+    assert all(legacy_stats[key] == stats[key] for key in legacy_stats), "statistics differ"
+    mismatches = int((pd.Series(legacy_scores) - scores).abs().gt(0.011).sum())
+
+    print(f"{'Step':<28}{'Lists of dicts':>16}{'Columnar':>12}{'Speed-up':>10}")
+    for label, legacy, columnar in [
+        ('decode', decode_legacy, decode_columnar),
+        ('statistics', stats_legacy, stats_columnar),
+        ('priority scores', scores_legacy, scores_columnar),
+        ('statistics + scores', stats_legacy + scores_legacy, stats_columnar + scores_columnar)
+    ]:
+        print(f"{label:<28}{legacy * 1000:>13.1f} ms{columnar * 1000:>9.1f} ms{legacy / columnar:>9.1f}x")
+
+    print(f"\nFrame memory: {df.memory_usage(deep=True).sum() / 1024 / 1024:.1f} MB")
+    print(f"Score mismatches (day-boundary rounding): {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
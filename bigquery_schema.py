@@ -0,0 +1,296 @@
+"""
+BigQuery schema management for Maharashtra Governance Platform
+
+Creates the governance_data tables day-partitioned on their date column
+and clustered on the columns the pages filter by, migrates existing
+unpartitioned tables to that layout, and reports the bytes each page
+query scans before and after.
+
+Usage:
+    python bigquery_schema.py create              # create missing tables
+    python bigquery_schema.py migrate --dry-run   # print the migration SQL
+    python bigquery_schema.py migrate             # copy, verify and swap tables
+    python bigquery_schema.py report              # bytes scanned, legacy vs pruned
+"""
+
+from google.cloud import bigquery
+import os
+import argparse
+from datetime import datetime
+from dotenv import load_dotenv
+
+from query_helpers import (
+    QuerySpec,
+    PARTITION_COLUMNS,
+    REQUESTS_QUERY,
+    HIGH_RISK_INFRASTRUCTURE_QUERY,
+    HEALTH_ALERTS_QUERY
+)
+
+# Load environment variables
+load_dotenv()
+
+project_id = os.getenv('GOOGLE_CLOUD_PROJECT_ID')
+DATASET = 'governance_data'
+
+# ==================== TABLE LAYOUTS ====================
+# Partition columns come from query_helpers.PARTITION_COLUMNS so the layout
+# and the lookback filters of the page queries always agree
+
+S = bigquery.SchemaField
+
+TABLE_LAYOUTS = {
+    'citizen_requests': {
+        'schema': [
+            S('request_id', 'STRING', mode='REQUIRED'),
+            S('citizen_name_hash', 'STRING'),
+            S('phone_hash', 'STRING'),
+            S('email', 'STRING'),
+            S('complaint_type', 'STRING'),
+            S('description', 'STRING'),
+            S('city', 'STRING'),
+            S('ward', 'STRING'),
+            S('district', 'STRING'),
+            S('severity', 'STRING'),
+            S('status', 'STRING'),
+            S('affected_count', 'INTEGER'),
+            S('department', 'STRING'),
+            S('date_submitted', 'TIMESTAMP'),
+            S('priority_score', 'FLOAT'),
+            S('resolved_date', 'TIMESTAMP')
+        ],
+        'clustering': ['city', 'status', 'severity']
+    },
+    'health_surveillance': {
+        'schema': [
+            S('record_id', 'STRING', mode='REQUIRED'),
+            S('district', 'STRING'),
+            S('city', 'STRING'),
+            S('disease_type', 'STRING'),
+            S('cases_reported', 'INTEGER'),
+            S('date_reported', 'DATE'),
+            S('trend', 'STRING'),
+            S('alert_level', 'STRING'),
+            S('action_taken', 'STRING')
+        ],
+        'clustering': ['city', 'alert_level', 'disease_type']
+    },
+    'predictions_log': {
+        'schema': [
+            S('prediction_id', 'STRING'),
+            S('request_id', 'STRING'),
+            S('urgency_score', 'FLOAT'),
+            S('escalation_risk', 'FLOAT'),
+            S('predicted_priority', 'STRING'),
+            S('recommended_action', 'STRING'),
+            S('model_version', 'STRING'),
+            S('prediction_timestamp', 'TIMESTAMP')
+        ],
+        'clustering': ['predicted_priority', 'request_id']
+    },
+    'audit_logs': {
+        'schema': [
+            S('log_id', 'STRING'),
+            S('user_role', 'STRING'),
+            S('action', 'STRING'),
+            S('data_accessed', 'STRING'),
+            S('timestamp', 'TIMESTAMP'),
+            S('ip_hash', 'STRING'),
+            S('success', 'BOOLEAN')
+        ],
+        'clustering': ['user_role', 'action']
+    }
+}
+
+
+def table_ref(table):
+    return f"{project_id}.{DATASET}.{table}"
+
+
+def partition_expression(table):
+    """PARTITION BY expression: DATE columns as is, TIMESTAMP columns by day"""
+    column, column_type = PARTITION_COLUMNS[table]
+    return column if column_type == 'DATE' else f"DATE({column})"
+
+
+def has_layout(existing, table):
+    """True when an existing table is already partitioned and clustered as declared"""
+    partitioning = existing.time_partitioning
+    return (partitioning is not None
+            and partitioning.field == PARTITION_COLUMNS[table][0]
+            and list(existing.clustering_fields or []) == TABLE_LAYOUTS[table]['clustering'])
+
+
+def get_table(client, table):
+    try:
+        return client.get_table(table_ref(table))
+    except Exception:
+        return None
+
+# ==================== CREATE ====================
+
+def create_tables(client):
+    """Create the dataset and any missing table with its partitioned, clustered layout"""
+    client.create_dataset(f"{project_id}.{DATASET}", exists_ok=True)
+
+    for table, layout in TABLE_LAYOUTS.items():
+        existing = get_table(client, table)
+        if existing is not None:
+            state = "✓ already partitioned" if has_layout(existing, table) else "⚠️ exists unpartitioned, run migrate"
+            print(f"   {state}: {table}")
+            continue
+
+        new_table = bigquery.Table(table_ref(table), schema=layout['schema'])
+        new_table.time_partitioning = bigquery.TimePartitioning(
+            type_=bigquery.TimePartitioningType.DAY,
+            field=PARTITION_COLUMNS[table][0]
+        )
+        new_table.clustering_fields = layout['clustering']
+        client.create_table(new_table)
+        print(f"   ✅ Created {table} (partitioned by {PARTITION_COLUMNS[table][0]}, "
+              f"clustered by {', '.join(layout['clustering'])})")
+
+# ==================== MIGRATE ====================
+
+def migration_statements(table, backup):
+    """SQL that copies a table into the new layout and swaps it in, keeping the old one as backup"""
+    staging = f"{table}__partitioned"
+    return [
+        f"CREATE TABLE `{table_ref(staging)}`\n"
+        f"PARTITION BY {partition_expression(table)}\n"
+        f"CLUSTER BY {', '.join(TABLE_LAYOUTS[table]['clustering'])}\n"
+        f"AS SELECT * FROM `{table_ref(table)}`",
+        f"ALTER TABLE `{table_ref(table)}` RENAME TO {backup}",
+        f"ALTER TABLE `{table_ref(staging)}` RENAME TO {table}"
+    ]
+
+
+def row_count(client, table):
+    query = f"SELECT COUNT(*) AS n FROM `{table_ref(table)}`"
+    return list(client.query(query).result())[0].n
+
+
+def migrate_tables(client, dry_run=False):
+    """
+    Move every unpartitioned table to its layout: copy into a partitioned,
+    clustered staging table, check the row counts match, then rename the
+    old table to <table>_legacy_<date> and the staging table into place.
+    Nothing is renamed when the counts differ.
+    """
+    suffix = datetime.now().strftime('%Y%m%d')
+
+    for table in TABLE_LAYOUTS:
+        existing = get_table(client, table)
+        if existing is None:
+            print(f"   – {table} does not exist, run create")
+            continue
+        if has_layout(existing, table):
+            print(f"   ✓ {table} already partitioned")
+            continue
+
+        backup = f"{table}_legacy_{suffix}"
+        create_sql, *rename_sql = migration_statements(table, backup)
+        if dry_run:
+            print(f"\n-- {table}")
+            for statement in [create_sql] + rename_sql:
+                print(statement + ";")
+            continue
+
+        print(f"🔄 Migrating {table}...")
+        try:
+            client.query(create_sql).result()
+            before, after = row_count(client, table), row_count(client, f"{table}__partitioned")
+            if before != after:
+                print(f"   ❌ Row count mismatch ({before} vs {after}), {table} left unchanged\n")
+                continue
+            for statement in rename_sql:
+                client.query(statement).result()
+            print(f"   ✅ {before} rows migrated, old table kept as {backup}\n")
+        except Exception as e:
+            print(f"   ❌ Error: {e}\n")
+
+# ==================== BYTES SCANNED REPORT ====================
+
+def report_queries():
+    """(label, legacy SQL, current spec) for every page query and log review"""
+    return [
+        ('citizen_requests', f"SELECT * FROM `{table_ref('citizen_requests')}` ORDER BY date_submitted DESC",
+         REQUESTS_QUERY),
+        ('health_alerts', f"SELECT * FROM `{table_ref('health_surveillance')}` ORDER BY date_reported DESC",
+         HEALTH_ALERTS_QUERY),
+        ('high_risk_infrastructure', f"SELECT * FROM `{table_ref('infrastructure_assets')}` ORDER BY risk_score DESC",
+         HIGH_RISK_INFRASTRUCTURE_QUERY),
+        ('predictions_log (30 days)', f"SELECT * FROM `{table_ref('predictions_log')}`",
+         QuerySpec('predictions_log', lookback_days=30)),
+        ('audit_logs (30 days)', f"SELECT * FROM `{table_ref('audit_logs')}`",
+         QuerySpec('audit_logs', lookback_days=30))
+    ]
+
+
+def dry_run_bytes(client, sql, params=()):
+    """Bytes a query would scan, from a dry run (free, nothing is executed)"""
+    job_config = bigquery.QueryJobConfig(dry_run=True, use_query_cache=False, query_parameters=[
+        bigquery.ArrayQueryParameter(p['name'], p['type'], p['value']) if p['array']
+        else bigquery.ScalarQueryParameter(p['name'], p['type'], p['value'])
+        for p in params
+    ])
+    return client.query(sql, job_config=job_config).total_bytes_processed
+
+
+def format_bytes(n):
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if n < 1024:
+            return f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} TB"
+
+
+def bytes_report(client):
+    """
+    Compare the bytes scanned by the legacy SELECT * queries with the
+    projected, partition-pruned page queries. Dry runs reflect column
+    projection and partition pruning; clustering savings only show up in
+    the bytes billed of real jobs.
+    """
+    print(f"{'Query':<28}{'Legacy':>12}{'Pruned':>12}{'Saved':>8}")
+    total_legacy = total_pruned = 0
+    for label, legacy_sql, spec in report_queries():
+        try:
+            legacy = dry_run_bytes(client, legacy_sql)
+            pruned = dry_run_bytes(client, *spec.to_sql(table_ref(spec.table)))
+        except Exception as e:
+            print(f"{label:<28}  ❌ {e}")
+            continue
+        total_legacy += legacy
+        total_pruned += pruned
+        saved = f"{100 * (1 - pruned / legacy):.0f}%" if legacy else "–"
+        print(f"{label:<28}{format_bytes(legacy):>12}{format_bytes(pruned):>12}{saved:>8}")
+
+    if total_legacy:
+        print(f"{'Total':<28}{format_bytes(total_legacy):>12}{format_bytes(total_pruned):>12}"
+              f"{100 * (1 - total_pruned / total_legacy):>7.0f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the governance_data BigQuery table layout")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('create', help="create missing tables partitioned and clustered")
+    migrate = subparsers.add_parser('migrate', help="move existing tables to the partitioned layout")
+    migrate.add_argument('--dry-run', action='store_true', help="print the SQL without running it")
+    subparsers.add_parser('report', help="bytes scanned by legacy vs partition-pruned queries")
+    args = parser.parse_args()
+
+    client = bigquery.Client(project=project_id)
+    print(f"📍 Project: {project_id}")
+    print(f"📍 Dataset: {DATASET}\n")
+
+    if args.command == 'create':
+        create_tables(client)
+    elif args.command == 'migrate':
+        migrate_tables(client, dry_run=args.dry_run)
+    else:
+        bytes_report(client)
+
+
+if __name__ == "__main__":
+    main()
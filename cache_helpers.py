@@ -0,0 +1,352 @@
+"""
+Versioned cache helpers for Maharashtra Governance Platform
+
+Process-wide cache of datasets keyed by name, replacing whole-cache
+clears. Each dataset carries a version that is bumped on every change:
+  - a write patches the cached value in place of evicting it
+  - invalidation marks one dataset stale without dropping it
+  - derived aggregates are recomputed only when a dataset they depend
+    on changes version
+Refreshes are single-flight and stale-while-revalidate: an expired
+dataset is reloaded in the background while every caller is served the
+previous version, and a failed reload keeps the last good snapshot.
+BackgroundRefresher reloads all datasets on a schedule, concurrently,
+so readers rarely see an expired dataset at all.
+"""
+
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import datetime
+
+import pandas as pd
+
+from metrics_helpers import span, increment, set_gauge
+
+# Seconds between scheduled reloads of every dataset (keep below the TTL)
+REFRESH_INTERVAL_SECONDS = int(os.getenv('DATA_REFRESH_SECONDS', '240'))
+
+# Seconds to wait after a failed reload before a reader triggers another one
+RETRY_AFTER_SECONDS = 30
+
+# Background reload threads (one per dataset is enough to load them all at once)
+REFRESH_WORKERS = 4
+
+
+class VersionedCache:
+    """Keyed, versioned datasets with stampede protection and patch-on-write"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._derived = {}
+        self._executor = ThreadPoolExecutor(max_workers=REFRESH_WORKERS, thread_name_prefix='cache-refresh')
+
+    def register(self, key, loader, ttl=300, timeout=None):
+        """
+        Declare a dataset and the zero-argument function that loads it.
+        timeout caps how long get_many waits for its first load.
+        """
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = {
+                    'loader': loader,
+                    'ttl': ttl,
+                    'timeout': timeout,
+                    'last_load_seconds': None,
+                    'value': None,
+                    'version': 0,
+                    'generation': 0,
+                    'loaded_at': 0.0,
+                    'stale': True,
+                    'refresh_lock': threading.Lock(),
+                    'refreshing': False,
+                    'pending': [],
+                    'patches': 0,
+                    'last_error': None,
+                    'failed_at': 0.0,
+                    'first_load': None
+                }
+
+    def _entry(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            raise KeyError(f"Dataset not registered: {key}")
+        return entry
+
+    def _is_fresh(self, entry):
+        return not entry['stale'] and time.time() - entry['loaded_at'] < entry['ttl']
+
+    def get(self, key):
+        """
+        Current value of a dataset, never waiting on a reload once a first
+        value exists: an expired value is returned as is and reloaded in
+        the background. Only the very first load is waited for; returns
+        None if that load failed.
+        """
+        entry = self._entry(key)
+        if entry['value'] is not None:
+            if self._is_fresh(entry):
+                increment('cache_lookups_total', cache=key, result='hit')
+            else:
+                # Serve the previous version and revalidate in the background
+                increment('cache_lookups_total', cache=key, result='stale')
+                if time.time() - entry['failed_at'] >= RETRY_AFTER_SECONDS:
+                    self.refresh_async(key)
+            return entry['value']
+
+        with entry['refresh_lock']:
+            # Another caller may have finished the first load while we waited for the lock
+            if entry['value'] is None:
+                increment('cache_lookups_total', cache=key, result='miss')
+                self._refresh(key, entry)
+            return entry['value']
+
+    def get_many(self, keys, timeout=None):
+        """
+        Values of several datasets, loading the missing ones concurrently
+        so a cold start costs roughly the slowest single load. Each first
+        load is waited for up to its registered timeout (or timeout); one
+        that takes longer comes back as None and keeps loading in the
+        background. Reruns during a slow first load wait on the same load
+        instead of queueing another. Returns a dict keyed by dataset.
+        """
+        results, futures = {}, {}
+        for key in keys:
+            entry = self._entry(key)
+            if entry['value'] is not None:
+                results[key] = self.get(key)
+                continue
+            with self._lock:
+                future = entry['first_load']
+                if future is None or future.done():
+                    future = entry['first_load'] = self._executor.submit(self.get, key)
+            futures[key] = future
+
+        started = time.time()
+        for key, future in futures.items():
+            limit = self._entries[key]['timeout'] or timeout
+            try:
+                remaining = None if limit is None else max(started + limit - time.time(), 0)
+                results[key] = future.result(timeout=remaining)
+            except FutureTimeout:
+                increment('cache_load_timeouts_total', cache=key)
+                results[key] = None
+        return results
+
+    def refresh_async(self, key):
+        """
+        Reload one dataset on a background thread unless a reload is already
+        running. Returns True when a reload was started.
+        """
+        entry = self._entry(key)
+        if not entry['refresh_lock'].acquire(blocking=False):
+            return False
+
+        def run():
+            try:
+                self._refresh(key, entry)
+            finally:
+                entry['refresh_lock'].release()
+
+        try:
+            self._executor.submit(run)
+        except RuntimeError:
+            entry['refresh_lock'].release()
+            return False
+        return True
+
+    def refresh_all(self):
+        """Start a background reload of every dataset at once"""
+        return [key for key in list(self._entries) if self.refresh_async(key)]
+
+    def _refresh(self, key, entry):
+        """
+        Load a new value and swap it in atomically; caller holds the entry's
+        refresh lock. On failure the last good value stays in place.
+        """
+        with self._lock:
+            entry['refreshing'] = True
+            entry['pending'] = []
+        timer = span('cache_refresh', cache=key)
+        try:
+            with timer:
+                value = entry['loader']()
+        except Exception as e:
+            print(f"Error refreshing {key}: {e}")
+            increment('cache_refresh_errors_total', cache=key)
+            with self._lock:
+                entry['refreshing'] = False
+                entry['last_error'] = str(e)
+                entry['failed_at'] = time.time()
+            return
+
+        with self._lock:
+            # Writes that landed while the load was running are replayed on the new value
+            for patch in entry['pending']:
+                value = patch(value)
+            entry['value'] = value
+            entry['version'] += 1
+            entry['generation'] += 1
+            entry['loaded_at'] = time.time()
+            entry['stale'] = False
+            entry['refreshing'] = False
+            entry['pending'] = []
+            entry['last_error'] = None
+            entry['failed_at'] = 0.0
+            entry['last_load_seconds'] = timer.duration
+        set_gauge('data_snapshot_timestamp_seconds', entry['loaded_at'], cache=key)
+
+    def patch(self, key, func):
+        """
+        Apply a write to the cached value (func takes the old value and
+        returns the new one, which may be the old one updated in place)
+        and bump its version. Nothing is evicted.
+        """
+        entry = self._entry(key)
+        with self._lock:
+            if entry['refreshing']:
+                entry['pending'].append(func)
+            if entry['value'] is not None:
+                entry['value'] = func(entry['value'])
+                entry['version'] += 1
+                entry['patches'] += 1
+        increment('cache_patches_total', cache=key)
+
+    def invalidate(self, key):
+        """Mark one dataset stale; the next reader triggers a reload and everyone keeps the old version meanwhile"""
+        entry = self._entry(key)
+        with self._lock:
+            entry['stale'] = True
+        increment('cache_invalidations_total', cache=key)
+
+    def version(self, key):
+        """Version of a dataset, bumped by every reload and patch"""
+        return self._entry(key)['version']
+
+    def loaded_at(self, key):
+        """Timestamp of the last full load of a dataset (None before the first one)"""
+        return self._entry(key)['loaded_at'] or None
+
+    def last_error(self, key):
+        """Error of the last failed reload of a dataset (None once a reload succeeds)"""
+        return self._entry(key)['last_error']
+
+    def derive(self, name, depends_on, compute):
+        """
+        Aggregate computed from one or more datasets, cached until any of
+        their versions change. compute receives the dataset values in
+        depends_on order.
+        """
+        values = [self.get(key) for key in depends_on]
+        versions = tuple(self.version(key) for key in depends_on)
+        with self._lock:
+            cached = self._derived.get(name)
+            if cached is not None and cached[0] == versions:
+                increment('cache_lookups_total', cache=name, result='hit')
+                return cached[1]
+
+        increment('cache_lookups_total', cache=name, result='miss')
+        with span('cache_derive', cache=name):
+            result = compute(*values)
+        with self._lock:
+            self._derived[name] = (versions, result)
+        return result
+
+    def describe(self):
+        """One dict per dataset with version, generation, age, patches, last load time and last error"""
+        now = time.time()
+        with self._lock:
+            return [{
+                'dataset': key,
+                'version': entry['version'],
+                'generation': entry['generation'],
+                'age_seconds': round(now - entry['loaded_at'], 1) if entry['loaded_at'] else None,
+                'stale': not self._is_fresh(entry),
+                'patches': entry['patches'],
+                'last_load_seconds': round(entry['last_load_seconds'], 3) if entry['last_load_seconds'] else None,
+                'last_error': entry['last_error']
+            } for key, entry in self._entries.items()]
+
+
+class BackgroundRefresher:
+    """Daemon thread reloading every dataset of a cache on a fixed interval"""
+
+    def __init__(self, cache, interval=REFRESH_INTERVAL_SECONDS):
+        self.cache = cache
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='cache-refresher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            started = self.cache.refresh_all()
+            increment('cache_scheduled_refreshes_total', value=len(started))
+
+
+def _record_frame(records, columns=None):
+    """One-row-per-record frame with naive timestamps and days_open, in the cached frame's columns"""
+    rows = pd.DataFrame(records)
+    if columns is not None:
+        rows = rows.reindex(columns=columns)
+    for column in ('date_submitted', 'resolved_date'):
+        if column in rows.columns:
+            dates = pd.to_datetime(rows[column])
+            rows[column] = dates.dt.tz_localize(None) if dates.dt.tz is not None else dates
+    if 'date_submitted' in rows.columns:
+        rows['days_open'] = (datetime.now() - rows['date_submitted']).dt.days
+    return rows
+
+
+def _insert_position(df, submitted):
+    """Row position for a new row in a frame ordered newest first: after every newer row"""
+    if 'date_submitted' not in df.columns or pd.isna(submitted):
+        return 0
+    dates = df['date_submitted'].to_numpy()
+    # Newest first with missing dates last: search the dated head, reversed into ascending order
+    dated = int(pd.notna(dates).sum())
+    ascending = dates[:dated][::-1]
+    return dated - int(ascending.searchsorted(pd.Timestamp(submitted).to_datetime64(), side='right'))
+
+
+def upsert_frame_rows(df, records, key='request_id', delete=False):
+    """
+    Patch function body for request-style frames kept newest first by
+    date_submitted. A record whose row exists with the same date_submitted
+    is written into that row in place (a status update, the common case);
+    a new record is inserted at its place by date_submitted with a binary
+    search instead of re-sorting the frame, and deletes drop their rows.
+    """
+    if df.empty:
+        return df if delete else _record_frame(records)
+
+    for record in records:
+        matches = (df[key].to_numpy() == record.get(key)).nonzero()[0]
+        if delete:
+            if len(matches):
+                df = df.drop(df.index[matches]).reset_index(drop=True)
+            continue
+
+        row = _record_frame([record], df.columns)
+        submitted = row['date_submitted'].iloc[0] if 'date_submitted' in row.columns else None
+        if len(matches) and (submitted is None or submitted == df['date_submitted'].iloc[matches[0]]):
+            # Same place in the order: overwrite the fields the record carries, in place
+            columns = [column for column in df.columns if column in record or column == 'days_open']
+            for column in columns:
+                df.iat[matches[0], df.columns.get_loc(column)] = row[column].iloc[0]
+            continue
+        if len(matches):
+            df = df.drop(df.index[matches]).reset_index(drop=True)
+        position = _insert_position(df, submitted)
+        df = pd.concat([df.iloc[:position], row, df.iloc[position:]], ignore_index=True)
+    return df
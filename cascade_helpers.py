@@ -0,0 +1,284 @@
+"""
+Analysis cascade helpers for Maharashtra Governance Platform
+
+Answers routine complaint analyses locally and sends only uncertain or
+high-impact requests to Gemini:
+  - the rule model (get_fallback_prediction, also the BigQuery backend's
+    fallback when Gemini fails) scores urgency, escalation risk and
+    resolution days for every request
+  - a history model fitted on predictions_log (Gemini's past answers
+    joined to their requests) knows, per complaint type and severity,
+    which priority Gemini usually predicts and how consistently
+  - a request is answered locally when it is not high-impact, its group
+    has at least CASCADE_MIN_SAMPLES past Gemini answers and at least
+    CASCADE_CONFIDENCE of them agree; everything else escalates
+Escalated requests are scored locally too, so the agreement between the
+local answer and Gemini is measured on live traffic as well as replayed
+over the history.
+"""
+
+import os
+import time
+import uuid
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+from metrics_helpers import increment, sum_counter, set_gauge
+
+# Default for the "answer routine requests locally" switch
+CASCADE_ENABLED = os.getenv('CASCADE_ENABLED', 'true').lower() == 'true'
+
+# Share of past Gemini answers that must agree before a group is answered locally
+CASCADE_CONFIDENCE = float(os.getenv('CASCADE_CONFIDENCE', '0.8'))
+
+# Past Gemini answers a complaint type / severity group needs before it is trusted
+CASCADE_MIN_SAMPLES = int(os.getenv('CASCADE_MIN_SAMPLES', '5'))
+
+# High-impact requests always go to Gemini
+CASCADE_ESCALATE_SEVERITIES = ('Critical',)
+CASCADE_MAX_AFFECTED = int(os.getenv('CASCADE_MAX_AFFECTED', '500'))
+
+# Days of predictions_log history the model is fitted on, and seconds between refits
+CASCADE_HISTORY_DAYS = int(os.getenv('CASCADE_HISTORY_DAYS', '90'))
+CASCADE_REFIT_SECONDS = 3600
+
+# predictions_log model_version by prediction source; only Gemini's answers are learned from
+GEMINI_MODEL_VERSION = 'gemini-1.5-flash'
+MODEL_VERSIONS = {'local': 'cascade-local', 'rules': 'rules-fallback'}
+
+
+def get_fallback_prediction(complaint_data):
+    """Generate a rule-based prediction when AI fails"""
+    severity = complaint_data.get('severity', 'Medium')
+    affected = complaint_data.get('affected_count', 0)
+    days_open = complaint_data.get('days_open', 0)
+
+    # Calculate urgency score
+    severity_scores = {'Critical': 9.0, 'High': 7.0, 'Medium': 5.0, 'Low': 3.0}
+    base_score = severity_scores.get(severity, 5.0)
+
+    # Add points for affected citizens and days open
+    urgency_score = min(base_score + (affected / 200) + (days_open * 0.1), 10.0)
+
+    # Calculate escalation risk
+    escalation_risk = min(40 + (days_open * 2) + (affected / 20), 95)
+
+    # Estimate resolution days
+    resolution_days = {'Critical': 2, 'High': 5, 'Medium': 7, 'Low': 10}.get(severity, 7)
+
+    return {
+        "urgency_score": round(urgency_score, 1),
+        "escalation_risk_percent": int(escalation_risk),
+        "predicted_priority": severity,
+        "recommended_action": f"Assign to {complaint_data.get('department', 'relevant department')} immediately. Target resolution: {resolution_days} days.",
+        "estimated_resolution_days": resolution_days,
+        "resource_requirements": f"Deploy {2 if severity == 'Critical' else 1} team(s) with standard equipment and budget allocation.",
+        "similar_patterns": "Analysis based on severity level, affected population, and response time.",
+        "prevention_measures": "Regular infrastructure maintenance and proactive monitoring recommended.",
+        "impact_analysis": f"Affects {affected} citizens. Delayed resolution may increase public dissatisfaction.",
+        "reasoning": f"Based on {severity} severity level, {affected} affected citizens, and {days_open} days already open. Rule-based analysis applied.",
+        "source": "rules"
+    }
+
+
+def prediction_row(request_id, prediction):
+    """predictions_log row for an analysis (the columns both backends share)"""
+    model_version = MODEL_VERSIONS.get(prediction.get('source'), GEMINI_MODEL_VERSION)
+    return {
+        'prediction_id': f"PRED_{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}",
+        'request_id': request_id,
+        'urgency_score': float(prediction.get('urgency_score', 0)),
+        'escalation_risk': float(prediction.get('escalation_risk_percent', 0)),
+        'predicted_priority': prediction.get('predicted_priority', 'Medium'),
+        'recommended_action': prediction.get('recommended_action'),
+        'model_version': model_version,
+        'prediction_timestamp': datetime.now()
+    }
+
+
+def history_frame(predictions, requests):
+    """
+    Gemini predictions joined to the complaint type, severity and affected
+    count of their requests (latest prediction per request)
+    """
+    columns = ['request_id', 'complaint_type', 'severity', 'affected_count', 'predicted_priority', 'urgency_score']
+    if predictions is None or predictions.empty or requests is None or requests.empty:
+        return pd.DataFrame(columns=columns)
+    gemini = predictions[predictions['model_version'].fillna('').str.startswith('gemini')]
+    gemini = gemini.sort_values('prediction_timestamp').drop_duplicates('request_id', keep='last')
+    merged = gemini[['request_id', 'predicted_priority', 'urgency_score']].merge(
+        requests[['request_id', 'complaint_type', 'severity', 'affected_count']], on='request_id')
+    # groupby drops null keys, so rows missing one would have no group to be scored against
+    merged = merged.dropna(subset=['complaint_type', 'severity', 'predicted_priority'])
+    merged['severity'] = merged['severity'].astype(str)
+    return merged[columns]
+
+
+class AnalysisCascade:
+    """
+    Local-first complaint analysis. rules(complaint) returns a rule-based
+    prediction; escalate(complaint) returns Gemini's; load_history() returns
+    the history_frame refresh refits on (it may run on a worker thread).
+    """
+
+    def __init__(self, rules, escalate, load_history=None, confidence=CASCADE_CONFIDENCE,
+                 min_samples=CASCADE_MIN_SAMPLES, max_affected=CASCADE_MAX_AFFECTED,
+                 escalate_severities=CASCADE_ESCALATE_SEVERITIES):
+        self._rules = rules
+        self._escalate = escalate
+        self._load_history = load_history
+        self._refit_lock = threading.Lock()
+        self.confidence = confidence
+        self.min_samples = min_samples
+        self.max_affected = max_affected
+        self.escalate_severities = escalate_severities
+        self._lock = threading.Lock()
+        self._groups = {}
+        self._history = pd.DataFrame()
+        self.fitted_at = None
+
+    # ==================== HISTORY MODEL ====================
+
+    def fit(self, history):
+        """Fit the per complaint type / severity priority table on a history_frame"""
+        groups = {}
+        if not history.empty:
+            counts = history.groupby(['complaint_type', 'severity', 'predicted_priority']).size()
+            urgency = history.groupby(['complaint_type', 'severity'])['urgency_score'].mean()
+            for (complaint_type, severity), group in counts.groupby(level=[0, 1]):
+                samples = int(group.sum())
+                priority = group.idxmax()[2]
+                groups[(complaint_type, severity)] = {
+                    'counts': group.droplevel([0, 1]).to_dict(),
+                    'priority': priority,
+                    'share': group.max() / samples,
+                    'samples': samples,
+                    'urgency': round(float(urgency[(complaint_type, severity)]), 1)
+                }
+        with self._lock:
+            self._groups = groups
+            self._history = history
+            self.fitted_at = time.time()
+        set_gauge('cascade_history_rows', len(history))
+
+    def _stale(self, max_age):
+        return self.fitted_at is None or time.time() - self.fitted_at > max_age
+
+    def refresh(self, load_history=None, max_age=CASCADE_REFIT_SECONDS):
+        """
+        Refit from load_history() (the cascade's own loader by default) when
+        the model is older than max_age seconds; concurrent callers share
+        one refit
+        """
+        if not self._stale(max_age):
+            return
+        with self._refit_lock:
+            if self._stale(max_age):
+                self.fit((load_history or self._load_history)())
+
+    def group(self, complaint_type, severity):
+        with self._lock:
+            return self._groups.get((complaint_type, str(severity)))
+
+    # ==================== CASCADE ====================
+
+    def _route(self, severity, affected, entry):
+        """None when a request can be answered locally, else why it escalates"""
+        if severity in self.escalate_severities:
+            return 'high_severity'
+        if affected >= self.max_affected:
+            return 'high_impact'
+        if entry is None or entry['samples'] < self.min_samples:
+            return 'no_history'
+        if entry['share'] < self.confidence:
+            return 'uncertain'
+        return None
+
+    def local(self, complaint):
+        """(local prediction, escalation reason or None when it is confident)"""
+        prediction = dict(self._rules(complaint))
+        severity = str(complaint.get('severity', 'Medium'))
+        entry = self.group(complaint.get('complaint_type'), severity)
+        if entry is not None:
+            prediction['predicted_priority'] = entry['priority']
+            prediction['urgency_score'] = round((prediction['urgency_score'] + entry['urgency']) / 2, 1)
+            prediction['reasoning'] = (
+                f"Gemini rated {entry['share']:.0%} of {entry['samples']} past {complaint.get('complaint_type')} "
+                f"requests of {severity} severity as {entry['priority']}. Scores from the rule model, "
+                f"averaged with Gemini's past urgency for the group ({entry['urgency']}).")
+        prediction['source'] = 'local'
+        return prediction, self._route(severity, float(complaint.get('affected_count') or 0), entry)
+
+    def decide(self, complaint, enabled=True):
+        """(local prediction, True when it answers the request and Gemini is not needed)"""
+        local, reason = self.local(complaint)
+        if enabled and reason is None:
+            increment('cascade_decisions_total', route='local', reason='confident')
+            return local, True
+        increment('cascade_decisions_total', route='gemini', reason=reason or 'disabled')
+        return local, False
+
+    def compare(self, local, prediction):
+        """Record whether an escalated request's local answer matched Gemini's priority"""
+        if prediction and prediction.get('source') != 'rules':
+            agree = prediction.get('predicted_priority') == local['predicted_priority']
+            increment('cascade_agreement_total', agree='yes' if agree else 'no')
+
+    def analyze(self, complaint, enabled=True):
+        """Local answer for confident requests, Gemini's for the rest (or for all when not enabled)"""
+        local, answered = self.decide(complaint, enabled)
+        if answered:
+            return local
+        prediction = self._escalate(complaint)
+        self.compare(local, prediction)
+        return prediction
+
+    # ==================== REPORTING ====================
+
+    def report(self):
+        """Live call reduction and agreement since the process started"""
+        local = sum_counter('cascade_decisions_total', route='local')
+        escalated = sum_counter('cascade_decisions_total', route='gemini')
+        agreed = sum_counter('cascade_agreement_total', agree='yes')
+        compared = agreed + sum_counter('cascade_agreement_total', agree='no')
+        return {
+            'answered_locally': local,
+            'escalated': escalated,
+            'call_reduction': local / (local + escalated) if local + escalated else None,
+            'agreement': agreed / compared if compared else None
+        }
+
+    def evaluate(self):
+        """
+        Replay of the fitted history: the share of past Gemini calls the
+        cascade would have answered locally, and how often the local answer
+        matched Gemini. Each request is scored leaving its own answer out
+        of its group.
+        """
+        with self._lock:
+            history, groups = self._history, self._groups
+        if history.empty:
+            return {'requests': 0, 'answered_locally': 0, 'call_reduction': None, 'agreement': None}
+
+        local = agreed = 0
+        for row in history.itertuples(index=False):
+            entry = groups.get((row.complaint_type, row.severity))
+            if entry is None or row.predicted_priority not in entry['counts']:
+                continue
+            counts = dict(entry['counts'])
+            counts[row.predicted_priority] -= 1
+            samples = entry['samples'] - 1
+            priority = max(counts, key=counts.get)
+            held_out = {'samples': samples, 'priority': priority,
+                        'share': counts[priority] / samples if samples else 0}
+            if self._route(row.severity, float(row.affected_count or 0), held_out) is None:
+                local += 1
+                agreed += priority == row.predicted_priority
+        return {
+            'requests': len(history),
+            'answered_locally': local,
+            'call_reduction': local / len(history),
+            'agreement': agreed / local if local else None
+        }
@@ -0,0 +1,102 @@
+"""
+Chart helpers for Maharashtra Governance Platform
+
+Plotly figures are built once per version of the data they show and kept
+as compact specs, so a rerun with unchanged data only ships the cached
+spec to the browser:
+  - cached_figure builds through VersionedCache.derive, keyed by the
+    versions of the datasets the figure depends on
+  - compact_figure rounds float arrays, turns numpy arrays into plain
+    lists and drops template trace defaults for trace types the figure
+    does not use
+  - downsample_lttb thins long line series to a fixed number of points
+    while keeping their visual shape (Largest-Triangle-Three-Buckets)
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+
+from metrics_helpers import set_gauge
+
+# Points kept on a line chart before it is downsampled
+MAX_LINE_POINTS = 200
+
+# Decimals kept in float arrays of a figure spec
+FIGURE_DECIMALS = 2
+
+
+def downsample_lttb(df, x, y, threshold=MAX_LINE_POINTS):
+    """
+    Rows of df (sorted by x) reduced to threshold rows with
+    Largest-Triangle-Three-Buckets: the first and last points are kept and
+    every bucket in between contributes the point forming the largest
+    triangle with its neighbours, so peaks and dips survive.
+    """
+    n = len(df)
+    if threshold >= n or threshold < 3:
+        return df
+
+    xs = pd.to_datetime(df[x]).map(pd.Timestamp.timestamp).to_numpy(dtype=float) \
+        if not np.issubdtype(df[x].dtype, np.number) else df[x].to_numpy(dtype=float)
+    ys = df[y].to_numpy(dtype=float)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+
+    keep = [0]
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket (the last point for the final bucket)
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = xs[end:next_end].mean() if next_end > end else xs[-1]
+        avg_y = ys[end:next_end].mean() if next_end > end else ys[-1]
+
+        a = keep[-1]
+        areas = np.abs((xs[a] - avg_x) * (ys[start:end] - ys[a]) - (xs[a] - xs[start:end]) * (avg_y - ys[a]))
+        keep.append(start + int(areas.argmax()))
+    keep.append(n - 1)
+    return df.iloc[keep]
+
+
+def _compact(value, decimals):
+    if isinstance(value, np.ndarray):
+        if np.issubdtype(value.dtype, np.floating):
+            value = np.round(value, decimals)
+        return value.tolist()
+    if isinstance(value, dict):
+        return {key: _compact(item, decimals) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_compact(item, decimals) for item in value]
+    if isinstance(value, (float, np.floating)):
+        return round(float(value), decimals)
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+
+def compact_figure(fig, decimals=FIGURE_DECIMALS):
+    """
+    Plotly figure as a compact spec dict for st.plotly_chart: float arrays
+    rounded, numpy arrays as lists, and the template's per-trace-type
+    defaults kept only for trace types in the figure (the template layout
+    stays, Streamlit's theme is applied on top of it)
+    """
+    spec = fig.to_plotly_json()
+    trace_types = {trace.get('type', 'scatter') for trace in spec['data']}
+    template = spec['layout'].get('template')
+    if isinstance(template, dict) and 'data' in template:
+        template['data'] = {key: value for key, value in template['data'].items() if key in trace_types}
+    return {'data': _compact(spec['data'], decimals), 'layout': _compact(spec['layout'], decimals)}
+
+
+def cached_figure(cache, name, depends_on, build):
+    """
+    Compact spec of a figure, rebuilt only when one of the datasets it
+    depends on changes version. build receives the dataset values in
+    depends_on order and returns a Plotly figure.
+    """
+    def compute(*values):
+        spec = compact_figure(build(*values))
+        set_gauge('figure_payload_bytes', len(json.dumps(spec, default=str)), figure=name)
+        return spec
+    return cache.derive(f"figure:{name}", depends_on, compute)
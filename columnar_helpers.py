@@ -0,0 +1,89 @@
+"""
+Columnar result helpers for Maharashtra Governance Platform
+
+Decodes PostgREST JSON rows into typed pandas frames once, instead of
+passing lists of dicts around and re-parsing values per row:
+  - ISO-8601 timestamps are parsed in one vectorized pass into naive UTC
+    datetime64 columns (see parse_timestamps)
+  - the CHECK-constrained text columns (severity, status, alert level,
+    trend, condition) become categoricals
+  - numeric columns are coerced to numbers (PostgREST may send numeric
+    values as strings)
+Statistics and priority scores are then computed on whole columns.
+"""
+
+import pandas as pd
+
+# Value sets of the enum-like text columns (from the table CHECK constraints)
+ENUM_COLUMNS = {
+    'severity': ['Critical', 'High', 'Medium', 'Low'],
+    'status': ['Open', 'In Progress', 'Resolved'],
+    'alert_level': ['Green', 'Yellow', 'Orange', 'Red'],
+    'trend': ['Increasing', 'Decreasing', 'Stable'],
+    'condition': ['Excellent', 'Good', 'Fair', 'Poor', 'Critical']
+}
+
+TIMESTAMP_COLUMNS = ['date_submitted', 'resolved_date', 'prediction_timestamp', 'timestamp', 'created_at', 'updated_at']
+DATE_COLUMNS = ['date_reported', 'last_maintenance', 'next_maintenance_due']
+NUMERIC_COLUMNS = ['affected_count', 'cases_reported', 'capacity', 'current_usage', 'estimated_resolution_days',
+                   'priority_score', 'risk_score', 'urgency_score', 'escalation_risk']
+
+
+def parse_timestamps(values):
+    """
+    Naive UTC datetimes from a column of ISO-8601 strings. PostgREST sends
+    timestamptz values in UTC, so when every offset is +00:00 it is cut
+    off and the rest is parsed naive, several times faster than parsing
+    the offset of each value.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.dt.tz_convert(None) if values.dt.tz is not None else values
+    present = values.dropna()
+    if len(present) and isinstance(present.iloc[0], str) and present.str.endswith('+00:00').all():
+        return pd.to_datetime(values.str.slice(0, -6), format='ISO8601')
+    return pd.to_datetime(values, format='ISO8601', utc=True).dt.tz_localize(None)
+
+
+def typed_frame(rows):
+    """
+    Typed frame from PostgREST rows (a list of dicts or an untyped frame).
+    Request frames also get days_open, as on the BigQuery path.
+    """
+    df = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame.from_records(rows)
+    if df.empty:
+        return df
+    df = df.copy()
+
+    for column in TIMESTAMP_COLUMNS:
+        if column in df.columns:
+            df[column] = parse_timestamps(df[column])
+    for column in DATE_COLUMNS:
+        if column in df.columns:
+            df[column] = pd.to_datetime(df[column], format='ISO8601')
+    for column in NUMERIC_COLUMNS:
+        if column in df.columns:
+            df[column] = pd.to_numeric(df[column], errors='coerce')
+    for column, values in ENUM_COLUMNS.items():
+        if column in df.columns:
+            # Unknown values get their own category rather than becoming NaN
+            extra = sorted(set(df[column].dropna().astype(str)) - set(values))
+            df[column] = pd.Categorical(df[column], categories=values + extra)
+
+    if 'date_submitted' in df.columns:
+        df['days_open'] = (pd.Timestamp.now() - df['date_submitted']).dt.days
+    return df
+
+
+def request_statistics(df):
+    """Overall request statistics, same keys as utils_helpers.get_statistics_summary"""
+    if df.empty:
+        return {}
+    return {
+        "total_requests": len(df),
+        "open_requests": int((df['status'] == 'Open').sum()),
+        "critical_requests": int((df['severity'] == 'Critical').sum()),
+        "total_affected": int(df['affected_count'].sum()),
+        "avg_affected": int(df['affected_count'].mean()),
+        "most_common_type": df['complaint_type'].mode()[0],
+        "most_affected_city": df['city'].mode()[0]
+    }
@@ -0,0 +1,257 @@
+"""
+Near-duplicate complaint detection for Maharashtra Governance Platform
+
+Groups complaints describing the same incident (the same pipeline burst
+reported by hundreds of citizens) using MinHash signatures and
+locality-sensitive hashing, blocked by city and ward. Analysis,
+prioritization and workload can then be computed once per incident.
+"""
+
+import zlib
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from metrics_helpers import span, increment, set_gauge
+
+# MinHash / LSH parameters: 16 bands x 4 rows puts the LSH threshold near 0.5
+NUM_PERM = 64
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERM // LSH_BANDS
+
+# Estimated Jaccard similarity needed to join an existing incident
+SIMILARITY_THRESHOLD = 0.6
+
+# Complaints further apart than this are treated as separate incidents
+INCIDENT_WINDOW_DAYS = 14
+
+# Character shingle length over the normalized description
+SHINGLE_SIZE = 4
+
+SEVERITY_RANK = {'Low': 1, 'Medium': 2, 'High': 3, 'Critical': 4}
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_rng = np.random.RandomState(20251115)
+_PERM_A = _rng.randint(1, 1 << 31, size=NUM_PERM).astype(np.uint64)
+_PERM_B = _rng.randint(0, 1 << 31, size=NUM_PERM).astype(np.uint64)
+
+
+def _normalize(text):
+    return ' '.join(''.join(ch if ch.isalnum() else ' ' for ch in str(text or '').lower()).split())
+
+
+def shingle_hashes(text):
+    """CRC32 hashes of the character shingles of a description"""
+    normalized = _normalize(text)
+    if len(normalized) <= SHINGLE_SIZE:
+        shingles = {normalized}
+    else:
+        shingles = {normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+    return np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles))
+
+
+def minhash_signature(text):
+    """MinHash signature (NUM_PERM values) of a description"""
+    hashes = shingle_hashes(text)
+    # (a * x + b) mod p for every permutation and shingle; a, x < 2^32 so no overflow
+    permuted = (_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) % _MERSENNE_PRIME
+    return permuted.min(axis=1)
+
+
+def estimate_similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity from two MinHash signatures"""
+    return float(np.mean(sig_a == sig_b))
+
+
+def _as_datetime(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    ts = pd.Timestamp(value)
+    if pd.isna(ts):
+        return None
+    if ts.tzinfo is not None:
+        ts = ts.tz_localize(None)
+    return ts.to_pydatetime()
+
+
+class IncidentIndex:
+    """
+    Incrementally clusters requests into incidents.
+
+    Each request is signed once; LSH buckets are keyed by (city, ward,
+    band, band values) and hold incident IDs, so only incidents from the
+    same place are compared and a thousand identical reports still cost
+    one comparison. A request joins the most similar recent incident
+    above SIMILARITY_THRESHOLD, otherwise it opens a new incident.
+    """
+
+    def __init__(self, threshold=SIMILARITY_THRESHOLD, window_days=INCIDENT_WINDOW_DAYS):
+        self.threshold = threshold
+        self.window = timedelta(days=window_days)
+        self._lock = threading.RLock()
+        self._buckets = {}
+        self._incident_of = {}
+        self._incidents = {}
+        self.synced_version = None
+
+    def __len__(self):
+        return len(self._incidents)
+
+    def _band_keys(self, signature, city, ward):
+        for band in range(LSH_BANDS):
+            rows = signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+            yield (city, ward, band, rows.tobytes())
+
+    def assign(self, record):
+        """Place one request (dict-like) in an incident and return the incident ID"""
+        request_id = record.get('request_id')
+        with self._lock:
+            if request_id in self._incident_of:
+                incident_id = self._incident_of[request_id]
+                self._update_incident(self._incidents[incident_id], record)
+                return incident_id
+
+            city, ward = record.get('city'), record.get('ward')
+            submitted = _as_datetime(record.get('date_submitted')) or datetime.now()
+            signature = minhash_signature(record.get('description'))
+
+            # Candidate incidents share at least one LSH band in the same city and ward
+            candidates = set()
+            for key in self._band_keys(signature, city, ward):
+                candidates.update(self._buckets.get(key, ()))
+
+            best_incident, best_similarity = None, self.threshold
+            for candidate in candidates:
+                incident = self._incidents[candidate]
+                if submitted > incident['last_seen'] + self.window or submitted < incident['first_seen'] - self.window:
+                    continue
+                similarity = estimate_similarity(signature, incident['signature'])
+                if similarity >= best_similarity:
+                    best_incident, best_similarity = incident, similarity
+
+            if best_incident is None:
+                incident_id = f"INC-{request_id}"
+                best_incident = {
+                    'incident_id': incident_id,
+                    'representative_id': request_id,
+                    'request_ids': [],
+                    'complaint_type': record.get('complaint_type'),
+                    'description': record.get('description'),
+                    'city': city,
+                    'ward': ward,
+                    'department': record.get('department'),
+                    'severity': record.get('severity'),
+                    'signature': signature,
+                    'statuses': {},
+                    'affected_count': 0,
+                    'first_seen': submitted,
+                    'last_seen': submitted
+                }
+                self._incidents[incident_id] = best_incident
+                increment('dedup_incidents_total')
+            else:
+                increment('dedup_duplicates_total')
+
+            best_incident['request_ids'].append(request_id)
+            self._incident_of[request_id] = best_incident['incident_id']
+            # Register this report's bands too, widening recall for later variants
+            for key in self._band_keys(signature, city, ward):
+                self._buckets.setdefault(key, set()).add(best_incident['incident_id'])
+
+            self._update_incident(best_incident, record, submitted)
+            return best_incident['incident_id']
+
+    def _update_incident(self, incident, record, submitted=None):
+        request_id = record.get('request_id')
+        previous = incident.get('_members', {}).get(request_id)
+        members = incident.setdefault('_members', {})
+
+        # Undo the previous status of this request before applying the new one
+        if previous:
+            incident['statuses'][previous['status']] -= 1
+
+        affected = int(record.get('affected_count') or 0)
+        status = record.get('status') or 'Open'
+        members[request_id] = {'affected_count': affected, 'status': status}
+        incident['statuses'][status] = incident['statuses'].get(status, 0) + 1
+
+        # Reporters of one incident describe the same population, so take the
+        # largest estimate rather than summing duplicates
+        if previous and previous['affected_count'] == incident['affected_count']:
+            incident['affected_count'] = max(m['affected_count'] for m in members.values())
+        else:
+            incident['affected_count'] = max(incident['affected_count'], affected)
+
+        severity = record.get('severity')
+        if SEVERITY_RANK.get(severity, 0) > SEVERITY_RANK.get(incident['severity'], 0):
+            incident['severity'] = severity
+        if submitted is not None:
+            incident['first_seen'] = min(incident['first_seen'], submitted)
+            incident['last_seen'] = max(incident['last_seen'], submitted)
+
+    def sync(self, requests_df, version=None):
+        """Cluster every request in a DataFrame; skipped when version is unchanged"""
+        if requests_df is None or requests_df.empty:
+            return 0
+        if version is not None and version == self.synced_version:
+            return 0
+
+        columns = [c for c in ['request_id', 'description', 'city', 'ward', 'complaint_type', 'department',
+                               'severity', 'status', 'affected_count', 'date_submitted'] if c in requests_df.columns]
+        # Oldest first so the earliest report becomes the incident representative
+        ordered = requests_df[columns].sort_values('date_submitted') if 'date_submitted' in columns else requests_df[columns]
+        with span('dedup_sync'):
+            for record in ordered.to_dict('records'):
+                self.assign(record)
+            self.synced_version = version
+        set_gauge('dedup_incidents', len(self._incidents))
+        set_gauge('dedup_requests', len(self._incident_of))
+        return len(ordered)
+
+    def incident_of(self, request_id):
+        """Incident ID a request belongs to, or None if it was never clustered"""
+        return self._incident_of.get(request_id)
+
+    def incident(self, incident_id):
+        """Summary dict of one incident"""
+        with self._lock:
+            incident = self._incidents.get(incident_id)
+            return self._summary(incident) if incident else None
+
+    def _summary(self, incident):
+        statuses = incident['statuses']
+        open_reports = statuses.get('Open', 0) + statuses.get('In Progress', 0)
+        if statuses.get('Open', 0):
+            status = 'Open'
+        elif statuses.get('In Progress', 0):
+            status = 'In Progress'
+        else:
+            status = 'Resolved'
+        return {
+            'incident_id': incident['incident_id'],
+            'representative_id': incident['representative_id'],
+            'report_count': len(incident['request_ids']),
+            'open_reports': open_reports,
+            'status': status,
+            'complaint_type': incident['complaint_type'],
+            'description': incident['description'],
+            'city': incident['city'],
+            'ward': incident['ward'],
+            'department': incident['department'],
+            'severity': incident['severity'],
+            'affected_count': incident['affected_count'],
+            'first_seen': incident['first_seen'],
+            'last_seen': incident['last_seen'],
+            'days_open': (datetime.now() - incident['first_seen']).days
+        }
+
+    def incidents_frame(self, open_only=False):
+        """One row per incident with highest severity, largest affected estimate and report count"""
+        with self._lock:
+            rows = [self._summary(incident) for incident in self._incidents.values()]
+        frame = pd.DataFrame(rows)
+        if open_only and not frame.empty:
+            frame = frame[frame['open_reports'] > 0]
+        return frame
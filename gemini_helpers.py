@@ -0,0 +1,412 @@
+"""
+Gemini call helpers for Maharashtra Governance Platform
+
+Single-flight coalescing of identical Gemini requests: when several
+sessions send the same prompt with the same generation config while a
+call for it is still running, only the first one reaches the API and the
+others wait for and share its result (or its error). Nothing is cached
+after the call finishes; this only removes duplicate in-flight work.
+
+Admission control keeps the process inside the Gemini quota: every
+upstream call takes one request from a requests-per-minute token bucket
+and its estimated tokens from a tokens-per-minute bucket. Callers queue
+by priority (critical complaints first, forecasts last), and a call that
+cannot be admitted in time is shed with GeminiOverloaded so the caller
+can fall back instead of hitting a quota error.
+
+stream_text is the streaming counterpart of generate_text, admitted and
+coalesced the same way: one background thread reads the upstream stream
+into a shared chunk buffer, and every caller of the same request replays
+the chunks buffered so far and then follows new ones as they arrive. A
+caller that stops reading (a session rerun) leaves the others unaffected.
+"""
+
+import os
+import json
+import time
+import heapq
+import hashlib
+import itertools
+import threading
+
+from metrics_helpers import span, increment, set_gauge, observe, TOKEN_BUCKETS
+
+# Process-wide Gemini budget (defaults: gemini-1.5-flash free tier)
+GEMINI_RPM = int(os.getenv('GEMINI_RPM', '15'))
+GEMINI_TPM = int(os.getenv('GEMINI_TPM', '1000000'))
+
+# Admission priorities, most urgent first
+PRIORITY_CRITICAL = 0
+PRIORITY_HIGH = 1
+PRIORITY_NORMAL = 2
+PRIORITY_FORECAST = 3
+
+SEVERITY_PRIORITIES = {'Critical': PRIORITY_CRITICAL, 'High': PRIORITY_HIGH}
+
+# Seconds a caller may wait in the queue before being shed, per priority
+MAX_WAIT_SECONDS = {
+    PRIORITY_CRITICAL: 30,
+    PRIORITY_HIGH: 20,
+    PRIORITY_NORMAL: 10,
+    PRIORITY_FORECAST: 5
+}
+
+# Queue depth above which normal and forecast calls are shed on arrival
+MAX_QUEUE_DEPTH = 20
+
+# Seconds no call is admitted after the API reports an exhausted quota
+QUOTA_BACKOFF_SECONDS = 30
+
+# Output tokens assumed when the generation config sets no max_output_tokens
+DEFAULT_OUTPUT_TOKENS = 1024
+
+
+class GeminiOverloaded(Exception):
+    """A Gemini call was shed by admission control"""
+
+
+def priority_for(severity):
+    """Admission priority of a complaint analysis by severity"""
+    return SEVERITY_PRIORITIES.get(severity, PRIORITY_NORMAL)
+
+
+def estimate_tokens(prompt, generation_config=None):
+    """Tokens a call may use: prompt (about 4 characters per token) plus the output budget"""
+    max_output = (generation_config or {}).get('max_output_tokens', DEFAULT_OUTPUT_TOKENS)
+    return len(prompt) // 4 + max_output
+
+
+def _is_quota_error(error):
+    return type(error).__name__ in ('ResourceExhausted', 'TooManyRequests') or '429' in str(error)
+
+
+def fallback_reason(error):
+    """gemini_fallback_total reason label for an error raised by a Gemini call"""
+    if isinstance(error, json.JSONDecodeError):
+        return 'parse_error'
+    if isinstance(error, GeminiOverloaded):
+        return 'shed'
+    return 'quota' if _is_quota_error(error) else 'api_error'
+
+
+class TokenBucket:
+    """Budget of units per minute, refilled continuously"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until amount units are available (0 when they are now)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount):
+        self.level -= min(amount, self.capacity)
+
+    def give_back(self, amount):
+        self.level = min(self.capacity, self.level + amount)
+
+    def drain(self):
+        self.level = 0.0
+
+
+class AdmissionController:
+    """
+    Requests-per-minute and tokens-per-minute budgets shared by every
+    session, with a priority queue in front of them. Only the head of the
+    queue may take budget, so a critical complaint never waits behind a
+    forecast that arrived earlier.
+    """
+
+    def __init__(self, rpm=GEMINI_RPM, tpm=GEMINI_TPM, backoff_seconds=QUOTA_BACKOFF_SECONDS):
+        self.backoff_seconds = backoff_seconds
+        self._condition = threading.Condition()
+        self._requests = TokenBucket(rpm)
+        self._tokens = TokenBucket(tpm)
+        self._queue = []
+        self._counter = itertools.count()
+        self._cooldown_until = 0.0
+
+    def _publish(self):
+        set_gauge('gemini_queue_depth', len(self._queue))
+        set_gauge('gemini_requests_available', round(self._requests.level, 2))
+        set_gauge('gemini_tokens_available', int(self._tokens.level))
+
+    def _shed(self, entry, operation, priority, reason):
+        if entry is not None:
+            self._queue.remove(entry)
+            heapq.heapify(self._queue)
+            self._condition.notify_all()
+        self._publish()
+        increment('gemini_shed_total', operation=operation, priority=priority, reason=reason)
+        raise GeminiOverloaded(f"Gemini {operation} call shed ({reason})")
+
+    def acquire(self, tokens, priority=PRIORITY_NORMAL, operation='gemini', timeout=None):
+        """
+        Wait for this caller's turn and budget, then take one request and
+        tokens from the buckets. Raises GeminiOverloaded when the queue is
+        full (normal and forecast priority) or the wait exceeds timeout
+        (MAX_WAIT_SECONDS for the priority by default).
+        """
+        timeout = MAX_WAIT_SECONDS.get(priority, MAX_WAIT_SECONDS[PRIORITY_NORMAL]) if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        with self._condition, span('gemini_admission_wait', operation=operation):
+            if len(self._queue) >= MAX_QUEUE_DEPTH and priority >= PRIORITY_NORMAL:
+                self._shed(None, operation, priority, 'queue_full')
+
+            entry = (priority, next(self._counter))
+            heapq.heappush(self._queue, entry)
+            self._publish()
+            while True:
+                now = time.monotonic()
+                remaining = deadline - now
+                if self._queue[0] == entry:
+                    wait = max(self._requests.wait_time(1, now), self._tokens.wait_time(tokens, now),
+                               self._cooldown_until - now)
+                    if wait <= 0:
+                        heapq.heappop(self._queue)
+                        self._requests.take(1)
+                        self._tokens.take(tokens)
+                        self._condition.notify_all()
+                        self._publish()
+                        return
+                    if wait > remaining:
+                        self._shed(entry, operation, priority, 'budget')
+                    self._condition.wait(wait)
+                else:
+                    if remaining <= 0:
+                        self._shed(entry, operation, priority, 'timeout')
+                    self._condition.wait(remaining)
+
+    def settle(self, estimated, used):
+        """Return the tokens an admitted call reserved but did not use"""
+        if used is not None and used < estimated:
+            with self._condition:
+                self._tokens.give_back(estimated - used)
+                self._condition.notify_all()
+                self._publish()
+
+    def backoff(self, seconds=None):
+        """The API reported an exhausted quota: admit nothing for a while (backoff_seconds by default)"""
+        seconds = self.backoff_seconds if seconds is None else seconds
+        with self._condition:
+            self._requests.drain()
+            self._cooldown_until = max(self._cooldown_until, time.monotonic() + seconds)
+            self._publish()
+        increment('gemini_quota_errors_total')
+
+    def describe(self):
+        """Current budgets and queue depth by priority"""
+        with self._condition:
+            now = time.monotonic()
+            self._requests.wait_time(0, now)
+            self._tokens.wait_time(0, now)
+            queued = {}
+            for priority, _ in self._queue:
+                queued[priority] = queued.get(priority, 0) + 1
+            return {
+                'requests_available': round(self._requests.level, 2),
+                'rpm': int(self._requests.capacity),
+                'tokens_available': int(self._tokens.level),
+                'tpm': int(self._tokens.capacity),
+                'queue_depth': len(self._queue),
+                'queued_by_priority': queued,
+                'cooldown_seconds': round(max(self._cooldown_until - now, 0), 1)
+            }
+
+
+def request_key(prompt, generation_config=None):
+    """Identity of a Gemini request: hash of the prompt and its generation config"""
+    payload = json.dumps({'prompt': prompt, 'config': generation_config or {}}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class _Stream:
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.chunks = []
+        self.done = False
+        self.error = None
+
+    def follow(self):
+        """Every chunk from the first, waiting for new ones until the stream ends"""
+        position = 0
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: len(self.chunks) > position or self.done)
+                pending = self.chunks[position:]
+                finished = self.done
+            for chunk in pending:
+                yield chunk
+            position += len(pending)
+            if finished:
+                break
+        if self.error is not None:
+            raise self.error
+
+
+class SingleFlight:
+    """Process-wide registry of in-flight calls keyed by request identity"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._streams = {}
+
+    def do(self, key, func, operation='gemini'):
+        """
+        Run func() for key, or wait for the identical call already running
+        and return its result. An error raised by the shared call is
+        raised in every waiting caller too.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+            set_gauge('gemini_inflight_calls', len(self._calls))
+
+        if not leader:
+            increment('gemini_coalesced_calls_total', operation=operation)
+            with span('gemini_coalesced_wait', operation=operation):
+                call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        increment('gemini_upstream_calls_total', operation=operation)
+        try:
+            call.result = func()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                set_gauge('gemini_inflight_calls', len(self._calls))
+            call.done.set()
+
+    def stream(self, key, produce, operation='gemini'):
+        """
+        Chunks of produce() (a generator) for key, shared with the identical
+        stream already running if there is one. The first caller starts a
+        thread reading produce() into a buffer; every caller, the first
+        included, follows that buffer from its start.
+        """
+        with self._lock:
+            stream = self._streams.get(key)
+            leader = stream is None
+            if leader:
+                stream = self._streams[key] = _Stream()
+            set_gauge('gemini_inflight_streams', len(self._streams))
+
+        if leader:
+            threading.Thread(target=self._pump, args=(key, stream, produce), name='gemini-stream',
+                             daemon=True).start()
+        else:
+            increment('gemini_coalesced_calls_total', operation=operation)
+        return stream.follow()
+
+    def _pump(self, key, stream, produce):
+        try:
+            for chunk in produce():
+                with stream.condition:
+                    stream.chunks.append(chunk)
+                    stream.condition.notify_all()
+        except Exception as e:
+            stream.error = e
+        finally:
+            with self._lock:
+                del self._streams[key]
+                set_gauge('gemini_inflight_streams', len(self._streams))
+            with stream.condition:
+                stream.done = True
+                stream.condition.notify_all()
+
+    def inflight(self):
+        """Number of distinct calls currently running"""
+        with self._lock:
+            return len(self._calls) + len(self._streams)
+
+
+# Shared by every session in the process
+gemini_flight = SingleFlight()
+gemini_admission = AdmissionController()
+
+
+def generate_text(model, operation, prompt, generation_config=None, priority=PRIORITY_NORMAL):
+    """
+    Text of model.generate_content(prompt), coalesced with any identical
+    call already in flight in this process and admitted within the
+    Gemini budget. Raises GeminiOverloaded when the call is shed.
+    """
+    def call():
+        estimated = estimate_tokens(prompt, generation_config)
+        gemini_admission.acquire(estimated, priority=priority, operation=operation)
+        try:
+            with span('gemini_call', operation=operation):
+                response = model.generate_content(prompt, generation_config=generation_config)
+        except Exception as e:
+            if _is_quota_error(e):
+                gemini_admission.backoff()
+            raise
+        usage = getattr(response, 'usage_metadata', None)
+        gemini_admission.settle(estimated, getattr(usage, 'total_token_count', None))
+        text = response.text
+        observe('gemini_output_tokens', getattr(usage, 'candidates_token_count', None) or len(text) // 4,
+                buckets=TOKEN_BUCKETS, operation=operation)
+        return text
+
+    return gemini_flight.do(request_key(prompt, generation_config), call, operation=operation)
+
+
+def stream_text(model, operation, prompt, generation_config=None, priority=PRIORITY_NORMAL):
+    """
+    Text chunks of model.generate_content(prompt, stream=True) as they
+    arrive, coalesced with any identical stream already in flight in this
+    process (its earlier chunks are replayed first) and admitted within
+    the Gemini budget like generate_text. Raises GeminiOverloaded when the
+    call is shed.
+    """
+    def produce():
+        estimated = estimate_tokens(prompt, generation_config)
+        gemini_admission.acquire(estimated, priority=priority, operation=operation)
+        increment('gemini_upstream_calls_total', operation=operation)
+        started = time.perf_counter()
+        chars = 0
+        try:
+            with span('gemini_call', operation=operation):
+                for chunk in model.generate_content(prompt, generation_config=generation_config, stream=True):
+                    if not chars:
+                        observe('gemini_first_chunk_seconds', time.perf_counter() - started, operation=operation)
+                    chars += len(chunk.text)
+                    yield chunk.text
+        except Exception as e:
+            if _is_quota_error(e):
+                gemini_admission.backoff()
+            raise
+        # Streamed chunks carry no usage totals, so settle on the estimated size
+        gemini_admission.settle(estimated, len(prompt) // 4 + chars // 4)
+        observe('gemini_output_tokens', chars // 4, buckets=TOKEN_BUCKETS, operation=operation)
+
+    yield from gemini_flight.stream(request_key(prompt, generation_config), produce, operation=operation)
@@ -0,0 +1,374 @@
+"""
+Performance instrumentation helpers for Maharashtra Governance Platform
+
+In-process counters, gauges, histograms and timing spans for backend queries,
+Gemini calls, caches and page rendering. Everything lives in memory and
+can be exported as Prometheus text or OpenTelemetry-style JSON.
+"""
+
+import os
+import json
+import time
+import threading
+import functools
+from collections import deque
+from datetime import datetime
+
+# Histogram bucket upper bounds in seconds (Prometheus "le" buckets)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Bucket upper bounds for token-count histograms (up to the largest output budget)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 768, 1024, 2048)
+
+# Raw samples kept per histogram for percentile queries
+MAX_SAMPLES = 2048
+
+# Finished spans kept for the OpenTelemetry-style export
+MAX_SPANS = 1000
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_histograms = {}
+_spans = deque(maxlen=MAX_SPANS)
+_started_at = time.time()
+
+
+def _label_key(labels):
+    """Turn a labels dict into a hashable, order-independent key"""
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+# ==================== RECORDING ====================
+
+def increment(name, value=1, **labels):
+    """Increase a counter by value"""
+    key = (name, _label_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name, value, **labels):
+    """Set a gauge to its current value (rows loaded, bytes in memory, ...)"""
+    key = (name, _label_key(labels))
+    with _lock:
+        _gauges[key] = value
+
+
+def observe(name, value, buckets=DEFAULT_BUCKETS, **labels):
+    """
+    Record one observation in a histogram. buckets are the upper bounds,
+    seconds by default (TOKEN_BUCKETS for token counts); a histogram keeps
+    the bounds of its first observation.
+    """
+    key = (name, _label_key(labels))
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = {
+                "bounds": tuple(buckets),
+                "buckets": [0] * len(buckets),
+                "count": 0,
+                "sum": 0.0,
+                "samples": deque(maxlen=MAX_SAMPLES)
+            }
+            _histograms[key] = hist
+
+        for i, bound in enumerate(hist["bounds"]):
+            if value <= bound:
+                hist["buckets"][i] += 1
+        hist["count"] += 1
+        hist["sum"] += value
+        hist["samples"].append(value)
+
+
+class Span:
+    """
+    Timing span usable as a context manager or started/ended manually.
+    Duration is recorded in the `<name>_seconds` histogram; exceptions
+    raised inside the span are counted in `<name>_errors_total`.
+    """
+
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels
+        self.status = "ok"
+        self.start_time = None
+        self.duration = None
+        self._start = None
+
+    def start(self):
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def end(self, status=None):
+        if self._start is None or self.duration is not None:
+            return self.duration
+        if status:
+            self.status = status
+        self.duration = time.perf_counter() - self._start
+
+        observe(f"{self.name}_seconds", self.duration, **self.labels)
+        if self.status != "ok":
+            increment(f"{self.name}_errors_total", **self.labels)
+
+        with _lock:
+            _spans.append({
+                "name": self.name,
+                "labels": dict(self.labels),
+                "start_time": self.start_time,
+                "duration": self.duration,
+                "status": self.status
+            })
+        return self.duration
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end("error" if exc_type else None)
+        return False
+
+
+def span(name, **labels):
+    """Context manager timing a block of code"""
+    return Span(name, **labels)
+
+
+def timed(name, **labels):
+    """Decorator timing every call of a function as a span"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with Span(name, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ==================== QUERYING ====================
+
+def get_counter(name, **labels):
+    """Current value of a single counter series"""
+    with _lock:
+        return _counters.get((name, _label_key(labels)), 0)
+
+
+def get_gauge(name, default=None, **labels):
+    """Current value of a single gauge series"""
+    with _lock:
+        return _gauges.get((name, _label_key(labels)), default)
+
+
+def gauge_values(name):
+    """All series of a gauge as a list of (labels dict, value)"""
+    with _lock:
+        return [(dict(key), value) for (gauge, key), value in _gauges.items() if gauge == name]
+
+
+def sum_counter(name, **labels):
+    """Sum a counter across every series matching the given labels"""
+    wanted = set(_label_key(labels))
+    with _lock:
+        return sum(value for (counter, key), value in _counters.items()
+                   if counter == name and wanted.issubset(key))
+
+
+def _percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(pct / 100 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def histogram_summary(name, **labels):
+    """
+    Count, mean and p50/p90/p99 for every histogram series called name
+    whose labels include the given ones. Returns a list of dicts.
+    """
+    wanted = set(_label_key(labels))
+    with _lock:
+        series = [(dict(key), hist["count"], hist["sum"], sorted(hist["samples"]))
+                  for (hist_name, key), hist in _histograms.items()
+                  if hist_name == name and wanted.issubset(key)]
+
+    summaries = []
+    for series_labels, count, total, samples in series:
+        summaries.append({
+            **series_labels,
+            "count": count,
+            "mean": total / count if count else 0.0,
+            "p50": _percentile(samples, 50),
+            "p90": _percentile(samples, 90),
+            "p99": _percentile(samples, 99),
+            "max": samples[-1] if samples else 0.0
+        })
+    return summaries
+
+
+def reset_metrics():
+    """Drop every recorded counter, histogram and span (gauges hold current state and are kept)"""
+    global _started_at
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _spans.clear()
+        _started_at = time.time()
+
+
+# ==================== EXPORT ====================
+
+def _format_labels(key, extra=None):
+    pairs = list(key) + (extra or [])
+    if not pairs:
+        return ""
+    escaped = [(k, v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in pairs]
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def export_prometheus():
+    """Render all metrics in the Prometheus text exposition format"""
+    with _lock:
+        counters = sorted(_counters.items())
+        gauges = sorted(_gauges.items())
+        histograms = sorted((key, dict(hist, buckets=list(hist["buckets"])))
+                            for key, hist in _histograms.items())
+
+    lines = []
+    seen = set()
+    for (name, key), value in counters:
+        if name not in seen:
+            lines.append(f"# TYPE {name} counter")
+            seen.add(name)
+        lines.append(f"{name}{_format_labels(key)} {value}")
+
+    for (name, key), value in gauges:
+        if name not in seen:
+            lines.append(f"# TYPE {name} gauge")
+            seen.add(name)
+        lines.append(f"{name}{_format_labels(key)} {value}")
+
+    for (name, key), hist in histograms:
+        if name not in seen:
+            lines.append(f"# TYPE {name} histogram")
+            seen.add(name)
+        for bound, count in zip(hist["bounds"], hist["buckets"]):
+            lines.append(f"{name}_bucket{_format_labels(key, [('le', str(bound))])} {count}")
+        lines.append(f"{name}_bucket{_format_labels(key, [('le', '+Inf')])} {hist['count']}")
+        lines.append(f"{name}_sum{_format_labels(key)} {hist['sum']:.6f}")
+        lines.append(f"{name}_count{_format_labels(key)} {hist['count']}")
+
+    return "\n".join(lines) + "\n"
+
+
+def _otel_attributes(labels):
+    return [{"key": k, "value": {"stringValue": str(v)}} for k, v in labels]
+
+
+def export_otel_json():
+    """Render metrics and recent spans as OpenTelemetry (OTLP/JSON style) dict"""
+    now_ns = int(time.time() * 1e9)
+    start_ns = int(_started_at * 1e9)
+
+    with _lock:
+        counters = list(_counters.items())
+        gauges = list(_gauges.items())
+        histograms = [(key, dict(hist, buckets=list(hist["buckets"]))) for key, hist in _histograms.items()]
+        spans = list(_spans)
+
+    metrics = {}
+    for (name, key), value in counters:
+        metric = metrics.setdefault(name, {
+            "name": name,
+            "sum": {"dataPoints": [], "aggregationTemporality": 2, "isMonotonic": True}
+        })
+        metric["sum"]["dataPoints"].append({
+            "attributes": _otel_attributes(key),
+            "startTimeUnixNano": start_ns,
+            "timeUnixNano": now_ns,
+            "asDouble": value
+        })
+
+    for (name, key), value in gauges:
+        metric = metrics.setdefault(name, {"name": name, "gauge": {"dataPoints": []}})
+        metric["gauge"]["dataPoints"].append({
+            "attributes": _otel_attributes(key),
+            "timeUnixNano": now_ns,
+            "asDouble": value
+        })
+
+    for (name, key), hist in histograms:
+        metric = metrics.setdefault(name, {
+            "name": name,
+            "unit": "s" if hist["bounds"] == DEFAULT_BUCKETS else "1",
+            "histogram": {"dataPoints": [], "aggregationTemporality": 2}
+        })
+        # OTLP bucket counts are per bucket, not cumulative
+        cumulative = hist["buckets"] + [hist["count"]]
+        bucket_counts = [cumulative[0]] + [cumulative[i] - cumulative[i - 1] for i in range(1, len(cumulative))]
+        metric["histogram"]["dataPoints"].append({
+            "attributes": _otel_attributes(key),
+            "startTimeUnixNano": start_ns,
+            "timeUnixNano": now_ns,
+            "count": hist["count"],
+            "sum": hist["sum"],
+            "bucketCounts": bucket_counts,
+            "explicitBounds": list(hist["bounds"])
+        })
+
+    otel_spans = []
+    for s in spans:
+        start = int(s["start_time"] * 1e9)
+        otel_spans.append({
+            "name": s["name"],
+            "startTimeUnixNano": start,
+            "endTimeUnixNano": start + int(s["duration"] * 1e9),
+            "attributes": _otel_attributes(sorted(s["labels"].items())),
+            "status": {"code": 1 if s["status"] == "ok" else 2}
+        })
+
+    resource = {"attributes": _otel_attributes([("service.name", "maharashtra-governance-ai")])}
+    scope = {"name": "metrics_helpers"}
+    return {
+        "resourceMetrics": [{"resource": resource, "scopeMetrics": [{"scope": scope, "metrics": list(metrics.values())}]}],
+        "resourceSpans": [{"resource": resource, "scopeSpans": [{"scope": scope, "spans": otel_spans}]}]
+    }
+
+
+def write_metrics_file(path=None, fmt=None):
+    """
+    Write the current metrics to a local file. Path and format default to
+    METRICS_EXPORT_PATH and METRICS_EXPORT_FORMAT ("prometheus" or "otel").
+    """
+    path = path or os.getenv('METRICS_EXPORT_PATH')
+    fmt = (fmt or os.getenv('METRICS_EXPORT_FORMAT', 'prometheus')).lower()
+    if not path:
+        return False
+
+    try:
+        if fmt == 'otel':
+            payload = json.dumps(export_otel_json(), indent=2)
+        else:
+            payload = export_prometheus()
+
+        # Write to a temp file first so scrapers never read a partial export
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+        return True
+    except Exception as e:
+        print(f"Error writing metrics file: {e}")
+        return False
+
+
+def metrics_uptime():
+    """Seconds since metrics collection started (or was last reset)"""
+    return time.time() - _started_at
+
+
+def metrics_started_at():
+    """Wall-clock datetime when metrics collection started"""
+    return datetime.fromtimestamp(_started_at)
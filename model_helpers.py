@@ -0,0 +1,261 @@
+"""
+Request model helpers for Maharashtra Governance Platform
+
+Small CPU-only models trained offline (see train_models.py) on the
+platform's own history, so resolution time and escalation risk can be
+predicted for the whole backlog at once instead of one Gemini call per
+request:
+  - resolution model: ridge regression on log(1 + days to resolve),
+    fitted on resolved citizen_requests
+  - escalation model: L2-regularized logistic regression on whether a
+    request missed its target resolution time. Requests with a known
+    outcome (resolved, or still open past the target) are labelled 0/1;
+    the rest use Gemini's escalation_risk from predictions_log as a soft
+    label.
+Both use features known at submission: complaint type, severity, city
+and department (one weight per value, rare values share an "unknown"
+weight) and log(1 + affected_count). Weights are float32 and saved with
+their vocabulary in one compressed .npz file of a few kilobytes.
+"""
+
+import os
+import json
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from columnar_helpers import typed_frame
+
+# Trained model file read by the app and written by train_models.py
+MODEL_PATH = os.getenv('REQUEST_MODEL_PATH', './models/request_models.npz')
+
+# Target resolution days by severity (as in get_fallback_prediction)
+TARGET_RESOLUTION_DAYS = {'Critical': 2, 'High': 5, 'Medium': 7, 'Low': 10}
+
+CATEGORICAL_FEATURES = ['complaint_type', 'severity', 'city', 'department']
+
+# Values seen fewer times than this share the "unknown" weight of their feature
+MIN_CATEGORY_COUNT = 5
+
+# L2 penalty of both models and Newton iterations of the escalation model
+L2_PENALTY = 1.0
+LOGISTIC_ITERATIONS = 25
+
+
+def _sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+
+
+class FeatureEncoder:
+    """Vocabulary of the categorical features and the layout of the weight vector"""
+
+    def __init__(self, vocab):
+        self.vocab = vocab
+        # Weight layout: intercept, per feature [unknown, values...], log(1 + affected_count)
+        self.offsets = {}
+        size = 1
+        for column in CATEGORICAL_FEATURES:
+            self.offsets[column] = size
+            size += len(vocab[column]) + 1
+        self.numeric_index = size
+        self.size = size + 1
+        self._lookup = {column: {value: i + 1 for i, value in enumerate(values)} for column, values in vocab.items()}
+
+    @classmethod
+    def fit(cls, df):
+        vocab = {}
+        for column in CATEGORICAL_FEATURES:
+            counts = df[column].astype(str).value_counts()
+            vocab[column] = sorted(counts[counts >= MIN_CATEGORY_COUNT].index)
+        return cls(vocab)
+
+    def indices(self, df):
+        """Weight index of each categorical feature per row, shape (rows, features)"""
+        columns = []
+        for column in CATEGORICAL_FEATURES:
+            values = df[column].astype(str) if column in df.columns else pd.Series('', index=df.index)
+            codes = values.map(self._lookup[column]).fillna(0).to_numpy(dtype=np.int64)
+            columns.append(codes + self.offsets[column])
+        return np.stack(columns, axis=1)
+
+    def numeric(self, df):
+        return np.log1p(pd.to_numeric(df['affected_count'], errors='coerce').fillna(0).clip(lower=0).to_numpy(float))
+
+    def matrix(self, df):
+        """Dense design matrix for training"""
+        X = np.zeros((len(df), self.size))
+        X[:, 0] = 1.0
+        rows = np.arange(len(df))[:, None]
+        X[rows, self.indices(df)] = 1.0
+        X[:, self.numeric_index] = self.numeric(df)
+        return X
+
+    def score(self, df, weights):
+        """Linear score per row straight from weight lookups (no design matrix)"""
+        return weights[0] + weights[self.indices(df)].sum(axis=1) + weights[self.numeric_index] * self.numeric(df)
+
+
+def fit_ridge(X, y, penalty=L2_PENALTY):
+    """Closed-form ridge regression (intercept not penalized)"""
+    regularizer = penalty * np.eye(X.shape[1])
+    regularizer[0, 0] = 0.0
+    return np.linalg.solve(X.T @ X + regularizer, X.T @ y)
+
+
+def fit_logistic(X, y, penalty=L2_PENALTY, iterations=LOGISTIC_ITERATIONS):
+    """L2-regularized logistic regression by Newton's method; y may be soft labels in [0, 1]"""
+    n = len(y)
+    regularizer = penalty * np.eye(X.shape[1]) / n
+    regularizer[0, 0] = 0.0
+    weights = np.zeros(X.shape[1])
+    for _ in range(iterations):
+        p = _sigmoid(X @ weights)
+        gradient = X.T @ (p - y) / n + regularizer @ weights
+        hessian = (X * (p * (1 - p))[:, None]).T @ X / n + regularizer
+        step = np.linalg.solve(hessian + 1e-9 * np.eye(X.shape[1]), gradient)
+        weights -= step
+        if np.abs(step).max() < 1e-6:
+            break
+    return weights
+
+
+# ==================== TRAINING DATA ====================
+
+def training_frame(requests, predictions=None, now=None):
+    """
+    One row per request with the features, resolution_days (resolved
+    requests) and escalation label (1 = missed its target resolution time,
+    a Gemini soft label when the outcome is not known yet)
+    """
+    now = now or datetime.now()
+    df = typed_frame(requests)
+    if df.empty:
+        return df
+    for column in CATEGORICAL_FEATURES:
+        df[column] = df[column].astype(str)
+
+    target = df['severity'].map(TARGET_RESOLUTION_DAYS).fillna(7).astype(float)
+    resolved = df['resolved_date'].notna() if 'resolved_date' in df.columns else pd.Series(False, index=df.index)
+    end = df['resolved_date'].where(resolved, now) if 'resolved_date' in df.columns else pd.Series(now, index=df.index)
+    elapsed = (end - df['date_submitted']).dt.total_seconds() / 86400
+
+    df['resolution_days'] = elapsed.where(resolved).clip(lower=0)
+    df['escalated'] = np.where(resolved | (elapsed > target), (elapsed > target).astype(float), np.nan)
+
+    if predictions is not None and not predictions.empty:
+        gemini = predictions[predictions['model_version'].fillna('').str.startswith('gemini')]
+        gemini = gemini.sort_values('prediction_timestamp').drop_duplicates('request_id', keep='last')
+        risk = df['request_id'].map(gemini.set_index('request_id')['escalation_risk'])
+        df['escalated'] = df['escalated'].fillna(pd.to_numeric(risk, errors='coerce') / 100)
+    return df
+
+
+# ==================== MODELS ====================
+
+class RequestModels:
+    """Trained resolution-time and escalation models"""
+
+    def __init__(self, encoder, resolution_weights, escalation_weights, metadata):
+        self.encoder = encoder
+        self.resolution_weights = np.asarray(resolution_weights, dtype=np.float32)
+        self.escalation_weights = np.asarray(escalation_weights, dtype=np.float32)
+        self.metadata = metadata
+
+    def predict(self, df):
+        """Predicted resolution days and escalation risk (%) for every row of df"""
+        encoder = self.encoder
+        resolution = np.expm1(encoder.score(df, self.resolution_weights)).clip(min=0)
+        risk = _sigmoid(encoder.score(df, self.escalation_weights)) * 100
+        return pd.DataFrame({
+            'predicted_resolution_days': resolution.round(1),
+            'escalation_risk_percent': risk.round(1)
+        }, index=df.index)
+
+    def refine(self, prediction, complaint):
+        """A rule-based prediction with resolution days and escalation risk from the models"""
+        row = self.predict(pd.DataFrame([complaint])).iloc[0]
+        prediction = dict(prediction)
+        prediction['estimated_resolution_days'] = max(int(round(row['predicted_resolution_days'])), 1)
+        prediction['escalation_risk_percent'] = int(round(row['escalation_risk_percent']))
+        prediction['reasoning'] = (f"{prediction.get('reasoning', '')} Resolution time and escalation risk from "
+                                   f"models trained on {self.metadata['requests']:,} requests "
+                                   f"({self.metadata['trained_at'][:10]}).").strip()
+        return prediction
+
+    def save(self, path=MODEL_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp = f"{path}.tmp.npz"
+        np.savez_compressed(tmp, resolution=self.resolution_weights, escalation=self.escalation_weights,
+                            vocab=np.array(json.dumps(self.encoder.vocab)), metadata=np.array(json.dumps(self.metadata)))
+        os.replace(tmp, path)
+        return os.path.getsize(path)
+
+    @classmethod
+    def load(cls, path=MODEL_PATH):
+        with np.load(path) as data:
+            return cls(FeatureEncoder(json.loads(str(data['vocab']))), data['resolution'], data['escalation'],
+                       json.loads(str(data['metadata'])))
+
+
+def _evaluate(models, test):
+    """Hold-out errors of the models against the rule model"""
+    predicted = models.predict(test)
+    report = {}
+    resolved = test['resolution_days'].notna()
+    if resolved.any():
+        actual = test.loc[resolved, 'resolution_days']
+        rules = test.loc[resolved, 'severity'].map(TARGET_RESOLUTION_DAYS).fillna(7)
+        report['resolution_mae_days'] = round(float((predicted.loc[resolved, 'predicted_resolution_days'] - actual).abs().mean()), 2)
+        report['rules_resolution_mae_days'] = round(float((rules - actual).abs().mean()), 2)
+    labelled = test['escalated'].notna()
+    if labelled.any():
+        actual = test.loc[labelled, 'escalated']
+        affected = pd.to_numeric(test.loc[labelled, 'affected_count'], errors='coerce').fillna(0)
+        rules = (40 + affected / 20).clip(upper=95) / 100
+        report['escalation_brier'] = round(float(((predicted.loc[labelled, 'escalation_risk_percent'] / 100 - actual) ** 2).mean()), 4)
+        report['rules_escalation_brier'] = round(float(((rules - actual) ** 2).mean()), 4)
+    return report
+
+
+def train_models(requests, predictions=None, holdout=0.2, seed=42):
+    """
+    Fit both models on the request history (and Gemini's past escalation
+    risks). Returns (models, report) where report compares hold-out errors
+    with the rule model; the returned models are refitted on all rows.
+    """
+    df = training_frame(requests, predictions)
+    resolved = df[df['resolution_days'].notna()] if not df.empty else df
+    labelled = df[df['escalated'].notna()] if not df.empty else df
+    if len(resolved) < MIN_CATEGORY_COUNT or len(labelled) < MIN_CATEGORY_COUNT:
+        raise ValueError(f"Not enough history to train on ({len(resolved)} resolved, {len(labelled)} labelled requests)")
+
+    def fit(rows):
+        encoder = FeatureEncoder.fit(rows)
+        done = rows[rows['resolution_days'].notna()]
+        known = rows[rows['escalated'].notna()]
+        resolution = fit_ridge(encoder.matrix(done), np.log1p(done['resolution_days'].to_numpy(float)))
+        escalation = fit_logistic(encoder.matrix(known), known['escalated'].to_numpy(float))
+        return RequestModels(encoder, resolution, escalation, {
+            'requests': len(rows),
+            'resolved': len(done),
+            'labelled': len(known),
+            'trained_at': datetime.now().isoformat(timespec='seconds')
+        })
+
+    test_mask = np.random.RandomState(seed).rand(len(df)) < holdout
+    report = _evaluate(fit(df[~test_mask]), df[test_mask]) if test_mask.any() and (~test_mask).sum() else {}
+    models = fit(df)
+    models.metadata['holdout'] = report
+    return models, report
+
+
+def load_models(path=MODEL_PATH):
+    """Trained models, or None when none have been trained yet"""
+    if not os.path.exists(path):
+        return None
+    try:
+        return RequestModels.load(path)
+    except Exception as e:
+        print(f"Error loading request models: {e}")
+        return None
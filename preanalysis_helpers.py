@@ -0,0 +1,146 @@
+"""
+Pre-analysis helpers for Maharashtra Governance Platform
+
+Analyses new High and Critical requests in the background as they are
+submitted, so an officer opening one finds its prediction ready instead
+of waiting on Gemini:
+  - PreAnalysisQueue.on_change is subscribed to the change feed and
+    enqueues local inserts whose (incident) severity qualifies; events
+    echoed from other processes are left to the process that took the
+    submission
+  - a small worker pool runs analyze(complaint) (the analysis cascade, so
+    Gemini calls go through admission control at the request's severity
+    priority), stores the prediction under the incident or request ID
+    and persists it with persist(request_id, prediction). Rule fallbacks
+    (Gemini shed or failing) are dropped, so the request is analysed on
+    demand instead of being stuck with the rule answer
+  - the queue is bounded: submissions past PREANALYSIS_MAX_PENDING are
+    skipped and analysed on demand as before
+A page that opens a request still being pre-analysed waits for that
+analysis (wait) rather than starting a second Gemini call.
+"""
+
+import os
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics_helpers import span, increment, set_gauge
+
+# Severities analysed at submission; the rest wait for an officer
+PREANALYSIS_SEVERITIES = ('Critical', 'High')
+
+# Background analyses running at once, and queued analyses before new submissions are skipped
+PREANALYSIS_WORKERS = int(os.getenv('PREANALYSIS_WORKERS', '2'))
+PREANALYSIS_MAX_PENDING = int(os.getenv('PREANALYSIS_MAX_PENDING', '50'))
+
+# How long the analysis page waits for a pre-analysis already under way
+PREANALYSIS_WAIT_SECONDS = 15
+
+
+class PreAnalysisQueue:
+    """
+    Bounded background analysis of new submissions. store is the shared
+    analyses dict (keyed by incident ID, or request ID outside incidents);
+    incident_of(request_id) and incident(incident_id) look up the
+    duplicate cluster a request joined.
+    """
+
+    def __init__(self, analyze, persist, store, incident_of, incident, workers=PREANALYSIS_WORKERS,
+                 max_pending=PREANALYSIS_MAX_PENDING, severities=PREANALYSIS_SEVERITIES):
+        self._analyze = analyze
+        self._persist = persist
+        self._store = store
+        self._incident_of = incident_of
+        self._incident = incident
+        self.max_pending = max_pending
+        self.severities = severities
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='preanalysis')
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def _publish(self):
+        set_gauge('preanalysis_pending', len(self._pending))
+
+    def on_change(self, event):
+        """Change feed subscriber: enqueue qualifying inserts made by this process"""
+        if event['type'] == 'INSERT' and event['source'] == 'local':
+            self.submit(event['record'])
+
+    def submit(self, record):
+        """Enqueue a new request; returns the analysis key, or None when it was skipped"""
+        request_id = record.get('request_id')
+        complaint = dict(record, days_open=0)
+        incident_id = self._incident_of(request_id)
+        incident = self._incident(incident_id) if incident_id else None
+        if incident:
+            # Analyse the incident as a whole, as the analysis page does
+            complaint['affected_count'] = max(int(complaint.get('affected_count') or 0), incident['affected_count'])
+            complaint['severity'] = incident['severity']
+        key = incident_id or request_id
+
+        reason = None
+        with self._lock:
+            if complaint.get('severity') not in self.severities:
+                reason = 'severity'
+            elif key in self._store or key in self._pending:
+                reason = 'analysed'
+            elif len(self._pending) >= self.max_pending:
+                reason = 'queue_full'
+            else:
+                self._pending[key] = self._executor.submit(self._run, key, request_id, complaint)
+                self._publish()
+        if reason:
+            increment('preanalysis_skipped_total', reason=reason)
+            return None
+        increment('preanalysis_enqueued_total', severity=complaint['severity'])
+        return key
+
+    def _run(self, key, request_id, complaint):
+        try:
+            with span('preanalysis', severity=complaint['severity']):
+                prediction = self._analyze(complaint)
+            if not prediction:
+                raise ValueError("empty prediction")
+            source = prediction.get('source', 'gemini')
+            if source == 'rules':
+                # Gemini was shed or failed: leave the request for an officer to analyse on demand
+                increment('preanalysis_fallbacks_total')
+                return None
+            prediction['preanalysed_at'] = datetime.now().isoformat(timespec='seconds')
+            # An officer's own analysis, if one finished first, is kept (and already logged)
+            if self._store.setdefault(key, prediction) is not prediction:
+                increment('preanalysis_skipped_total', reason='analysed')
+                return None
+            self._persist(request_id, prediction)
+            increment('preanalysis_completed_total', source=source)
+            return prediction
+        except Exception as e:
+            print(f"Error pre-analysing {request_id}: {e}")
+            increment('preanalysis_failed_total')
+            return None
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+                self._publish()
+
+    def pending(self, key):
+        with self._lock:
+            return key in self._pending
+
+    def wait(self, key, timeout=PREANALYSIS_WAIT_SECONDS):
+        """The stored analysis for key, after waiting up to timeout for a pre-analysis under way"""
+        with self._lock:
+            future = self._pending.get(key)
+        if future is not None:
+            try:
+                future.result(timeout=timeout)
+            except Exception:
+                increment('preanalysis_wait_timeouts_total')
+        return self._store.get(key)
+
+    def describe(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {'pending': pending, 'workers': self.workers, 'max_pending': self.max_pending}
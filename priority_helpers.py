@@ -0,0 +1,256 @@
+"""
+Live triage priority index for Maharashtra Governance Platform
+
+Keeps open items (requests or incidents) ordered by priority score so the
+triage page can read the top k without scoring and sorting the whole
+backlog on every rerun.
+
+The score mirrors calculate_priority_score in the helper modules:
+
+    score = severity weight + min(affected / 100, 5) + min(0.5 * days_open, 3)
+
+Only the time factor changes with time, and it grows at the same rate for
+every item until it caps after 6 days. So each queue keeps:
+  - a "mature" heap (age >= 6 days) keyed by the final, constant score
+  - a "young" heap keyed by static - 0.5 * submitted_day, whose order is
+    the same at any moment in time (a continuous upper bound on the score)
+  - a maturity heap that moves items from young to mature as they age
+Inserts, updates and removals are O(log n); top-k is O(k log n).
+"""
+
+import heapq
+import threading
+import itertools
+from datetime import datetime
+
+import pandas as pd
+
+from metrics_helpers import span, set_gauge
+
+SEVERITY_WEIGHTS = {'Critical': 10, 'High': 7, 'Medium': 4, 'Low': 2}
+CITIZEN_FACTOR_CAP = 5
+TIME_FACTOR_PER_DAY = 0.5
+TIME_FACTOR_CAP = 3
+MATURITY_DAYS = TIME_FACTOR_CAP / TIME_FACTOR_PER_DAY
+
+SECONDS_PER_DAY = 86400.0
+
+# Items in these statuses leave the queue
+CLOSED_STATUSES = {'Resolved'}
+
+
+def static_score(severity, affected_count):
+    """Time-independent part of the priority score"""
+    base = SEVERITY_WEIGHTS.get(severity, 4)
+    return base + min((affected_count or 0) / 100, CITIZEN_FACTOR_CAP)
+
+
+def _day_number(value):
+    """Timestamp as fractional days since the epoch"""
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is not None:
+        ts = ts.tz_localize(None)
+    return ts.value / 1e9 / SECONDS_PER_DAY
+
+
+def exact_score(static, submitted_day, now_day):
+    """Score exactly as calculate_priority_score computes it (whole days open)"""
+    days_open = max(int(now_day - submitted_day), 0)
+    return round(static + min(days_open * TIME_FACTOR_PER_DAY, TIME_FACTOR_CAP), 2)
+
+
+def score_frame(df):
+    """Vectorized priority scores for a frame with severity, affected_count and days_open"""
+    base = df['severity'].map(SEVERITY_WEIGHTS).astype(float).fillna(4)
+    citizen = (df['affected_count'].fillna(0) / 100).clip(upper=CITIZEN_FACTOR_CAP)
+    time_factor = (df['days_open'].fillna(0).clip(lower=0) * TIME_FACTOR_PER_DAY).clip(upper=TIME_FACTOR_CAP)
+    return (base + citizen + time_factor).round(2)
+
+
+class _DecayQueue:
+    """One priority queue (global, or one department/city) with lazy deletion"""
+
+    def __init__(self):
+        self._young = []
+        self._mature = []
+        self._maturity = []
+        self._entries = {}
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def push(self, item_id, static, submitted_day):
+        version = next(self._counter)
+        self._entries[item_id] = (version, static, submitted_day)
+        heapq.heappush(self._young, (-(static - TIME_FACTOR_PER_DAY * submitted_day), version, item_id))
+        heapq.heappush(self._maturity, (submitted_day + MATURITY_DAYS, version, item_id))
+
+    def remove(self, item_id):
+        self._entries.pop(item_id, None)
+
+    def _valid(self, version, item_id):
+        entry = self._entries.get(item_id)
+        return entry is not None and entry[0] == version
+
+    def _promote(self, now_day):
+        """Move items whose time factor has capped from the young to the mature heap"""
+        while self._maturity and self._maturity[0][0] <= now_day:
+            _, version, item_id = heapq.heappop(self._maturity)
+            if self._valid(version, item_id):
+                static = self._entries[item_id][1]
+                heapq.heappush(self._mature, (-(static + TIME_FACTOR_CAP), version, item_id))
+                # The item's young-heap entry is dropped lazily the next time it is popped
+
+    def top(self, k, now_day):
+        """Top k (score, item_id) pairs at now_day, highest first"""
+        self._promote(now_day)
+        best = []  # min-heap holding the k best (score, item_id) seen so far
+        popped = []
+
+        def offer(score, item_id):
+            if len(best) < k:
+                heapq.heappush(best, (score, item_id))
+            elif (score, item_id) > best[0]:
+                heapq.heapreplace(best, (score, item_id))
+
+        # Mature scores are exact and constant, so the first k valid entries win
+        taken = 0
+        while self._mature and taken < k:
+            entry = heapq.heappop(self._mature)
+            popped.append((self._mature, entry))
+            neg_score, version, item_id = entry
+            if self._valid(version, item_id):
+                offer(round(-neg_score, 2), item_id)
+                taken += 1
+
+        # The young heap is ordered by the continuous score, an upper bound on
+        # the whole-day score; stop once that bound cannot beat the k-th best
+        while self._young:
+            neg_key, version, item_id = self._young[0]
+            upper_bound = -neg_key + TIME_FACTOR_PER_DAY * now_day
+            if len(best) == k and upper_bound < best[0][0]:
+                break
+            entry = heapq.heappop(self._young)
+            if not self._valid(version, item_id):
+                continue
+            _, static, submitted_day = self._entries[item_id]
+            if submitted_day + MATURITY_DAYS <= now_day:
+                continue  # already promoted to the mature heap
+            popped.append((self._young, entry))
+            offer(exact_score(static, submitted_day, now_day), item_id)
+
+        # Put back the valid entries so the heaps stay intact
+        for heap, entry in popped:
+            if self._valid(entry[1], entry[2]):
+                heapq.heappush(heap, entry)
+
+        return sorted(best, reverse=True)
+
+
+class PriorityIndex:
+    """
+    Open items ranked by priority score, with per-department, per-city and
+    per-department-and-city queues for filtered top-k queries. Shared across sessions; all methods
+    are thread-safe.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items = {}
+        self._queues = {('all', None): _DecayQueue()}
+        self.synced_version = None
+
+    def __len__(self):
+        return len(self._items)
+
+    def _queue(self, scope, key):
+        queue = self._queues.get((scope, key))
+        if queue is None:
+            queue = self._queues[(scope, key)] = _DecayQueue()
+        return queue
+
+    def _partitions(self, item):
+        return [('all', None), ('department', item.get('department')), ('city', item.get('city')),
+                ('department_city', (item.get('department'), item.get('city')))]
+
+    def upsert(self, item_id, record):
+        """
+        Insert or update an item. record needs severity, affected_count and
+        date_submitted (or first_seen); status in CLOSED_STATUSES removes it.
+        Other keys are kept as display payload.
+        """
+        if record.get('status') in CLOSED_STATUSES:
+            self.remove(item_id)
+            return
+
+        static = static_score(record.get('severity'), record.get('affected_count'))
+        submitted_day = _day_number(record.get('date_submitted', record.get('first_seen')) or datetime.now())
+
+        with self._lock:
+            current = self._items.get(item_id)
+            if current and current['_static'] == static and current['_submitted_day'] == submitted_day \
+                    and self._partitions(current) == self._partitions(record):
+                current.update(record)
+                return
+            if current:
+                self._remove_locked(item_id)
+
+            item = dict(record, _static=static, _submitted_day=submitted_day)
+            self._items[item_id] = item
+            for scope, key in self._partitions(item):
+                self._queue(scope, key).push(item_id, static, submitted_day)
+
+    def _remove_locked(self, item_id):
+        item = self._items.pop(item_id, None)
+        if item:
+            for scope, key in self._partitions(item):
+                self._queue(scope, key).remove(item_id)
+
+    def remove(self, item_id):
+        """Drop an item (resolved, merged, deleted)"""
+        with self._lock:
+            self._remove_locked(item_id)
+
+    def sync(self, records, version=None):
+        """
+        Upsert every (item_id, record) pair; skipped when version is unchanged.
+        Unchanged items cost a dict comparison, not a heap push.
+        """
+        if version is not None and version == self.synced_version:
+            return 0
+        count = 0
+        with span('priority_index_sync'):
+            for item_id, record in records:
+                self.upsert(item_id, record)
+                count += 1
+            self.synced_version = version
+        set_gauge('priority_index_items', len(self._items))
+        return count
+
+    def top_k(self, k=10, department=None, city=None, now=None):
+        """
+        Highest-priority open items, optionally within one department or
+        city. Returns a list of record dicts with a priority_score.
+        """
+        now_day = _day_number(now or datetime.now())
+        if department and city:
+            scope = ('department_city', (department, city))
+        elif department:
+            scope = ('department', department)
+        elif city:
+            scope = ('city', city)
+        else:
+            scope = ('all', None)
+
+        with self._lock, span('priority_index_top_k'):
+            queue = self._queues.get(scope)
+            if queue is None:
+                return []
+            results = []
+            for score, item_id in queue.top(k, now_day):
+                item = self._items[item_id]
+                days_open = max(int(now_day - item['_submitted_day']), 0)
+                results.append(dict({key: value for key, value in item.items() if not key.startswith('_')},
+                                    priority_score=score, days_open=days_open))
+            return results
@@ -0,0 +1,233 @@
+"""
+Query builder helpers for Maharashtra Governance Platform
+
+Each page declares the columns and row filters it actually renders as a
+QuerySpec. The BigQuery and Supabase helpers push the projection, filters,
+ordering and limit into SQL / PostgREST, so only the needed bytes are
+scanned and transferred instead of SELECT * followed by pandas filtering.
+
+The date-heavy BigQuery tables are partitioned by day (see
+bigquery_schema.py); a spec with lookback_days also filters on the
+table's partition column so BigQuery prunes every older partition.
+lookback_keep exempts rows the pages need at any age (such as requests
+still open) from that filter.
+"""
+
+import os
+import re
+from datetime import date, datetime, timedelta
+
+# Supported filter operators and their PostgREST method names
+OPERATORS = {
+    '=': 'eq',
+    '!=': 'neq',
+    '>': 'gt',
+    '>=': 'gte',
+    '<': 'lt',
+    '<=': 'lte',
+    'in': 'in_'
+}
+
+# Day-partition column and its type for each partitioned BigQuery table
+PARTITION_COLUMNS = {
+    'citizen_requests': ('date_submitted', 'TIMESTAMP'),
+    'health_surveillance': ('date_reported', 'DATE'),
+    'predictions_log': ('prediction_timestamp', 'TIMESTAMP'),
+    'audit_logs': ('timestamp', 'TIMESTAMP')
+}
+
+# Days of history the pages load by default (older partitions are only read where a spec's lookback_keep needs them)
+DATA_LOOKBACK_DAYS = int(os.getenv('DATA_LOOKBACK_DAYS', '365'))
+
+_IDENTIFIER_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def _check_identifier(name):
+    if not _IDENTIFIER_RE.match(str(name)):
+        raise ValueError(f"Invalid column or table name: {name!r}")
+    return name
+
+
+def _param_type(value):
+    """BigQuery parameter type of a Python value"""
+    if isinstance(value, bool):
+        return 'BOOL'
+    if isinstance(value, int):
+        return 'INT64'
+    if isinstance(value, float):
+        return 'FLOAT64'
+    if isinstance(value, datetime):
+        return 'TIMESTAMP'
+    if isinstance(value, date):
+        return 'DATE'
+    return 'STRING'
+
+
+def lookback_start(table, days=DATA_LOOKBACK_DAYS):
+    """
+    Earliest partition value a query on a partitioned table should read:
+    a date for DATE partitions, a timestamp for TIMESTAMP ones.
+    """
+    column, column_type = PARTITION_COLUMNS[table]
+    if column_type == 'DATE':
+        return date.today() - timedelta(days=days)
+    return datetime.now() - timedelta(days=days)
+
+
+def _postgrest_condition(column, op, value):
+    """One condition of a PostgREST or=(...) filter, values double-quoted"""
+    def quote(v):
+        v = v.isoformat() if isinstance(v, (date, datetime)) else v
+        return '"' + str(v).replace('\\', '\\\\').replace('"', '\\"') + '"'
+    if op == 'in':
+        return f"{column}.in.({','.join(quote(v) for v in value)})"
+    return f"{column}.{OPERATORS[op]}.{quote(value)}"
+
+
+class QuerySpec:
+    """
+    Columns, filters, ordering and limit one page needs from one table.
+
+    filters is a list of (column, operator, value) with operators from
+    OPERATORS; 'in' takes a list. name labels the result in caches and
+    metrics (defaults to the table name). lookback_days keeps only rows of
+    the last that many days by the table's partition column, except rows
+    matching the lookback_keep filter (column, operator, value), which are
+    read whatever their age.
+    """
+
+    def __init__(self, table, columns=None, filters=None, order_by=None, descending=True, limit=None, name=None,
+                 lookback_days=None, lookback_keep=None):
+        self.table = _check_identifier(table)
+        self.columns = [_check_identifier(column) for column in (columns or [])]
+        self.filters = []
+        for column, op, value in filters or []:
+            if op not in OPERATORS:
+                raise ValueError(f"Unsupported filter operator: {op!r}")
+            self.filters.append((_check_identifier(column), op, list(value) if op == 'in' else value))
+        self.order_by = _check_identifier(order_by) if order_by else None
+        self.descending = descending
+        self.limit = int(limit) if limit else None
+        self.name = name or table
+        if lookback_days and table not in PARTITION_COLUMNS:
+            raise ValueError(f"{table} has no partition column to look back on")
+        self.lookback_days = int(lookback_days) if lookback_days else None
+        self.lookback_keep = None
+        if lookback_keep:
+            column, op, value = lookback_keep
+            if op not in OPERATORS:
+                raise ValueError(f"Unsupported filter operator: {op!r}")
+            self.lookback_keep = (_check_identifier(column), op, list(value) if op == 'in' else value)
+
+    def _lookback_filter(self):
+        """(column, '>=', start) on the partition column, or None without a lookback"""
+        if not self.lookback_days:
+            return None
+        return (PARTITION_COLUMNS[self.table][0], '>=', lookback_start(self.table, self.lookback_days))
+
+    def __repr__(self):
+        return f"QuerySpec({self.name}: {self.table}, {len(self.columns) or '*'} columns, {len(self.filters)} filters)"
+
+    def key(self):
+        """Hashable identity of the query, for caching"""
+        return (self.table, tuple(self.columns),
+                tuple((column, op, tuple(value) if op == 'in' else value) for column, op, value in self.filters),
+                self.order_by, self.descending, self.limit, self.lookback_days,
+                tuple(tuple(v) if isinstance(v, list) else v for v in self.lookback_keep or ()))
+
+    # ==================== BIGQUERY ====================
+
+    def to_sql(self, table_ref):
+        """
+        Standard SQL for BigQuery plus its named parameters. Returns
+        (sql, params) where each param is a dict with name, type, value and
+        array; the caller turns them into BigQuery query parameters.
+        """
+        columns = ', '.join(self.columns) if self.columns else '*'
+        clauses, params = [], []
+
+        def condition(column, op, value):
+            name = f"{column}_{len(params)}"
+            if op == 'in':
+                params.append({'name': name, 'type': _param_type(value[0]) if value else 'STRING',
+                               'value': value, 'array': True})
+                return f"{column} IN UNNEST(@{name})"
+            params.append({'name': name, 'type': _param_type(value), 'value': value, 'array': False})
+            return f"{column} {op} @{name}"
+
+        for column, op, value in self.filters:
+            clauses.append(condition(column, op, value))
+        lookback = self._lookback_filter()
+        if lookback and self.lookback_keep:
+            clauses.append(f"({condition(*lookback)} OR {condition(*self.lookback_keep)})")
+        elif lookback:
+            clauses.append(condition(*lookback))
+
+        sql = f"SELECT {columns}\nFROM `{table_ref}`"
+        if clauses:
+            sql += "\nWHERE " + "\n  AND ".join(clauses)
+        if self.order_by:
+            sql += f"\nORDER BY {self.order_by} {'DESC' if self.descending else 'ASC'}"
+        if self.limit:
+            sql += f"\nLIMIT {self.limit}"
+        return sql, params
+
+    # ==================== POSTGREST ====================
+
+    def apply_postgrest(self, table_query, count=None):
+        """
+        Apply projection, filters, ordering and limit to a supabase-py table
+        query; count='exact' also asks PostgREST for the total row count
+        """
+        query = table_query.select(','.join(self.columns) if self.columns else '*', count=count)
+        lookback = self._lookback_filter()
+        filters = self.filters + [lookback] if lookback and not self.lookback_keep else self.filters
+        for column, op, value in filters:
+            if isinstance(value, (date, datetime)):
+                value = value.isoformat()
+            query = getattr(query, OPERATORS[op])(column, value)
+        if lookback and self.lookback_keep:
+            query = query.or_(f"{_postgrest_condition(*lookback)},{_postgrest_condition(*self.lookback_keep)}")
+        if self.order_by:
+            query = query.order(self.order_by, desc=self.descending)
+        if self.limit:
+            query = query.limit(self.limit)
+        return query
+
+
+# ==================== PAGE QUERIES ====================
+# Each dataset declares only the columns and rows the pages render, and the
+# backend applies the projection and filters (no SELECT * + pandas filtering)
+
+# Dashboard, prioritization, search, dedup, routing and transparency pages
+# (no name/phone hashes, email, district or stored priority_score). The
+# lookback only drops old resolved requests: the open backlog is kept at
+# any age, at the cost of scanning the unresolved blocks of older partitions
+REQUESTS_QUERY = QuerySpec(
+    'citizen_requests',
+    columns=['request_id', 'complaint_type', 'description', 'city', 'ward', 'severity', 'status',
+             'affected_count', 'department', 'date_submitted', 'resolved_date'],
+    order_by='date_submitted',
+    lookback_days=DATA_LOOKBACK_DAYS,
+    lookback_keep=('status', '!=', 'Resolved')
+)
+
+# Predictive Analytics > Risk Assessment: high-risk assets only
+# (infrastructure_assets has no date column, so it is clustered, not partitioned)
+HIGH_RISK_INFRASTRUCTURE_QUERY = QuerySpec(
+    'infrastructure_assets',
+    columns=['asset_id', 'asset_type', 'location', 'risk_score', 'condition'],
+    filters=[('risk_score', '>', 7.0)],
+    order_by='risk_score',
+    name='high_risk_infrastructure'
+)
+
+# Predictive Analytics > Risk Assessment: Orange and Red alerts only
+HEALTH_ALERTS_QUERY = QuerySpec(
+    'health_surveillance',
+    columns=['record_id', 'disease_type', 'city', 'cases_reported', 'trend', 'action_taken', 'alert_level'],
+    filters=[('alert_level', 'in', ['Orange', 'Red'])],
+    order_by='cases_reported',
+    name='health_alerts',
+    lookback_days=DATA_LOOKBACK_DAYS
+)
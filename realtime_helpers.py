@@ -0,0 +1,282 @@
+"""
+Change feed helpers for Maharashtra Governance Platform
+
+Pushes inserts and updates to the shared in-process indexes and to open
+dashboard sessions as they happen, instead of waiting for the data cache
+TTL. ChangeFeed is the in-process feed: the app publishes its own writes
+to it, and PostgresChangeListener forwards Postgres LISTEN/NOTIFY events
+(from the notify_citizen_request_change trigger) to it when a database
+URL is configured.
+"""
+
+import os
+import json
+import time
+import select
+import threading
+from collections import deque, OrderedDict
+from datetime import datetime
+
+import pandas as pd
+
+from metrics_helpers import span, increment, set_gauge
+
+# Postgres channel the notify trigger publishes on
+NOTIFY_CHANNEL = 'governance_changes'
+
+# Events kept for sessions catching up after a wait
+MAX_EVENTS = 5000
+
+# Recently seen event keys, so a write seen both locally and via NOTIFY applies once
+DEDUP_WINDOW = 10000
+
+# Newest critical requests shown in the live alerts panel
+LIVE_ALERTS = 3
+
+# How long a dashboard session stays live, and how often it checks in while idle
+LIVE_SESSION_SECONDS = 900
+LIVE_WAIT_SECONDS = 2
+
+# Seconds between reconnect attempts of the Postgres listener
+RECONNECT_SECONDS = 5
+
+DATE_COLUMNS = ['date_submitted', 'resolved_date']
+
+
+def _normalize_record(record):
+    """Parse timestamp strings from NOTIFY payloads into naive datetimes"""
+    record = dict(record or {})
+    for column in DATE_COLUMNS:
+        value = record.get(column)
+        if value is not None and not isinstance(value, datetime):
+            ts = pd.Timestamp(value)
+            if pd.isna(ts):
+                record[column] = None
+            else:
+                record[column] = (ts.tz_convert(None) if ts.tzinfo is not None else ts).to_pydatetime()
+    return record
+
+
+class ChangeFeed:
+    """
+    In-process change feed. Subscribers are called once per event, in
+    publish order; sessions can block on wait_for_events until something
+    newer than the last sequence number they saw arrives.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._dispatch_lock = threading.Lock()
+        self._events = deque(maxlen=MAX_EVENTS)
+        self._seen = OrderedDict()
+        self._subscribers = []
+        self._seq = 0
+        self.mode = 'local'
+
+    @property
+    def latest_seq(self):
+        return self._seq
+
+    def subscribe(self, callback, table=None):
+        """Call callback(event) for every event (or only those of one table)"""
+        self._subscribers.append((table, callback))
+
+    def publish(self, table, event_type, record, old_record=None, source='local'):
+        """
+        Record a change and apply it to every subscriber. Returns the event,
+        or None when the same change was already published.
+        """
+        record = _normalize_record(record)
+        key = (table, event_type, record.get('request_id'), record.get('status'), str(record.get('resolved_date')))
+
+        with self._dispatch_lock:
+            # Only a different source (local write echoed back via NOTIFY) counts as a duplicate
+            if self._seen.get(key, source) != source:
+                increment('change_feed_duplicates_total', table=table, source=source)
+                return None
+            self._seen[key] = source
+            self._seen.move_to_end(key)
+            if len(self._seen) > DEDUP_WINDOW:
+                self._seen.popitem(last=False)
+
+            event = {
+                'seq': self._seq + 1,
+                'table': table,
+                'type': event_type,
+                'record': record,
+                'old_record': _normalize_record(old_record) if old_record else None,
+                'source': source,
+                'received_at': time.time()
+            }
+
+            with span('change_feed_dispatch', table=table):
+                for subscribed_table, callback in self._subscribers:
+                    if subscribed_table in (None, table):
+                        try:
+                            callback(event)
+                        except Exception as e:
+                            print(f"Error applying change event: {e}")
+                            increment('change_feed_errors_total', table=table)
+
+            # Sessions only see the event once every index reflects it
+            with self._condition:
+                self._seq = event['seq']
+                self._events.append(event)
+                self._condition.notify_all()
+
+        increment('change_feed_events_total', table=table, type=event_type, source=source)
+        set_gauge('change_feed_seq', self._seq)
+        return event
+
+    def events_since(self, seq):
+        """Events newer than seq, oldest first"""
+        with self._condition:
+            return [event for event in self._events if event['seq'] > seq]
+
+    def wait_for_events(self, seq, timeout=None):
+        """Block until an event newer than seq arrives (or timeout); returns the new events"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._seq > seq, timeout=timeout)
+        return self.events_since(seq)
+
+
+class PostgresChangeListener:
+    """
+    Forwards Postgres NOTIFY payloads to a ChangeFeed from a daemon thread,
+    reconnecting after connection errors. Needs psycopg2 (optional).
+    """
+
+    def __init__(self, feed, dsn, channel=NOTIFY_CHANNEL):
+        self.feed = feed
+        self.dsn = dsn
+        self.channel = channel
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """Start listening; returns False when psycopg2 is not installed"""
+        try:
+            import psycopg2  # noqa: F401
+        except ImportError:
+            print("psycopg2 not installed, change feed stays in local mode")
+            return False
+        self._thread = threading.Thread(target=self._run, name='postgres-change-listener', daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        import psycopg2
+
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(self.dsn)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {self.channel};")
+                set_gauge('change_feed_connected', 1)
+
+                while not self._stop.is_set():
+                    # Wake up periodically so stop() is honoured
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._handle(conn.notifies.pop(0).payload)
+            except Exception as e:
+                print(f"Change feed listener error: {e}")
+                increment('change_feed_errors_total', table='listener')
+                set_gauge('change_feed_connected', 0)
+                self._stop.wait(RECONNECT_SECONDS)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def _handle(self, payload):
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            print(f"Ignoring malformed change payload: {payload[:100]}")
+            return
+        self.feed.publish(message.get('table'), message.get('type'), message.get('record'),
+                          old_record=message.get('old_record'), source='postgres')
+
+
+def start_change_feed(feed, dsn=None):
+    """
+    Connect a feed to Postgres LISTEN/NOTIFY when a database URL is set
+    (SUPABASE_DB_URL); otherwise it stays a local in-process feed.
+    Returns the feed mode.
+    """
+    dsn = dsn or os.getenv('SUPABASE_DB_URL')
+    if dsn and PostgresChangeListener(feed, dsn).start():
+        feed.mode = 'postgres'
+    return feed.mode
+
+
+class LiveDataset:
+    """
+    Live dashboard KPIs and the newest critical alerts: rebuilt from each
+    freshly loaded snapshot, then kept up to date in O(1) per event.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._alerts = deque(maxlen=LIVE_ALERTS)
+        self._kpis = {'total_requests': 0, 'open_requests': 0, 'critical_requests': 0, 'total_affected': 0}
+        self.snapshot_version = None
+
+    def _count(self, row, sign):
+        self._kpis['total_requests'] += sign
+        self._kpis['open_requests'] += sign * (row.get('status') == 'Open')
+        self._kpis['critical_requests'] += sign * (row.get('severity') == 'Critical')
+        self._kpis['total_affected'] += sign * int(row.get('affected_count') or 0)
+
+    def rebase(self, requests_df, version):
+        """Rebuild from a newly loaded snapshot; skipped when version is unchanged"""
+        with self._lock:
+            if version is not None and version == self.snapshot_version:
+                return
+            columns = [c for c in ['request_id', 'status', 'severity', 'affected_count'] if c in requests_df.columns]
+            self._rows = {}
+            self._kpis = dict.fromkeys(self._kpis, 0)
+            if not requests_df.empty:
+                for row in requests_df[columns].to_dict('records'):
+                    self._rows[row['request_id']] = row
+                    self._count(row, 1)
+
+                critical = requests_df[requests_df['severity'] == 'Critical'].head(LIVE_ALERTS)
+                self._alerts = deque(reversed(critical.to_dict('records')), maxlen=LIVE_ALERTS)
+            self.snapshot_version = version
+
+    def apply(self, event):
+        """ChangeFeed subscriber for citizen_requests events"""
+        record = event['record']
+        request_id = record.get('request_id')
+        with self._lock:
+            previous = self._rows.pop(request_id, None)
+            if previous:
+                self._count(previous, -1)
+            if event['type'] == 'DELETE':
+                return
+            row = {key: record.get(key) for key in ['request_id', 'status', 'severity', 'affected_count']}
+            self._rows[request_id] = row
+            self._count(row, 1)
+            if event['type'] == 'INSERT' and record.get('severity') == 'Critical':
+                self._alerts.append(record)
+
+    def kpis(self):
+        """Current dashboard KPIs, including changes since the snapshot"""
+        with self._lock:
+            kpis = dict(self._kpis)
+        kpis['avg_affected'] = int(kpis['total_affected'] / kpis['total_requests']) if kpis['total_requests'] else 0
+        return kpis
+
+    def critical_alerts(self):
+        """Newest critical requests, newest first"""
+        with self._lock:
+            return list(reversed(self._alerts))
@@ -0,0 +1,330 @@
+"""
+Gemini client helpers for Maharashtra Governance Platform
+
+Stand-ins for genai.GenerativeModel with the same generate_content(prompt,
+generation_config=None, stream=False) interface, so caching, batching
+and concurrency can be measured without an API key or network:
+  - RecordingModel wraps the live model and appends every call (prompt
+    key, response text, chunk timings, latency, error) to a JSONL file
+  - ReplayModel answers recorded prompts with the recorded text and
+    latency (chunks at their recorded offsets when streaming)
+  - SyntheticModel answers any prompt with a well-formed response for
+    its kind (compact or verbose analysis, details, forecast), with
+    log-normal latency and injected API and quota errors; latency and
+    error rates can be fitted from a recording
+gemini_client(model) picks one by GEMINI_CLIENT_MODE (live, record,
+replay or synthetic). Random draws are seeded per prompt, so a replayed
+or synthetic run is repeatable.
+"""
+
+import os
+import json
+import math
+import time
+import random
+import hashlib
+import threading
+from types import SimpleNamespace
+from datetime import datetime
+
+from gemini_helpers import request_key
+
+# live (default), record, replay or synthetic
+GEMINI_CLIENT_MODE = os.getenv('GEMINI_CLIENT_MODE', 'live')
+RECORDINGS_PATH = os.getenv('GEMINI_RECORDINGS_PATH', './recordings/gemini.jsonl')
+
+# Synthetic defaults (roughly gemini-1.5-flash on short JSON answers)
+SYNTHETIC_LATENCY_MEDIAN = 1.8
+SYNTHETIC_LATENCY_SIGMA = 0.45
+SYNTHETIC_ERROR_RATE = 0.02
+SYNTHETIC_QUOTA_RATE = 0.01
+
+# Characters per streamed chunk of a synthetic response
+SYNTHETIC_CHUNK_CHARS = 24
+
+
+class SyntheticAPIError(Exception):
+    """Injected Gemini API failure"""
+
+
+class ResourceExhausted(Exception):
+    """Injected quota error (same class name as the google.api_core one)"""
+
+
+def _response(text, prompt):
+    """Object shaped like a GenerateContentResponse: text plus usage totals"""
+    output_tokens = len(text) // 4
+    usage = SimpleNamespace(candidates_token_count=output_tokens, total_token_count=len(prompt) // 4 + output_tokens)
+    return SimpleNamespace(text=text, usage_metadata=usage)
+
+
+def _chunks(pieces, started):
+    """Stream of (offset seconds, text) pieces, each released at its offset"""
+    for offset, text in pieces:
+        delay = started + offset - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        yield SimpleNamespace(text=text)
+
+
+def _rng(prompt, seed):
+    return random.Random(int(hashlib.sha256(f"{seed}:{prompt}".encode('utf-8')).hexdigest()[:16], 16))
+
+
+# ==================== RECORD ====================
+
+class RecordingModel:
+    """Live model whose calls are appended to a JSONL recording"""
+
+    def __init__(self, model, path=RECORDINGS_PATH):
+        self._model = model
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    def _write(self, prompt, generation_config, started, text=None, chunks=None, error=None):
+        entry = {
+            'key': request_key(prompt, generation_config),
+            'kind': prompt_kind(prompt),
+            'text': text,
+            'chunks': chunks,
+            'latency_seconds': round(time.perf_counter() - started, 4),
+            'error': type(error).__name__ if error else None,
+            'recorded_at': datetime.now().isoformat(timespec='seconds')
+        }
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + '\n')
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        started = time.perf_counter()
+        if stream:
+            return self._stream(prompt, generation_config, started)
+        try:
+            response = self._model.generate_content(prompt, generation_config=generation_config)
+            text = response.text
+        except Exception as e:
+            self._write(prompt, generation_config, started, error=e)
+            raise
+        self._write(prompt, generation_config, started, text=text)
+        return response
+
+    def _stream(self, prompt, generation_config, started):
+        chunks = []
+        try:
+            for chunk in self._model.generate_content(prompt, generation_config=generation_config, stream=True):
+                chunks.append([round(time.perf_counter() - started, 4), chunk.text])
+                yield chunk
+        except Exception as e:
+            self._write(prompt, generation_config, started, chunks=chunks, error=e)
+            raise
+        self._write(prompt, generation_config, started, text=''.join(text for _, text in chunks), chunks=chunks)
+
+
+def load_recording(path=RECORDINGS_PATH):
+    """Recorded calls, one dict per line"""
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# ==================== SYNTHETIC ====================
+
+def prompt_kind(prompt):
+    """Which response a prompt asks for: compact, details, verbose, forecast or text"""
+    if '"u": <urgency' in prompt:
+        return 'compact'
+    if '"rr":' in prompt:
+        return 'details'
+    if '"demand_forecast"' in prompt:
+        return 'forecast'
+    if '"urgency_score"' in prompt:
+        return 'verbose'
+    return 'text'
+
+
+def _synthetic_text(kind, rng):
+    urgency = round(rng.uniform(2.0, 9.8), 1)
+    priority = 'Critical' if urgency >= 8.5 else 'High' if urgency >= 6.5 else 'Medium' if urgency >= 4 else 'Low'
+    days = rng.randint(1, 14)
+    action = f"Dispatch the department field team within {min(days, 3)} days and report progress to the ward office."
+    if kind == 'compact':
+        return json.dumps({'u': urgency, 'p': priority[0], 'e': rng.randint(10, 95), 'd': days, 'a': action})
+    details = {
+        'rr': f"{rng.randint(2, 8)} staff, standard equipment, budget of Rs {rng.randint(1, 20)} lakh.",
+        'sp': "Similar complaints recur in this ward after heavy rain.",
+        'pm': "Scheduled inspections and preventive maintenance before the monsoon.",
+        'ia': "Unresolved, the issue will affect more households and raise escalations.",
+        'rs': "The severity and the number of affected citizens call for a quick response. "
+              "The department has handled similar cases within a week. Delay raises escalation risk."
+    }
+    if kind == 'details':
+        return json.dumps(details)
+    if kind == 'verbose':
+        return '```json\n' + json.dumps({
+            'urgency_score': urgency, 'escalation_risk_percent': rng.randint(10, 95), 'predicted_priority': priority,
+            'recommended_action': action, 'estimated_resolution_days': days,
+            'resource_requirements': details['rr'], 'similar_patterns': details['sp'],
+            'prevention_measures': details['pm'], 'impact_analysis': details['ia'], 'reasoning': details['rs']
+        }, indent=2) + '\n```'
+    if kind == 'forecast':
+        services = ['water_supply', 'healthcare', 'infrastructure', 'electricity']
+        return json.dumps({
+            'forecast_date': datetime.now().strftime('%Y-%m-%d'),
+            'demand_forecast': {service: {'predicted_requests': rng.randint(5, 40),
+                                          'change_percent': round(rng.uniform(-20, 30), 1),
+                                          'confidence': rng.randint(60, 90),
+                                          'trend': rng.choice(['Increasing', 'Stable', 'Decreasing'])}
+                                for service in services},
+            'bottlenecks': [], 'resource_allocation': {'additional_staff_needed': rng.randint(0, 20),
+                                                       'budget_required_lakhs': round(rng.uniform(1, 50), 1),
+                                                       'priority_areas': ['Mumbai', 'Pune']},
+            'risk_zones': [], 'insights': "Synthetic forecast."
+        })
+    return "Synthetic response."
+
+
+class SyntheticModel:
+    """
+    Any prompt answered with a well-formed synthetic response after a
+    log-normal latency; a share of calls fail with SyntheticAPIError or
+    ResourceExhausted instead
+    """
+
+    def __init__(self, latency_median=SYNTHETIC_LATENCY_MEDIAN, latency_sigma=SYNTHETIC_LATENCY_SIGMA,
+                 error_rate=SYNTHETIC_ERROR_RATE, quota_rate=SYNTHETIC_QUOTA_RATE, time_scale=1.0, seed=0):
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.quota_rate = quota_rate
+        self.time_scale = time_scale
+        self.seed = seed
+        self.calls = 0
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_recording(cls, entries, **kwargs):
+        """Latency distribution and error rates fitted to recorded calls"""
+        latencies = sorted(e['latency_seconds'] for e in entries if not e.get('error'))
+        if not entries or not latencies:
+            return cls(**kwargs)
+        logs = [math.log(max(latency, 1e-3)) for latency in latencies]
+        mean = sum(logs) / len(logs)
+        sigma = (sum((x - mean) ** 2 for x in logs) / len(logs)) ** 0.5
+        errors = [e['error'] for e in entries if e.get('error')]
+        quota = sum(1 for error in errors if error in ('ResourceExhausted', 'TooManyRequests'))
+        return cls(latency_median=latencies[len(latencies) // 2], latency_sigma=sigma,
+                   error_rate=(len(errors) - quota) / len(entries), quota_rate=quota / len(entries), **kwargs)
+
+    def _draw(self, prompt):
+        """(latency seconds, error or None, response text) for a prompt"""
+        # Seeded by the prompt and how often it was asked, so thread scheduling does not change the draws
+        with self._lock:
+            self.calls += 1
+            occurrence = self._seen[prompt] = self._seen.get(prompt, 0) + 1
+        rng = _rng(f"{occurrence}:{prompt}", self.seed)
+        latency = rng.lognormvariate(math.log(self.latency_median), self.latency_sigma) * self.time_scale
+        roll = rng.random()
+        if roll < self.quota_rate:
+            return latency, ResourceExhausted("429 Resource has been exhausted (synthetic)"), None
+        if roll < self.quota_rate + self.error_rate:
+            return latency, SyntheticAPIError("500 Internal error (synthetic)"), None
+        return latency, None, _synthetic_text(prompt_kind(prompt), _rng(prompt, self.seed))
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        latency, error, text = self._draw(prompt)
+        if stream:
+            return self._stream(prompt, latency, error, text)
+        time.sleep(latency)
+        if error:
+            raise error
+        return _response(text, prompt)
+
+    def _stream(self, prompt, latency, error, text):
+        started = time.perf_counter()
+        if error:
+            time.sleep(latency)
+            raise error
+        # First chunk after about a third of the latency, the rest spread over the remainder
+        pieces = [text[i:i + SYNTHETIC_CHUNK_CHARS] for i in range(0, len(text), SYNTHETIC_CHUNK_CHARS)]
+        first = latency / 3
+        step = (latency - first) / max(len(pieces) - 1, 1)
+        yield from _chunks([(first + i * step, piece) for i, piece in enumerate(pieces)], started)
+
+
+# ==================== REPLAY ====================
+
+class ReplayModel:
+    """
+    Recorded prompts answered with their recorded text, error and latency;
+    prompts not in the recording go to fallback (a SyntheticModel fitted
+    to the recording by default) or raise KeyError when fallback is None
+    """
+
+    def __init__(self, entries, fallback='synthetic', time_scale=1.0, seed=0):
+        self.time_scale = time_scale
+        self._entries = {}
+        for entry in entries:
+            self._entries.setdefault(entry['key'], []).append(entry)
+        self._next = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if fallback == 'synthetic':
+            fallback = SyntheticModel.from_recording(entries, time_scale=time_scale, seed=seed)
+        self.fallback = fallback
+
+    @classmethod
+    def from_file(cls, path=RECORDINGS_PATH, **kwargs):
+        return cls(load_recording(path), **kwargs)
+
+    def _entry(self, prompt, generation_config):
+        """Next recording of this prompt, cycling through repeated recordings"""
+        key = request_key(prompt, generation_config)
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                self.misses += 1
+                return None
+            index = self._next.get(key, 0)
+            self._next[key] = index + 1
+            self.hits += 1
+            return entries[index % len(entries)]
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        entry = self._entry(prompt, generation_config)
+        if entry is None:
+            if self.fallback is None:
+                raise KeyError(f"Prompt not in recording: {request_key(prompt, generation_config)[:12]}")
+            return self.fallback.generate_content(prompt, generation_config=generation_config, stream=stream)
+        if stream:
+            return self._stream(entry, prompt)
+        time.sleep(entry['latency_seconds'] * self.time_scale)
+        if entry['error']:
+            raise SyntheticAPIError(f"Recorded {entry['error']}") if entry['error'] != 'ResourceExhausted' \
+                else ResourceExhausted("429 Recorded quota error")
+        return _response(entry['text'], prompt)
+
+    def _stream(self, entry, prompt):
+        started = time.perf_counter()
+        pieces = entry['chunks'] or ([[entry['latency_seconds'], entry['text']]] if entry['text'] else [])
+        yield from _chunks([(offset * self.time_scale, text) for offset, text in pieces], started)
+        if entry['error']:
+            time.sleep(max(entry['latency_seconds'] * self.time_scale - (time.perf_counter() - started), 0))
+            raise SyntheticAPIError(f"Recorded {entry['error']}") if entry['error'] != 'ResourceExhausted' \
+                else ResourceExhausted("429 Recorded quota error")
+
+
+def gemini_client(model, mode=GEMINI_CLIENT_MODE, path=RECORDINGS_PATH):
+    """The live model, or a recording, replay or synthetic stand-in for it by mode"""
+    if mode == 'record':
+        print(f"🎙️ Recording Gemini calls to {path}")
+        return RecordingModel(model, path)
+    if mode == 'replay':
+        print(f"🔁 Replaying Gemini calls from {path}")
+        return ReplayModel.from_file(path)
+    if mode == 'synthetic':
+        print("🧪 Using the synthetic Gemini stand-in")
+        return SyntheticModel()
+    return model
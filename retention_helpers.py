@@ -0,0 +1,292 @@
+"""
+Retention helpers for Maharashtra Governance Platform
+
+Enforces the 7-year retention policy of the append-only log tables
+(audit_logs, predictions_log) and keeps them small:
+  - rows older than the hot window are rolled into zstd-compressed Parquet
+    files, one per table and day (<archive>/<table>/date=YYYY-MM-DD/),
+    and only then deleted from the live table
+  - archived days older than the retention period are purged
+  - RetentionEngine.query reads a date range across the live table and
+    the archive as one frame, so callers never need to know where a row
+    lives
+The archive must be durable shared storage (a gs:// bucket): app
+containers have ephemeral disks and may run as several replicas. Rows
+are never deleted while RETENTION_ARCHIVE_DIR is unset or local. Passes
+run from run_retention.py (cron or a scheduled job), not from the app.
+Archiving a day again merges into its file and drops duplicate IDs, so an
+interrupted run is simply repeated.
+"""
+
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pyarrow import fs as pafs
+
+from metrics_helpers import span, increment, set_gauge
+from query_helpers import PARTITION_COLUMNS
+
+# Log tables under retention and the ID column that identifies a row
+RETAINED_TABLES = {
+    'audit_logs': 'log_id',
+    'predictions_log': 'prediction_id'
+}
+
+# Days kept in the live tables; older rows only live in the archive
+HOT_DAYS = int(os.getenv('RETENTION_HOT_DAYS', '90'))
+
+# Days kept at all (7 years, leap days included)
+RETENTION_DAYS = 7 * 365 + 2
+
+# Bucket holding the Parquet archive (gs://bucket/prefix); nothing is deleted until it is set
+ARCHIVE_DIR = os.getenv('RETENTION_ARCHIVE_DIR', '')
+
+# Archive locations that survive restarts and are shared by every replica
+DURABLE_SCHEMES = ('gs://',)
+
+# Seconds between passes of run_retention.py (0 runs one pass and exits, for cron)
+RETENTION_INTERVAL_SECONDS = int(os.getenv('RETENTION_INTERVAL_SECONDS', '0'))
+
+COMPRESSION = 'zstd'
+
+
+def _utc_now():
+    """Naive UTC now, matching how timestamps come back from the backends"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _start_of_day(value):
+    return datetime(value.year, value.month, value.day)
+
+
+def _naive_utc(series):
+    series = pd.to_datetime(series, utc=True)
+    return series.dt.tz_localize(None)
+
+
+class ParquetArchive:
+    """
+    Day-partitioned, compressed Parquet files of archived log rows, in a
+    bucket (gs://) or a local directory. Without a root the archive is
+    empty and read-only.
+    """
+
+    def __init__(self, root=ARCHIVE_DIR):
+        self.root = root or None
+        self.durable = bool(root) and root.startswith(DURABLE_SCHEMES)
+        self._fs = self._base = None
+        if root and '://' in root:
+            self._fs, self._base = pafs.FileSystem.from_uri(root)
+        elif root:
+            self._fs, self._base = pafs.LocalFileSystem(), os.path.abspath(root)
+
+    def _day_dir(self, table, day):
+        return f"{self._base}/{table}/date={day.isoformat()}"
+
+    def _file(self, table, day):
+        return f"{self._day_dir(table, day)}/part-0.parquet"
+
+    def days(self, table):
+        """Archived days of a table, oldest first"""
+        if self._fs is None:
+            return []
+        selector = pafs.FileSelector(f"{self._base}/{table}", allow_not_found=True)
+        days = []
+        for info in self._fs.get_file_info(selector):
+            if info.type == pafs.FileType.Directory and info.base_name.startswith('date='):
+                try:
+                    days.append(datetime.strptime(info.base_name[5:], '%Y-%m-%d').date())
+                except ValueError:
+                    continue
+        return sorted(days)
+
+    def write(self, table, rows):
+        """
+        Add rows to the archive, one file per day of their timestamp.
+        Existing days are merged and deduplicated by ID; each file is
+        replaced atomically. Returns the number of rows written.
+        """
+        if rows.empty:
+            return 0
+        if self._fs is None:
+            raise RuntimeError("No archive location configured (RETENTION_ARCHIVE_DIR)")
+        column = PARTITION_COLUMNS[table][0]
+        key = RETAINED_TABLES[table]
+        rows = rows.copy()
+        rows[column] = _naive_utc(rows[column])
+
+        written = 0
+        for day, day_rows in rows.groupby(rows[column].dt.date):
+            path = self._file(table, day)
+            if self._fs.get_file_info(path).type == pafs.FileType.File:
+                existing = pq.read_table(path, filesystem=self._fs).to_pandas()
+                day_rows = pd.concat([existing, day_rows], ignore_index=True)
+            day_rows = day_rows.drop_duplicates(subset=[key], keep='last').sort_values(column)
+
+            self._fs.create_dir(self._day_dir(table, day))
+            data = pa.Table.from_pandas(day_rows, preserve_index=False)
+            if isinstance(self._fs, pafs.LocalFileSystem):
+                tmp_path = path + '.tmp'
+                pq.write_table(data, tmp_path, filesystem=self._fs, compression=COMPRESSION)
+                self._fs.move(tmp_path, path)
+            else:
+                # Object uploads only become visible once complete
+                pq.write_table(data, path, filesystem=self._fs, compression=COMPRESSION)
+            written += len(day_rows)
+        return written
+
+    def read(self, table, start=None, end=None, columns=None):
+        """Archived rows with start <= timestamp < end; only the files of those days are opened"""
+        column = PARTITION_COLUMNS[table][0]
+        frames = []
+        for day in self.days(table):
+            if start is not None and day < start.date():
+                continue
+            if end is not None and day > end.date():
+                continue
+            read_columns = None if columns is None else sorted(set(columns) | {column})
+            frames.append(pq.read_table(self._file(table, day), columns=read_columns,
+                                        filesystem=self._fs).to_pandas())
+        if not frames:
+            return pd.DataFrame(columns=columns or [])
+
+        rows = pd.concat(frames, ignore_index=True)
+        mask = pd.Series(True, index=rows.index)
+        if start is not None:
+            mask &= rows[column] >= start
+        if end is not None:
+            mask &= rows[column] < end
+        rows = rows[mask]
+        return rows[columns] if columns else rows
+
+    def purge(self, table, before):
+        """Delete every archived day older than before; returns the days removed"""
+        removed = [day for day in self.days(table) if day < before.date()]
+        for day in removed:
+            self._fs.delete_dir(self._day_dir(table, day))
+        return len(removed)
+
+    def describe(self):
+        """One dict per table with archived days, rows, size on disk and date range"""
+        summary = []
+        for table in RETAINED_TABLES:
+            days = self.days(table)
+            rows = size = 0
+            for day in days:
+                path = self._file(table, day)
+                with self._fs.open_input_file(path) as f:
+                    rows += pq.ParquetFile(f).metadata.num_rows
+                size += self._fs.get_file_info(path).size
+            summary.append({
+                'table': table,
+                'archived_days': len(days),
+                'archived_rows': rows,
+                'archive_mb': round(size / 1024 / 1024, 2),
+                'oldest_day': days[0] if days else None,
+                'newest_day': days[-1] if days else None
+            })
+        return summary
+
+
+class RetentionEngine:
+    """
+    Moves log rows from the live tables to the archive and enforces the
+    retention period. fetch_rows(table, start, end) and
+    delete_rows(table, before) are the backend functions for the live
+    tables (utils_helpers.fetch_log_rows / delete_log_rows).
+    """
+
+    def __init__(self, archive, fetch_rows, delete_rows, hot_days=HOT_DAYS, retention_days=RETENTION_DAYS):
+        self.archive = archive
+        self.fetch_rows = fetch_rows
+        self.delete_rows = delete_rows
+        self.hot_days = hot_days
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self.last_run = None
+
+    def hot_cutoff(self, now=None):
+        """Start of the oldest day still kept in the live tables"""
+        return _start_of_day((now or _utc_now()) - timedelta(days=self.hot_days))
+
+    def retention_cutoff(self, now=None):
+        """Start of the oldest day kept at all"""
+        return _start_of_day((now or _utc_now()) - timedelta(days=self.retention_days))
+
+    def archive_table(self, table, now=None, dry_run=False):
+        """
+        Archive and then delete the rows of one table older than the hot
+        window. Rows are only deleted once their files are written, and
+        only from a durable archive. Returns (rows archived, rows deleted);
+        a dry run only counts the rows that would move.
+        """
+        cutoff = self.hot_cutoff(now)
+        rows = pd.DataFrame(self.fetch_rows(table, None, cutoff, raise_errors=True))
+        if rows.empty or dry_run:
+            return len(rows), 0
+        if not self.archive.durable:
+            raise RuntimeError(f"Refusing to delete {table} rows: RETENTION_ARCHIVE_DIR must be a durable "
+                               f"bucket ({', '.join(DURABLE_SCHEMES)}), not {self.archive.root or 'unset'}")
+        self.archive.write(table, rows)
+        increment('retention_rows_archived_total', value=len(rows), table=table)
+        deleted = self.delete_rows(table, cutoff)
+        increment('retention_rows_deleted_total', value=deleted, table=table)
+        if deleted != len(rows):
+            # e.g. row level security silently filtering the delete (or the fetch)
+            increment('retention_count_mismatches_total', table=table)
+            raise RuntimeError(f"Archived {len(rows)} {table} rows but deleted {deleted}")
+        return len(rows), deleted
+
+    def run(self, now=None, dry_run=False):
+        """
+        One retention pass over every table: archive, delete, purge.
+        Returns one result dict per table; an error on one table does not
+        stop the others.
+        """
+        now = now or _utc_now()
+        results = []
+        with self._lock, span('retention_run'):
+            for table in RETAINED_TABLES:
+                result = {'table': table, 'archived': 0, 'deleted': 0, 'purged_days': 0, 'error': None}
+                try:
+                    result['archived'], result['deleted'] = self.archive_table(table, now, dry_run)
+                    if not dry_run and self.archive.durable:
+                        result['purged_days'] = self.archive.purge(table, self.retention_cutoff(now))
+                    increment('retention_days_purged_total', value=result['purged_days'], table=table)
+                except Exception as e:
+                    print(f"Error applying retention to {table}: {e}")
+                    increment('retention_errors_total', table=table)
+                    result['error'] = str(e)
+                results.append(result)
+            self.last_run = {'finished_at': _utc_now(), 'results': results}
+        set_gauge('retention_last_run_timestamp_seconds', datetime.now().timestamp())
+        return results
+
+    def query(self, table, start=None, end=None, columns=None):
+        """
+        Rows of a log table with start <= timestamp < end, newest first,
+        from the live table and the archive together. A row present in
+        both (archived but not yet deleted) is returned once.
+        """
+        column = PARTITION_COLUMNS[table][0]
+        key = RETAINED_TABLES[table]
+        with span('retention_query', table=table):
+            hot = pd.DataFrame(self.fetch_rows(table, start, end))
+            if not hot.empty:
+                hot[column] = _naive_utc(hot[column])
+            archived = pd.DataFrame()
+            if start is None or start < self.hot_cutoff():
+                archived = self.archive.read(table, start, end)
+
+            frames = [frame for frame in [hot, archived] if not frame.empty]
+            if not frames:
+                return pd.DataFrame(columns=columns or [])
+            rows = pd.concat(frames, ignore_index=True)
+            rows = rows.drop_duplicates(subset=[key], keep='first').sort_values(column, ascending=False)
+            rows = rows.reset_index(drop=True)
+            return rows[columns] if columns else rows
+
@@ -0,0 +1,493 @@
+"""
+Department routing helpers for Maharashtra Governance Platform
+
+Routes incoming requests to department field teams and balances their
+workload. A team is one department serving a zone of wards in a city.
+A request goes to the team with the earliest expected completion, which
+depends on three things:
+  - open load ahead of it (only items with at least its priority)
+  - the team's historical resolution speed
+  - a transfer penalty when a neighbouring zone takes the request
+Loads and speeds are updated incrementally as requests resolve, and
+simulate_week runs a discrete-event simulation for capacity planning.
+"""
+
+import re
+import time
+import heapq
+import bisect
+import random
+import threading
+from collections import deque
+from datetime import datetime
+
+import pandas as pd
+
+from metrics_helpers import span, increment, set_gauge
+from priority_helpers import static_score
+
+# Complaint type -> responsible department
+DEPARTMENT_ROUTES = {
+    "Water Supply": "Water Department",
+    "Electricity": "MSEDCL",
+    "Road Repair": "PWD",
+    "Healthcare": "Health Department",
+    "Garbage Collection": "Sanitation Department",
+    "Street Lights": "Municipal Corporation",
+    "Drainage": "PWD",
+    "Public Transport": "Transport Department",
+    "Other": "General Department"
+}
+DEFAULT_DEPARTMENT = "General Department"
+
+# Wards are grouped into zones, each served by one team per department
+WARDS_PER_ZONE = 5
+
+# Parallel field crews per team
+CREWS_PER_TEAM = 2
+
+# Days of resolution time assumed before a team has any history
+DEFAULT_RESOLUTION_DAYS = 3.0
+
+# Weight of the newest resolution in the moving average of resolution days
+RESOLUTION_EWMA_ALPHA = 0.1
+
+# Extra days charged when a neighbouring zone's team takes a request
+TRANSFER_PENALTY_DAYS = 1.0
+
+# Statuses that still count as load on a team
+OPEN_STATUSES = {'Open', 'In Progress'}
+
+# Recent submissions kept as the arrival mix for simulations
+ARRIVAL_SAMPLE_SIZE = 5000
+
+_WARD_NUMBER_RE = re.compile(r"(\d+)")
+
+
+def route_department(complaint_type):
+    """Department responsible for a complaint type"""
+    return DEPARTMENT_ROUTES.get(complaint_type, DEFAULT_DEPARTMENT)
+
+
+def ward_zone(ward):
+    """Zone number of a ward label such as 'Ward 12' (zone 1 when unknown)"""
+    match = _WARD_NUMBER_RE.search(str(ward or ''))
+    if not match:
+        return 1
+    return (max(int(match.group(1)), 1) - 1) // WARDS_PER_ZONE + 1
+
+
+def _team_key(department, city, zone):
+    return (department, city, zone)
+
+
+def team_label(team):
+    """Display name of a team key"""
+    department, city, zone = team
+    return f"{department} · {city} Zone {zone}"
+
+
+def _as_datetime(value):
+    if value is None:
+        return None
+    ts = pd.Timestamp(value)
+    if pd.isna(ts):
+        return None
+    if ts.tzinfo is not None:
+        ts = ts.tz_localize(None)
+    return ts.to_pydatetime()
+
+
+class RoutingScheduler:
+    """
+    Assigns requests to teams and keeps per-team open load and resolution
+    speed. Shared across sessions; all methods are thread-safe.
+    """
+
+    def __init__(self, crews_per_team=CREWS_PER_TEAM):
+        self.crews_per_team = crews_per_team
+        self._lock = threading.Lock()
+        self._teams = {}
+        self._assignments = {}
+        # Every request ever counted as an arrival (open or resolved), so a re-sync never counts it again
+        self._seen = set()
+        self._department_speed = {}
+        self._arrivals = deque(maxlen=ARRIVAL_SAMPLE_SIZE)
+        self._arrival_count = 0
+        self._first_arrival = None
+        self._last_arrival = None
+        self.synced_version = None
+
+    def __len__(self):
+        return len(self._assignments)
+
+    def _team(self, key):
+        team = self._teams.get(key)
+        if team is None:
+            team = self._teams[key] = {
+                'open': {},
+                'priorities': [],
+                'resolution_days': None,
+                'resolved': 0
+            }
+        return team
+
+    def _speed(self, key):
+        """Expected days to resolve one request at a team"""
+        speed = self._teams[key]['resolution_days'] if key in self._teams else None
+        if speed is None:
+            speed = self._department_speed.get(key[0], DEFAULT_RESOLUTION_DAYS)
+        return speed
+
+    def _expected_wait(self, key, priority):
+        """Days before a new request with this priority would be picked up"""
+        priorities = self._teams[key]['priorities'] if key in self._teams else []
+        ahead = len(priorities) - bisect.bisect_left(priorities, priority)
+        return ahead / self.crews_per_team * self._speed(key)
+
+    def _candidates(self, department, city, zone):
+        """Home team plus existing teams of the same department in neighbouring zones"""
+        home = _team_key(department, city, zone)
+        candidates = [home]
+        for neighbour in (zone - 1, zone + 1):
+            key = _team_key(department, city, neighbour)
+            if key in self._teams:
+                candidates.append(key)
+        return home, candidates
+
+    def _place(self, request_id, key, priority, status, submitted):
+        team = self._team(key)
+        team['open'][request_id] = priority
+        bisect.insort(team['priorities'], priority)
+        self._assignments[request_id] = {
+            'team': key,
+            'priority': priority,
+            'status': status,
+            'date_submitted': submitted
+        }
+
+    def _unplace(self, request_id):
+        assignment = self._assignments.pop(request_id, None)
+        if assignment is None:
+            return None
+        team = self._teams[assignment['team']]
+        team['open'].pop(request_id, None)
+        priorities = team['priorities']
+        index = bisect.bisect_left(priorities, assignment['priority'])
+        if index < len(priorities) and priorities[index] == assignment['priority']:
+            del priorities[index]
+        return assignment
+
+    def _record_resolution(self, key, days):
+        team = self._team(key)
+        days = max(days, 0.0)
+        team['resolution_days'] = days if team['resolution_days'] is None else \
+            (1 - RESOLUTION_EWMA_ALPHA) * team['resolution_days'] + RESOLUTION_EWMA_ALPHA * days
+        team['resolved'] += 1
+        department = key[0]
+        current = self._department_speed.get(department)
+        self._department_speed[department] = days if current is None else \
+            (1 - RESOLUTION_EWMA_ALPHA) * current + RESOLUTION_EWMA_ALPHA * days
+
+    def _remember_arrival(self, record, department, submitted):
+        self._seen.add(record.get('request_id'))
+        self._arrivals.append({
+            'department': department,
+            'city': record.get('city'),
+            'zone': ward_zone(record.get('ward')),
+            'priority': static_score(record.get('severity'), record.get('affected_count'))
+        })
+        self._arrival_count += 1
+        if submitted:
+            self._first_arrival = min(self._first_arrival or submitted, submitted)
+            self._last_arrival = max(self._last_arrival or submitted, submitted)
+
+    # ==================== ROUTING ====================
+
+    def assign(self, record):
+        """
+        Route a new request (dict-like) to the team with the earliest
+        expected completion. Returns the assignment as a dict.
+        """
+        request_id = record.get('request_id')
+        department = record.get('department') or route_department(record.get('complaint_type'))
+        city = record.get('city')
+        priority = static_score(record.get('severity'), record.get('affected_count'))
+        submitted = _as_datetime(record.get('date_submitted')) or datetime.now()
+
+        with self._lock:
+            known = self._unplace(request_id) is not None or request_id in self._seen
+            home, candidates = self._candidates(department, city, ward_zone(record.get('ward')))
+
+            best_key, best_wait, best_cost = None, None, None
+            for key in candidates:
+                wait = self._expected_wait(key, priority)
+                cost = wait + self._speed(key) + (0 if key == home else TRANSFER_PENALTY_DAYS)
+                if best_cost is None or cost < best_cost:
+                    best_key, best_wait, best_cost = key, wait, cost
+
+            self._place(request_id, best_key, priority, record.get('status') or 'Open', submitted)
+            self._assignments[request_id]['expected_wait_days'] = round(best_wait, 1)
+            self._assignments[request_id]['expected_resolution_days'] = round(best_cost, 1)
+            if not known:
+                self._remember_arrival(record, department, submitted)
+            set_gauge('routing_open_assignments', len(self._assignments))
+
+        increment('routing_assignments_total', department=department,
+                  placement='home' if best_key == home else 'neighbour')
+        return self.assignment(request_id)
+
+    def assignment(self, request_id):
+        """Current team of an open request as a dict, or None if it is not assigned"""
+        with self._lock:
+            assignment = self._assignments.get(request_id)
+            if assignment is None:
+                return None
+            return {
+                'request_id': request_id,
+                'department': assignment['team'][0],
+                'team': team_label(assignment['team']),
+                'status': assignment['status'],
+                'expected_wait_days': assignment.get('expected_wait_days'),
+                'expected_resolution_days': assignment.get('expected_resolution_days')
+            }
+
+    def update_status(self, request_id, status, resolved_date=None):
+        """
+        Apply a status change. Resolving frees capacity, updates the team's
+        resolution speed and may pull one waiting request over from a busier
+        neighbouring team. Returns the list of reassignments made.
+        """
+        with self._lock:
+            assignment = self._assignments.get(request_id)
+            if assignment is None:
+                return []
+            if status in OPEN_STATUSES:
+                assignment['status'] = status
+                return []
+
+            self._unplace(request_id)
+            key = assignment['team']
+            resolved = _as_datetime(resolved_date) or datetime.now()
+            if assignment['date_submitted']:
+                self._record_resolution(key, (resolved - assignment['date_submitted']).total_seconds() / 86400)
+            moves = self._rebalance(key)
+            set_gauge('routing_open_assignments', len(self._assignments))
+        return moves
+
+    def _rebalance(self, key):
+        """Move the lowest-priority unstarted request from the busiest neighbour if that saves time"""
+        department, city, zone = key
+        own_backlog = len(self._teams[key]['open']) / self.crews_per_team * self._speed(key)
+
+        busiest, busiest_backlog = None, own_backlog + TRANSFER_PENALTY_DAYS
+        for neighbour in (zone - 1, zone + 1):
+            other = _team_key(department, city, neighbour)
+            if other in self._teams:
+                backlog = len(self._teams[other]['open']) / self.crews_per_team * self._speed(other)
+                if backlog > busiest_backlog:
+                    busiest, busiest_backlog = other, backlog
+        if busiest is None:
+            return []
+
+        waiting = [(priority, request_id) for request_id, priority in self._teams[busiest]['open'].items()
+                   if self._assignments[request_id]['status'] == 'Open']
+        if not waiting:
+            return []
+        _, request_id = min(waiting)
+        moved = self._unplace(request_id)
+        self._place(request_id, key, moved['priority'], moved['status'], moved['date_submitted'])
+        increment('routing_rebalanced_total', department=department)
+        return [{'request_id': request_id, 'from_team': team_label(busiest), 'to_team': team_label(key)}]
+
+    def sync(self, requests_df, version=None):
+        """
+        Bring loads and speeds up to date with a requests DataFrame; skipped
+        when version is unchanged. Requests already in the data keep the team
+        of their own ward; newly resolved ones release their load. Each
+        request counts once as an arrival and once as a resolution, however
+        many snapshots it appears in.
+        """
+        if requests_df is None or requests_df.empty:
+            return 0
+        if version is not None and version == self.synced_version:
+            return 0
+
+        columns = [c for c in ['request_id', 'complaint_type', 'city', 'ward', 'severity', 'status',
+                               'affected_count', 'department', 'date_submitted', 'resolved_date']
+                   if c in requests_df.columns]
+        ordered = requests_df[columns].sort_values('date_submitted') if 'date_submitted' in columns else requests_df[columns]
+
+        with span('routing_sync'):
+            for record in ordered.to_dict('records'):
+                request_id = record.get('request_id')
+                status = record.get('status') or 'Open'
+                if request_id in self._assignments:
+                    self.update_status(request_id, status, record.get('resolved_date'))
+                    continue
+
+                department = record.get('department') or route_department(record.get('complaint_type'))
+                submitted = _as_datetime(record.get('date_submitted'))
+                key = _team_key(department, record.get('city'), ward_zone(record.get('ward')))
+                with self._lock:
+                    seen = request_id in self._seen
+                    if seen and status not in OPEN_STATUSES:
+                        # Resolved in an earlier snapshot (or by update_status): already counted
+                        continue
+                    if not seen:
+                        self._remember_arrival(record, department, submitted)
+                    if status in OPEN_STATUSES:
+                        # New, or reopened after it was resolved
+                        priority = static_score(record.get('severity'), record.get('affected_count'))
+                        self._place(request_id, key, priority, status, submitted)
+                    else:
+                        resolved = _as_datetime(record.get('resolved_date'))
+                        if resolved and submitted:
+                            self._record_resolution(key, (resolved - submitted).total_seconds() / 86400)
+            self.synced_version = version
+        set_gauge('routing_open_assignments', len(self._assignments))
+        return len(ordered)
+
+    def team_loads(self):
+        """One row per team with open load, crews, resolution speed and backlog in days"""
+        with self._lock:
+            rows = []
+            for key, team in self._teams.items():
+                department, city, zone = key
+                speed = self._speed(key)
+                rows.append({
+                    'team': team_label(key),
+                    'department': department,
+                    'city': city,
+                    'zone': zone,
+                    'open_requests': len(team['open']),
+                    'crews': self.crews_per_team,
+                    'avg_resolution_days': round(speed, 1),
+                    'backlog_days': round(len(team['open']) / self.crews_per_team * speed, 1),
+                    'resolved': team['resolved']
+                })
+        return pd.DataFrame(rows)
+
+    # ==================== CAPACITY PLANNING ====================
+
+    def observed_arrival_rate(self):
+        """Average submissions per day over the observed history"""
+        with self._lock:
+            if not self._arrivals or not self._first_arrival:
+                return 0.0
+            days = max((self._last_arrival - self._first_arrival).total_seconds() / 86400, 1.0)
+            return self._arrival_count / days
+
+    def simulate_week(self, arrivals_per_day=None, days=7, crews_per_team=None, seed=None):
+        """
+        Discrete-event simulation of `days` of submissions starting from the
+        current open backlog. Arrivals are Poisson at arrivals_per_day (the
+        observed rate by default) with the observed mix of departments,
+        places and priorities; they are routed with the same rule as assign.
+        Resolution times are exponential around each team's historical mean.
+        Returns one row per department.
+        """
+        rng = random.Random(seed)
+        crews = crews_per_team or self.crews_per_team
+        rate = arrivals_per_day if arrivals_per_day is not None else self.observed_arrival_rate()
+
+        with self._lock:
+            mix = list(self._arrivals)
+            speeds = {key: self._speed(key) for key in self._teams}
+            department_speed = dict(self._department_speed)
+            backlog = {key: sorted(team['open'].values(), reverse=True) for key, team in self._teams.items()}
+
+        def speed_of(key):
+            if key not in speeds:
+                speeds[key] = department_speed.get(key[0], DEFAULT_RESOLUTION_DAYS)
+            return speeds[key]
+
+        started = time.perf_counter()
+        # Per team: busy crews and a waiting heap of (-priority, seq, arrival_time, department)
+        busy, waiting = {}, {}
+        events = []
+        seq = 0
+        stats = {}
+
+        def dept_stats(department):
+            return stats.setdefault(department, {'arrivals': 0, 'resolved': 0, 'waits': [], 'busy_days': 0.0})
+
+        def start_service(key, now):
+            nonlocal seq
+            while busy.get(key, 0) < crews and waiting.get(key):
+                _, _, arrived, department = heapq.heappop(waiting[key])
+                busy[key] = busy.get(key, 0) + 1
+                duration = rng.expovariate(1.0 / max(speed_of(key), 0.01))
+                seq += 1
+                heapq.heappush(events, (now + duration, seq, 'done', key, department))
+                entry = dept_stats(department)
+                if arrived is not None:
+                    entry['waits'].append(now - arrived)
+                entry['busy_days'] += min(duration, days - now) if now < days else 0.0
+
+        for key, priorities in backlog.items():
+            waiting[key] = []
+            for priority in priorities:
+                seq += 1
+                waiting[key].append((-priority, seq, None, key[0]))
+            heapq.heapify(waiting[key])
+            start_service(key, 0.0)
+
+        # Poisson arrivals over the horizon
+        if mix and rate > 0:
+            now = rng.expovariate(rate)
+            while now < days:
+                seq += 1
+                heapq.heappush(events, (now, seq, 'arrive', rng.choice(mix), None))
+                now += rng.expovariate(rate)
+
+        while events:
+            now, _, kind, payload, department = heapq.heappop(events)
+            if now > days:
+                break
+            if kind == 'arrive':
+                department = payload['department']
+                dept_stats(department)['arrivals'] += 1
+                home = _team_key(department, payload['city'], payload['zone'])
+                candidates = [home] + [_team_key(department, payload['city'], z)
+                                       for z in (payload['zone'] - 1, payload['zone'] + 1)
+                                       if _team_key(department, payload['city'], z) in speeds]
+                # Same rule as assign; the waiting queue length stands in for load ahead
+                best = min(candidates, key=lambda k: (len(waiting.get(k, ())) + busy.get(k, 0)) / crews * speed_of(k)
+                           + speed_of(k) + (0 if k == home else TRANSFER_PENALTY_DAYS))
+                seq += 1
+                heapq.heappush(waiting.setdefault(best, []), (-payload['priority'], seq, now, department))
+                start_service(best, now)
+            else:
+                busy[payload] -= 1
+                dept_stats(department)['resolved'] += 1
+                start_service(payload, now)
+
+        # Requests still waiting at the end count with their wait so far
+        for queue in waiting.values():
+            for _, _, arrived, department in queue:
+                if arrived is not None:
+                    dept_stats(department)['waits'].append(days - arrived)
+
+        teams_per_department = {}
+        for key in set(speeds) | set(waiting):
+            teams_per_department[key[0]] = teams_per_department.get(key[0], 0) + 1
+
+        rows = []
+        for department, entry in stats.items():
+            waits = sorted(entry['waits'])
+            left = sum(len(queue) for key, queue in waiting.items() if key[0] == department)
+            capacity = teams_per_department.get(department, 1) * crews * days
+            rows.append({
+                'department': department,
+                'arrivals': entry['arrivals'],
+                'resolved': entry['resolved'],
+                'backlog_end': left,
+                'avg_wait_days': round(sum(waits) / len(waits), 2) if waits else 0.0,
+                'p90_wait_days': round(waits[int(0.9 * (len(waits) - 1))], 2) if waits else 0.0,
+                'crew_utilization': round(min(entry['busy_days'] / capacity, 1.0), 2)
+            })
+
+        increment('routing_simulations_total')
+        set_gauge('routing_last_simulation_seconds', time.perf_counter() - started)
+        return pd.DataFrame(rows).sort_values('backlog_end', ascending=False) if rows else pd.DataFrame(rows)
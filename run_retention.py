@@ -0,0 +1,57 @@
+"""
+Apply log retention for Maharashtra Governance Platform
+
+Archives audit_logs and predictions_log rows older than the hot window
+to the Parquet archive in RETENTION_ARCHIVE_DIR (a gs:// bucket), deletes
+them from the live tables and purges archived days past the 7-year
+retention period (retention_helpers). Run it from one place only, as a
+cron job or a scheduled Cloud Run job, not from the app replicas. Rows
+are never deleted unless the archive is a durable bucket.
+
+Usage:
+    python run_retention.py [--backend bigquery|supabase] [--dry-run] [--interval 0]
+"""
+
+import time
+import argparse
+
+from retention_helpers import ParquetArchive, RetentionEngine, ARCHIVE_DIR, RETENTION_INTERVAL_SECONDS
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive old log rows and enforce the retention period")
+    parser.add_argument('--backend', choices=['bigquery', 'supabase'], default='bigquery')
+    parser.add_argument('--archive', default=ARCHIVE_DIR, help="archive location (gs://bucket/prefix)")
+    parser.add_argument('--dry-run', action='store_true', help="count the rows that would move, change nothing")
+    parser.add_argument('--interval', type=int, default=RETENTION_INTERVAL_SECONDS,
+                        help="seconds between passes (0 runs one pass and exits)")
+    args = parser.parse_args()
+
+    if args.backend == 'supabase':
+        from supabase_helpers import fetch_log_rows, delete_log_rows
+    else:
+        from utils_helpers import fetch_log_rows, delete_log_rows
+
+    archive = ParquetArchive(args.archive)
+    if not archive.durable and not args.dry_run:
+        parser.error(f"--archive must be a durable bucket (gs://...), got {args.archive or 'nothing'}; "
+                     f"use --dry-run to only count rows")
+    engine = RetentionEngine(archive, fetch_log_rows, delete_log_rows)
+
+    while True:
+        print(f"🗄️ Retention pass ({'dry run, ' if args.dry_run else ''}hot window {engine.hot_days} days, "
+              f"archive {archive.root or 'unset'})")
+        results = engine.run(dry_run=args.dry_run)
+        for result in results:
+            status = f"❌ {result['error']}" if result['error'] else "✅"
+            print(f"   {result['table']:<16} archived {result['archived']:>8,}  deleted {result['deleted']:>8,}  "
+                  f"purged days {result['purged_days']:>4}  {status}")
+        if args.interval <= 0:
+            if any(result['error'] for result in results):
+                raise SystemExit(1)
+            return
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Full-text search helpers for Maharashtra Governance Platform
+
+In-process inverted index over complaint descriptions for the BigQuery
+deployment (the Supabase deployment uses the Postgres tsvector/GIN index
+and the search_citizen_requests RPC instead). Results are ranked with
+BM25 and can be filtered by city, ward, severity, status and department.
+"""
+
+import re
+import math
+import heapq
+import threading
+from datetime import datetime, timedelta
+
+from metrics_helpers import span, set_gauge
+
+# Metadata columns kept per document for filtering and display
+FILTER_COLUMNS = ['city', 'ward', 'severity', 'status', 'department']
+DISPLAY_COLUMNS = ['request_id', 'complaint_type', 'city', 'ward', 'severity', 'status', 'department', 'date_submitted']
+
+# Fields whose text is indexed (ward so "Ward 12" matches the location too)
+TEXT_FIELDS = ['description', 'complaint_type', 'ward']
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'has', 'have', 'in',
+    'is', 'it', 'its', 'of', 'on', 'or', 'that', 'the', 'to', 'was', 'were', 'with', 'our', 'we'
+}
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _stem(token):
+    """Very light suffix stripping so 'bursts'/'leaking' match 'burst'/'leak'"""
+    if token.isdigit() or len(token) <= 4:
+        return token
+    for suffix in ('ing', 'ed', 's'):
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[:-len(suffix)]
+    return token
+
+
+def tokenize(text):
+    """Lowercase, split on non-alphanumerics, drop stopwords and stem"""
+    return [_stem(token) for token in _TOKEN_RE.findall(str(text or '').lower())
+            if token not in STOPWORDS]
+
+
+class ComplaintSearchIndex:
+    """
+    Incremental inverted index over citizen requests.
+
+    Postings map term -> {doc number: term frequency}. Documents are only
+    ever appended; updates tombstone the old document number so postings
+    never need rewriting.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = {}
+        self._docs = []
+        self._doc_lengths = []
+        self._alive = []
+        self._doc_by_request = {}
+        self._total_length = 0
+        self._live_count = 0
+        self.synced_version = None
+
+    def __len__(self):
+        return self._live_count
+
+    def _text_of(self, record):
+        return ' '.join(str(record.get(field) or '') for field in TEXT_FIELDS)
+
+    def add(self, record):
+        """Index one request (dict-like); re-indexes if the request_id is already present"""
+        request_id = record.get('request_id')
+        if request_id is None:
+            return
+
+        with self._lock:
+            existing = self._doc_by_request.get(request_id)
+            if existing is not None:
+                old = self._docs[existing]
+                if old['_text'] == self._text_of(record):
+                    # Text unchanged: only refresh filterable metadata
+                    old.update({col: record.get(col) for col in DISPLAY_COLUMNS})
+                    return
+                self._remove_doc(existing)
+
+            tokens = tokenize(self._text_of(record))
+            doc_number = len(self._docs)
+            doc = {col: record.get(col) for col in DISPLAY_COLUMNS}
+            doc['_text'] = self._text_of(record)
+            doc['snippet'] = str(record.get('description') or '')[:200]
+            self._docs.append(doc)
+            self._doc_lengths.append(len(tokens))
+            self._alive.append(True)
+            self._doc_by_request[request_id] = doc_number
+            self._total_length += len(tokens)
+            self._live_count += 1
+
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                self._postings.setdefault(token, {})[doc_number] = tf
+
+    def _remove_doc(self, doc_number):
+        if self._alive[doc_number]:
+            self._alive[doc_number] = False
+            self._total_length -= self._doc_lengths[doc_number]
+            self._live_count -= 1
+            for token in set(tokenize(self._docs[doc_number]['_text'])):
+                postings = self._postings.get(token)
+                if postings is not None:
+                    postings.pop(doc_number, None)
+                    if not postings:
+                        del self._postings[token]
+
+    def remove(self, request_id):
+        """Drop a request from the index"""
+        with self._lock:
+            doc_number = self._doc_by_request.pop(request_id, None)
+            if doc_number is not None:
+                self._remove_doc(doc_number)
+
+    def sync(self, requests_df, version=None):
+        """
+        Bring the index up to date with a requests DataFrame. Skipped when
+        version matches the last synced version, so calling it on every
+        rerun only costs work when the underlying snapshot changed.
+        """
+        if requests_df is None or requests_df.empty:
+            return 0
+        if version is not None and version == self.synced_version:
+            return 0
+
+        columns = [col for col in set(DISPLAY_COLUMNS + TEXT_FIELDS) if col in requests_df.columns]
+        added = 0
+        with span('search_index_sync'):
+            for record in requests_df[columns].to_dict('records'):
+                self.add(record)
+                added += 1
+            self.synced_version = version
+        set_gauge('search_index_documents', self._live_count)
+        return added
+
+    def search(self, query, filters=None, limit=20):
+        """
+        Ranked search. filters maps a FILTER_COLUMNS name to a value or list
+        of allowed values, plus optional date_from/date_to (inclusive dates).
+        Returns a list of result dicts with a score.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        allowed = {}
+        for column, values in (filters or {}).items():
+            if column in FILTER_COLUMNS and values:
+                allowed[column] = {values} if isinstance(values, str) else set(values)
+
+        date_from = (filters or {}).get('date_from')
+        date_to = (filters or {}).get('date_to')
+        start = datetime.combine(date_from, datetime.min.time()) if date_from else None
+        end = datetime.combine(date_to, datetime.min.time()) + timedelta(days=1) if date_to else None
+
+        with self._lock, span('search_query'):
+            n_docs = max(self._live_count, 1)
+            avg_length = self._total_length / n_docs if self._total_length else 1.0
+
+            scores = {}
+            for term in set(terms):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_number, tf in postings.items():
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self._doc_lengths[doc_number] / avg_length)
+                    scores[doc_number] = scores.get(doc_number, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+            def matches(doc_number):
+                doc = self._docs[doc_number]
+                if start or end:
+                    submitted = doc.get('date_submitted')
+                    if submitted is None or (start and submitted < start) or (end and submitted >= end):
+                        return False
+                return all(doc.get(column) in values for column, values in allowed.items())
+
+            candidates = ((score, doc_number) for doc_number, score in scores.items() if matches(doc_number))
+            top = heapq.nlargest(limit, candidates)
+
+            results = []
+            for score, doc_number in top:
+                doc = self._docs[doc_number]
+                result = {col: doc.get(col) for col in DISPLAY_COLUMNS}
+                result['snippet'] = doc['snippet']
+                result['score'] = round(score, 3)
+                results.append(result)
+            return results
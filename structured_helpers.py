@@ -0,0 +1,302 @@
+"""
+Structured Gemini output helpers for Maharashtra Governance Platform
+
+Compact analysis contract: Gemini answers with a small JSON object of
+short field codes (COMPACT_FIELDS) in a fixed order, urgency and
+priority first, within a 256-token output budget. The verbose narrative
+fields (DETAIL_FIELDS) are asked for in a second call only when an
+officer opens them.
+
+The installed google-generativeai release has no response-schema
+option, so the schema lives in the prompt and every field is validated
+and clamped here (expand_fields). Responses are read with
+IncrementalJSONParser, which takes text in chunks, yields each
+top-level field as soon as it is complete and keeps every complete
+field of a truncated or malformed response instead of failing the
+whole parse. The stream_* variants feed it a streamed response and yield
+the fields parsed so far after every chunk, so urgency and priority can
+be shown before the rest of the answer has arrived.
+"""
+
+import os
+import json
+
+from metrics_helpers import increment
+from gemini_helpers import generate_text, stream_text, fallback_reason, priority_for
+
+# 'compact' (short codes, lazy details) or 'verbose' (all ten fields in one call)
+ANALYSIS_MODE = os.getenv('GEMINI_ANALYSIS_MODE', 'compact')
+
+COMPACT_CONFIG = {"temperature": 0.4, "max_output_tokens": 256}
+DETAIL_CONFIG = {"temperature": 0.7, "max_output_tokens": 768}
+
+PRIORITY_CODES = {'C': 'Critical', 'H': 'High', 'M': 'Medium', 'L': 'Low'}
+
+# Short code -> (field, type, lower bound, upper bound); order is the response order
+COMPACT_FIELDS = {
+    'u': ('urgency_score', float, 1.0, 10.0),
+    'p': ('predicted_priority', 'priority', None, None),
+    'e': ('escalation_risk_percent', int, 0, 100),
+    'd': ('estimated_resolution_days', int, 1, 365),
+    'a': ('recommended_action', str, None, None)
+}
+
+DETAIL_FIELDS = {
+    'rr': ('resource_requirements', str, None, None),
+    'sp': ('similar_patterns', str, None, None),
+    'pm': ('prevention_measures', str, None, None),
+    'ia': ('impact_analysis', str, None, None),
+    'rs': ('reasoning', str, None, None)
+}
+
+# All ten fields under their full names, for validating verbose responses
+VERBOSE_FIELDS = {name: (name, kind, low, high)
+                  for name, kind, low, high in [*COMPACT_FIELDS.values(), *DETAIL_FIELDS.values()]}
+
+# Fields requests are ranked and the cascade learns on; a response without
+# them is a rule answer, whatever else Gemini completed
+CORE_FIELDS = ('urgency_score', 'predicted_priority')
+
+
+class IncrementalJSONParser:
+    """
+    Reads one JSON object from text arriving in chunks. Anything before the
+    first '{' (markdown fences, preambles) is skipped. Each top-level
+    member is decoded on its own as soon as the comma or closing brace
+    after it arrives, so a bad member only loses itself.
+    """
+
+    def __init__(self):
+        self.fields = {}
+        self.errors = 0
+        self.done = False
+        self._buffer = ''
+        self._pos = 0
+        self._start = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def _emit(self, end):
+        member = self._buffer[self._start:end].strip()
+        if member:
+            try:
+                self.fields.update(json.loads('{' + member + '}'))
+            except ValueError:
+                self.errors += 1
+
+    def feed(self, chunk):
+        """Add text; returns the names of the fields completed by it"""
+        before = set(self.fields)
+        self._buffer += chunk
+        buffer = self._buffer
+        while self._pos < len(buffer) and not self.done:
+            c = buffer[self._pos]
+            if self._start is None:
+                if c == '{':
+                    self._start, self._depth = self._pos + 1, 1
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+            elif c == '"':
+                self._in_string = True
+            elif c in '{[':
+                self._depth += 1
+            elif c in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    self._emit(self._pos)
+                    self.done = True
+            elif c == ',' and self._depth == 1:
+                self._emit(self._pos)
+                self._start = self._pos + 1
+            self._pos += 1
+        return [name for name in self.fields if name not in before]
+
+    def partial(self):
+        """
+        Complete fields plus the member still being written when its value
+        is a string (closed where it stops); numbers wait for their comma
+        """
+        fields = dict(self.fields)
+        if self._start is not None and not self.done and self._depth == 1:
+            member = self._buffer[self._start:self._pos].strip()
+            if self._in_string and not self._escape:
+                member += '"'
+            if member.endswith('"'):
+                try:
+                    fields.update(json.loads('{' + member + '}'))
+                except ValueError:
+                    pass
+        return fields
+
+
+def salvage_json(text):
+    """
+    Every complete top-level field of a JSON object in text. Raises
+    json.JSONDecodeError when not a single field could be read.
+    """
+    parser = IncrementalJSONParser()
+    parser.feed(text)
+    if not parser.fields:
+        raise json.JSONDecodeError("No JSON fields in response", text, 0)
+    if not parser.done or parser.errors:
+        increment('gemini_salvaged_responses_total')
+    return parser.fields
+
+
+def expand_fields(fields, spec):
+    """Fields under their full names, coerced to type and clamped; invalid values are dropped"""
+    expanded = {}
+    for code, (name, kind, low, high) in spec.items():
+        value = fields.get(code)
+        if value is None:
+            continue
+        try:
+            if kind == 'priority':
+                value = PRIORITY_CODES.get(str(value).strip()[:1].upper())
+                if value is None:
+                    continue
+            elif kind is str:
+                value = str(value).strip()
+            else:
+                value = min(max(kind(float(value)), low), high)
+                value = round(value, 1) if kind is float else value
+        except (TypeError, ValueError):
+            continue
+        expanded[name] = value
+    return expanded
+
+
+def _request_lines(complaint_data):
+    return (
+        f"Type: {complaint_data.get('complaint_type', 'N/A')}\n"
+        f"Description: {complaint_data.get('description', 'N/A')}\n"
+        f"Location: {complaint_data.get('city', 'N/A')}, {complaint_data.get('ward', 'N/A')}\n"
+        f"Severity: {complaint_data.get('severity', 'N/A')} | Citizens affected: {complaint_data.get('affected_count', 0)} | "
+        f"Days open: {complaint_data.get('days_open', 0)} | Status: {complaint_data.get('status', 'Open')}\n"
+        f"Department: {complaint_data.get('department', 'N/A')}"
+    )
+
+
+def compact_analysis_prompt(complaint_data):
+    return f"""Maharashtra Government service request triage.
+{_request_lines(complaint_data)}
+
+Reply with one JSON object only, no markdown, keys in this order:
+{{"u": <urgency 1.0-10.0>, "p": "<priority C|H|M|L>", "e": <escalation risk 0-100>, "d": <resolution days>, "a": "<immediate action with department and timeline, max 25 words>"}}"""
+
+
+def details_prompt(complaint_data, prediction):
+    return f"""Maharashtra Government service request analysis.
+{_request_lines(complaint_data)}
+Assessment: urgency {prediction.get('urgency_score')}/10, priority {prediction.get('predicted_priority')}, about {prediction.get('estimated_resolution_days')} days to resolve.
+
+Reply with one JSON object only, no markdown, each value 1-2 sentences except rs (3-4 sentences):
+{{"rr": "<staff, budget, equipment>", "sp": "<patterns in the description>", "pm": "<how to prevent similar issues>", "ia": "<consequences if not resolved>", "rs": "<reasoning behind the assessment>"}}"""
+
+
+def analyze_compact(model, complaint_data, fallback):
+    """
+    Compact Gemini analysis: the five core fields, with any the response
+    lacks taken from fallback(complaint_data). Detail fields are None
+    until fetched with explain_compact.
+    """
+    try:
+        text = generate_text(model, 'analyze_complaint', compact_analysis_prompt(complaint_data),
+                             COMPACT_CONFIG, priority=priority_for(complaint_data.get('severity')))
+        core = expand_fields(salvage_json(text), COMPACT_FIELDS)
+    except Exception as e:
+        print(f"Gemini API error: {e}")
+        increment('gemini_fallback_total', operation='analyze_complaint', reason=fallback_reason(e))
+        return fallback(complaint_data)
+    return _complete_compact(core, fallback(complaint_data))
+
+
+def complete_prediction(fields, rules, spec):
+    """
+    Prediction with every field of spec, those the response lacks taken
+    from the rule prediction. Missing core fields make it a rule answer
+    (source 'rules'), so it is neither shown nor logged as Gemini's.
+    """
+    names = [name for name, *_ in spec.values()]
+    missing = [name for name in names if name not in fields]
+    if missing:
+        increment('gemini_missing_fields_total', value=len(missing), operation='analyze_complaint')
+    prediction = {name: fields.get(name, rules[name]) for name in names}
+    if any(name in missing for name in CORE_FIELDS):
+        increment('gemini_fallback_total', operation='analyze_complaint', reason='missing_fields')
+        prediction['source'] = 'rules'
+    return prediction
+
+
+def _complete_compact(core, rules):
+    """Compact prediction from the parsed core fields, missing ones from the rule prediction"""
+    prediction = complete_prediction(core, rules, COMPACT_FIELDS)
+    prediction.update({name: None for name, *_ in DETAIL_FIELDS.values()})
+    return prediction
+
+
+def explain_compact(model, complaint_data, prediction):
+    """Detail fields of a compact analysis, fetched when an officer opens them"""
+    try:
+        text = generate_text(model, 'explain_complaint', details_prompt(complaint_data, prediction),
+                             DETAIL_CONFIG, priority=priority_for(complaint_data.get('severity')))
+        details = expand_fields(salvage_json(text), DETAIL_FIELDS)
+    except Exception as e:
+        print(f"Gemini API error: {e}")
+        increment('gemini_fallback_total', operation='explain_complaint', reason=fallback_reason(e))
+        details = {}
+    return {name: details.get(name, "Not available") for name, *_ in DETAIL_FIELDS.values()}
+
+
+# ==================== STREAMING ====================
+
+def stream_fields(model, operation, prompt, generation_config, spec, priority):
+    """
+    Yields the expanded fields of a streamed JSON response after every
+    chunk (strings still being written included); returns the complete
+    fields once the stream ends
+    """
+    parser = IncrementalJSONParser()
+    for chunk in stream_text(model, operation, prompt, generation_config, priority=priority):
+        parser.feed(chunk)
+        yield expand_fields(parser.partial(), spec)
+    if not parser.fields:
+        raise json.JSONDecodeError("No JSON fields in response", "", 0)
+    if not parser.done or parser.errors:
+        increment('gemini_salvaged_responses_total')
+    return expand_fields(parser.fields, spec)
+
+
+def stream_compact(model, complaint_data, fallback):
+    """
+    Streamed analyze_compact: yields the fields parsed so far (urgency and
+    priority first), and last the complete prediction analyze_compact
+    would return
+    """
+    try:
+        core = yield from stream_fields(model, 'analyze_complaint', compact_analysis_prompt(complaint_data),
+                                        COMPACT_CONFIG, COMPACT_FIELDS, priority_for(complaint_data.get('severity')))
+    except Exception as e:
+        print(f"Gemini API error: {e}")
+        increment('gemini_fallback_total', operation='analyze_complaint', reason=fallback_reason(e))
+        yield fallback(complaint_data)
+        return
+    yield _complete_compact(core, fallback(complaint_data))
+
+
+def stream_details(model, complaint_data, prediction):
+    """Streamed explain_compact: narrative fields as they are written, and last the complete set"""
+    try:
+        details = yield from stream_fields(model, 'explain_complaint', details_prompt(complaint_data, prediction),
+                                           DETAIL_CONFIG, DETAIL_FIELDS, priority_for(complaint_data.get('severity')))
+    except Exception as e:
+        print(f"Gemini API error: {e}")
+        increment('gemini_fallback_total', operation='explain_complaint', reason=fallback_reason(e))
+        details = {}
+    yield {name: details.get(name, "Not available") for name, *_ in DETAIL_FIELDS.values()}
@@ -0,0 +1,21 @@
+/*
+  # Request browser indexes
+
+  1. Indexes
+    - `idx_citizen_requests_keyset`
+      - Matches the browser ordering (date_submitted DESC, request_id DESC)
+      - Keyset pagination reads one index range per page instead of sorting the table
+    - `idx_citizen_requests_request_id_prefix`
+      - Prefix search (`request_id LIKE 'R12%'`) for the request ID picker
+    - `idx_citizen_requests_department`
+      - Department filter in the request browser
+*/
+
+CREATE INDEX IF NOT EXISTS idx_citizen_requests_keyset
+  ON citizen_requests(date_submitted DESC, request_id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_citizen_requests_request_id_prefix
+  ON citizen_requests(request_id text_pattern_ops);
+
+CREATE INDEX IF NOT EXISTS idx_citizen_requests_department
+  ON citizen_requests(department);
@@ -0,0 +1,78 @@
+/*
+  # Full-text search over complaint descriptions
+
+  1. Columns
+    - `citizen_requests.search_vector`
+      - Generated tsvector over description (weight A), complaint_type (B) and ward (C)
+      - Stored, so Postgres keeps it up to date on every insert/update
+
+  2. Indexes
+    - `idx_citizen_requests_search` GIN index on search_vector
+
+  3. Functions
+    - `search_citizen_requests(search_query, ...)`
+      - websearch-style query ("pipeline burst ward 12", quoted phrases, -exclusions)
+      - Optional city/ward/severity/status/department arrays and date range filters
+      - Results ranked with ts_rank_cd, limited to result_limit rows
+*/
+
+ALTER TABLE citizen_requests
+  ADD COLUMN IF NOT EXISTS search_vector tsvector
+  GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', coalesce(description, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(complaint_type, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(ward, '')), 'C')
+  ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_citizen_requests_search
+  ON citizen_requests USING GIN (search_vector);
+
+CREATE OR REPLACE FUNCTION search_citizen_requests(
+  search_query text,
+  filter_city text[] DEFAULT NULL,
+  filter_ward text[] DEFAULT NULL,
+  filter_severity text[] DEFAULT NULL,
+  filter_status text[] DEFAULT NULL,
+  filter_department text[] DEFAULT NULL,
+  date_from timestamptz DEFAULT NULL,
+  date_to timestamptz DEFAULT NULL,
+  result_limit integer DEFAULT 20
+)
+RETURNS TABLE (
+  request_id text,
+  complaint_type text,
+  city text,
+  ward text,
+  severity text,
+  status text,
+  department text,
+  date_submitted timestamptz,
+  snippet text,
+  score real
+)
+LANGUAGE sql STABLE
+AS $$
+  SELECT
+    r.request_id,
+    r.complaint_type,
+    r.city,
+    r.ward,
+    r.severity,
+    r.status,
+    r.department,
+    r.date_submitted,
+    left(r.description, 200) AS snippet,
+    ts_rank_cd(r.search_vector, q) AS score
+  FROM citizen_requests r,
+       websearch_to_tsquery('english', search_query) q
+  WHERE r.search_vector @@ q
+    AND (filter_city IS NULL OR r.city = ANY(filter_city))
+    AND (filter_ward IS NULL OR r.ward = ANY(filter_ward))
+    AND (filter_severity IS NULL OR r.severity = ANY(filter_severity))
+    AND (filter_status IS NULL OR r.status = ANY(filter_status))
+    AND (filter_department IS NULL OR r.department = ANY(filter_department))
+    AND (date_from IS NULL OR r.date_submitted >= date_from)
+    AND (date_to IS NULL OR r.date_submitted < date_to)
+  ORDER BY score DESC
+  LIMIT result_limit;
+$$;
@@ -0,0 +1,67 @@
+/*
+  # Change notifications for citizen requests
+
+  1. Functions
+    - `notify_citizen_request_change()`
+      - Publishes every insert/update/delete on `governance_changes` with pg_notify
+      - Payload: {"table", "type", "record", "old_record"} as JSON
+      - Description is truncated to stay well under the 8000 byte NOTIFY limit
+
+  2. Triggers
+    - `citizen_requests_notify_change` AFTER INSERT OR UPDATE OR DELETE
+
+  3. Realtime
+    - Adds `citizen_requests` to the `supabase_realtime` publication (when present)
+      so Supabase Realtime clients receive the same changes
+*/
+
+CREATE OR REPLACE FUNCTION notify_citizen_request_change()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  new_row jsonb;
+  old_row jsonb;
+BEGIN
+  IF TG_OP <> 'DELETE' THEN
+    new_row := to_jsonb(NEW) - 'search_vector'
+      || jsonb_build_object('description', left(NEW.description, 2000));
+  ELSE
+    new_row := jsonb_build_object('request_id', OLD.request_id);
+  END IF;
+
+  IF TG_OP = 'UPDATE' THEN
+    old_row := jsonb_build_object('request_id', OLD.request_id, 'status', OLD.status);
+  END IF;
+
+  PERFORM pg_notify(
+    'governance_changes',
+    jsonb_build_object(
+      'table', TG_TABLE_NAME,
+      'type', TG_OP,
+      'record', new_row,
+      'old_record', old_row
+    )::text
+  );
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS citizen_requests_notify_change ON citizen_requests;
+
+CREATE TRIGGER citizen_requests_notify_change
+  AFTER INSERT OR UPDATE OR DELETE ON citizen_requests
+  FOR EACH ROW
+  EXECUTE FUNCTION notify_citizen_request_change();
+
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_publication WHERE pubname = 'supabase_realtime')
+     AND NOT EXISTS (
+       SELECT 1 FROM pg_publication_tables
+       WHERE pubname = 'supabase_realtime' AND tablename = 'citizen_requests'
+     ) THEN
+    ALTER PUBLICATION supabase_realtime ADD TABLE citizen_requests;
+  END IF;
+END;
+$$;
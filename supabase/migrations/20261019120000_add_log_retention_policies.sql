@@ -0,0 +1,30 @@
+/*
+  # Log retention policies
+
+  run_retention.py archives audit_logs and predictions_log rows older than
+  the hot window and then deletes them. Under row level security those
+  reads and deletes match no rows without raising an error, so the
+  retention job (connecting with the service role key) needs explicit
+  policies.
+
+  1. Policies
+    - `Service role can read audit logs` (SELECT on audit_logs)
+    - `Service role can delete audit logs` (DELETE on audit_logs)
+    - `Service role can delete predictions` (DELETE on predictions_log)
+    predictions_log is already readable by everyone.
+*/
+
+CREATE POLICY "Service role can read audit logs"
+  ON audit_logs FOR SELECT
+  TO service_role
+  USING (true);
+
+CREATE POLICY "Service role can delete audit logs"
+  ON audit_logs FOR DELETE
+  TO service_role
+  USING (true);
+
+CREATE POLICY "Service role can delete predictions"
+  ON predictions_log FOR DELETE
+  TO service_role
+  USING (true);
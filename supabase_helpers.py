@@ -4,11 +4,20 @@ Supabase helper functions for Maharashtra Governance Platform
 
 import os
 import hashlib
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import pandas as pd
 from dotenv import load_dotenv
 from supabase import create_client, Client
 import google.generativeai as genai
+from metrics_helpers import timed, span, increment, set_gauge
+from query_helpers import QuerySpec, PARTITION_COLUMNS
+from columnar_helpers import typed_frame, request_statistics
+from gemini_helpers import generate_text, fallback_reason, priority_for, PRIORITY_FORECAST
+from structured_helpers import (analyze_compact, explain_compact, stream_compact, stream_details, salvage_json,
+                                expand_fields, complete_prediction, VERBOSE_FIELDS, ANALYSIS_MODE)
+from replay_helpers import gemini_client
 
 load_dotenv()
 
@@ -36,49 +45,273 @@ except:
 
 supabase: Client = create_client(supabase_url, supabase_key)
 
+# Service-role client for the log retention job (audit_logs reads and log deletes are service-role only)
+service_role_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
+service_supabase = create_client(supabase_url, service_role_key) if service_role_key else None
+
 # Initialize Gemini
 genai.configure(api_key=gemini_key)
-gemini_model = genai.GenerativeModel('gemini-1.5-flash')
+gemini_model = gemini_client(genai.GenerativeModel('gemini-1.5-flash'))
 
 print("Supabase and Gemini initialized successfully")
 
 # Database Functions
-def fetch_citizen_requests():
-    """Fetch all citizen requests"""
+
+# Rows per PostgREST request (lowered automatically when the server caps responses lower)
+FETCH_PAGE_SIZE = 1000
+
+# Pages downloaded at once per table
+FETCH_WORKERS = 4
+
+# Attempts per page before the fetch gives up
+FETCH_ATTEMPTS = 3
+
+# Unique column of each table: tie-breaker for stable paging and dedup key
+TABLE_KEYS = {
+    'citizen_requests': 'request_id',
+    'infrastructure_assets': 'asset_id',
+    'health_surveillance': 'record_id',
+    'predictions_log': 'prediction_id',
+    'audit_logs': 'log_id'
+}
+
+def fetch_paged(spec, page_size=FETCH_PAGE_SIZE, workers=FETCH_WORKERS, client=None):
+    """
+    Fetch every row of a QuerySpec past the PostgREST max-rows cap.
+    
+    The first page also returns the exact row count; the remaining offset
+    ranges are downloaded concurrently (at most workers at a time, each
+    retried up to FETCH_ATTEMPTS times) and every page becomes a frame as
+    soon as it arrives. Rows are ordered by the spec's order column plus
+    the table key so ranges never overlap. Returns (typed DataFrame,
+    report) where report says whether all counted rows arrived.
+    """
+    key = TABLE_KEYS.get(spec.table)
+    
+    def page(start, end, count=None):
+        for attempt in range(FETCH_ATTEMPTS):
+            query = spec.apply_postgrest((client or supabase).table(spec.table), count=count)
+            if key:
+                query = query.order(key, desc=spec.descending)
+            try:
+                return query.range(start, end).execute()
+            except Exception:
+                if attempt == FETCH_ATTEMPTS - 1:
+                    raise
+                increment('supabase_page_retries_total', table=spec.name)
+    
+    with span('supabase_fetch_paged', table=spec.name):
+        first = page(0, page_size - 1, count='exact')
+        expected = first.count if first.count is not None else len(first.data)
+        # A server max-rows setting below page_size shortens every page
+        if 0 < len(first.data) < min(page_size, expected):
+            page_size = len(first.data)
+        
+        ranges = [(start, min(start + page_size, expected) - 1) for start in range(page_size, expected, page_size)]
+        frames = {0: pd.DataFrame.from_records(first.data)}
+        failed = []
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='supabase-fetch') as executor:
+            futures = {executor.submit(page, start, end): index for index, (start, end) in enumerate(ranges, 1)}
+            for future in as_completed(futures):
+                try:
+                    frames[futures[future]] = pd.DataFrame.from_records(future.result().data)
+                except Exception as e:
+                    print(f"Error fetching {spec.name} page {futures[future]}: {e}")
+                    failed.append(futures[future])
+        
+        df = pd.concat([frames[index] for index in sorted(frames)], ignore_index=True)
+        fetched = len(df)
+        if key and key in df.columns:
+            # Rows shifted by concurrent inserts can show up on two pages
+            df = df.drop_duplicates(subset=[key]).reset_index(drop=True)
+        df = typed_frame(df)
+    
+    report = {
+        'table': spec.name,
+        'expected_rows': expected,
+        'fetched_rows': len(df),
+        'duplicates': fetched - len(df),
+        'pages': len(ranges) + 1,
+        'failed_pages': sorted(failed),
+        'complete': not failed and len(df) >= expected
+    }
+    increment('supabase_pages_fetched_total', value=report['pages'] - len(failed), table=spec.name)
+    set_gauge('supabase_fetch_completeness_ratio', len(df) / expected if expected else 1.0, table=spec.name)
+    if not report['complete']:
+        print(f"Incomplete fetch of {spec.name}: {len(df)} of {expected} rows")
+    return df, report
+
+def _fetch_table(spec, as_frame, raise_errors):
+    """Whole-table fetch shared by the fetch_* helpers"""
     try:
-        response = supabase.table('citizen_requests').select('*').order('date_submitted', desc=True).execute()
-        return response.data
+        df, report = fetch_paged(spec)
+        if raise_errors and report['failed_pages']:
+            raise RuntimeError(f"{len(report['failed_pages'])} pages of {spec.name} failed to load")
+        return df if as_frame else df.to_dict('records')
     except Exception as e:
-        print(f"Error fetching requests: {e}")
-        return []
-
-def fetch_infrastructure_assets():
+        print(f"Error fetching {spec.name}: {e}")
+        increment('backend_query_errors_total', backend='supabase', table=spec.name)
+        if raise_errors:
+            raise
+        return pd.DataFrame() if as_frame else []
+
+@timed('backend_query', backend='supabase', table='citizen_requests')
+def fetch_citizen_requests(raise_errors=False, as_frame=True):
+    """
+    Fetch all citizen requests (every page, not just the first max-rows)
+    as a typed frame; as_frame=False returns records instead
+    """
+    return _fetch_table(QuerySpec('citizen_requests', order_by='date_submitted'), as_frame, raise_errors)
+
+@timed('backend_query', backend='supabase', table='infrastructure_assets')
+def fetch_infrastructure_assets(raise_errors=False, as_frame=True):
     """Fetch infrastructure data"""
+    return _fetch_table(QuerySpec('infrastructure_assets', order_by='risk_score'), as_frame, raise_errors)
+
+@timed('backend_query', backend='supabase', table='health_surveillance')
+def fetch_health_surveillance(raise_errors=False, as_frame=True):
+    """Fetch health surveillance data"""
+    return _fetch_table(QuerySpec('health_surveillance', order_by='date_reported'), as_frame, raise_errors)
+
+def fetch_query(spec, raise_errors=False):
+    """
+    Run a page's QuerySpec through PostgREST (select list, filters, order
+    and limit server-side) into a typed frame. Specs without a limit are
+    fetched page by page.
+    """
+    with span('backend_query', backend='supabase', table=spec.name):
+        try:
+            if not spec.limit:
+                df, report = fetch_paged(spec)
+                if report['failed_pages']:
+                    raise RuntimeError(f"{len(report['failed_pages'])} pages of {spec.name} failed to load")
+                return df
+            response = spec.apply_postgrest(supabase.table(spec.table)).execute()
+            return typed_frame(response.data)
+        except Exception as e:
+            print(f"Error running query {spec.name}: {e}")
+            increment('backend_query_errors_total', backend='supabase', table=spec.name)
+            if raise_errors:
+                raise
+            return pd.DataFrame()
+
+@timed('backend_query', backend='supabase', table='request_by_id')
+def get_request_by_id(request_id):
+    """Fetch specific request by ID"""
     try:
-        response = supabase.table('infrastructure_assets').select('*').order('risk_score', desc=True).execute()
+        response = supabase.table('citizen_requests').select('*').eq('request_id', request_id).maybeSingle().execute()
         return response.data
     except Exception as e:
-        print(f"Error fetching infrastructure: {e}")
-        return []
+        print(f"Error fetching request: {e}")
+        increment('backend_query_errors_total', backend='supabase', table='request_by_id')
+        return None
 
-def fetch_health_surveillance():
-    """Fetch health surveillance data"""
+# Columns shown in the paginated request browser (no hashes or descriptions)
+REQUEST_BROWSER_COLUMNS = [
+    'request_id', 'complaint_type', 'city', 'ward', 'severity', 'status',
+    'affected_count', 'department', 'date_submitted'
+]
+
+def _apply_request_filters(query, filters):
+    """Apply city/ward/severity/status/department and date_from/date_to filters to a PostgREST query"""
+    filters = filters or {}
+    for column in ['city', 'ward', 'severity', 'status', 'department']:
+        values = filters.get(column)
+        if not values:
+            continue
+        if isinstance(values, str):
+            values = [values]
+        query = query.in_(column, list(values))
+
+    if filters.get('date_from'):
+        query = query.gte('date_submitted', str(filters['date_from']))
+    if filters.get('date_to'):
+        # Inclusive end date: everything before the following midnight
+        next_day = datetime.fromisoformat(str(filters['date_to'])) + timedelta(days=1)
+        query = query.lt('date_submitted', next_day.date().isoformat())
+    return query
+
+@timed('backend_query', backend='supabase', table='requests_page')
+def fetch_requests_page(filters=None, cursor=None, page_size=25):
+    """
+    Fetch one page of requests, newest first, using keyset pagination on
+    (date_submitted, request_id). Returns (rows, next_cursor).
+    """
     try:
-        response = supabase.table('health_surveillance').select('*').order('date_reported', desc=True).execute()
-        return response.data
+        query = supabase.table('citizen_requests').select(','.join(REQUEST_BROWSER_COLUMNS))
+        query = _apply_request_filters(query, filters)
+
+        if cursor:
+            cursor_date, cursor_id = cursor
+            query = query.or_(
+                f'date_submitted.lt."{cursor_date}",'
+                f'and(date_submitted.eq."{cursor_date}",request_id.lt."{cursor_id}")'
+            )
+
+        # Fetch one extra row to know whether another page exists
+        response = query.order('date_submitted', desc=True).order('request_id', desc=True).limit(page_size + 1).execute()
+        rows = response.data
+
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            next_cursor = (rows[-1]['date_submitted'], rows[-1]['request_id'])
+        return rows, next_cursor
+    except Exception as e:
+        print(f"Error fetching requests page: {e}")
+        increment('backend_query_errors_total', backend='supabase', table='requests_page')
+        return [], None
+
+@timed('backend_query', backend='supabase', table='request_id_search')
+def search_request_ids(prefix="", limit=20):
+    """Find request IDs starting with prefix (newest first when prefix is empty)"""
+    prefix = (prefix or "").strip().upper()
+    try:
+        query = supabase.table('citizen_requests').select('request_id')
+        if prefix:
+            query = query.like('request_id', f'{prefix}*').order('request_id')
+        else:
+            query = query.order('date_submitted', desc=True)
+        response = query.limit(limit).execute()
+        return [row['request_id'] for row in response.data]
     except Exception as e:
-        print(f"Error fetching health data: {e}")
+        print(f"Error searching request IDs: {e}")
+        increment('backend_query_errors_total', backend='supabase', table='request_id_search')
         return []
 
-def get_request_by_id(request_id):
-    """Fetch specific request by ID"""
+@timed('backend_query', backend='supabase', table='request_search')
+def search_requests(query, filters=None, limit=20):
+    """Ranked full-text search over descriptions via the search_citizen_requests RPC"""
+    filters = filters or {}
+
+    def as_list(values):
+        if not values:
+            return None
+        return [values] if isinstance(values, str) else list(values)
+
+    params = {
+        "search_query": query,
+        "filter_city": as_list(filters.get('city')),
+        "filter_ward": as_list(filters.get('ward')),
+        "filter_severity": as_list(filters.get('severity')),
+        "filter_status": as_list(filters.get('status')),
+        "filter_department": as_list(filters.get('department')),
+        "date_from": str(filters['date_from']) if filters.get('date_from') else None,
+        # Inclusive end date: everything before the following midnight
+        "date_to": (datetime.fromisoformat(str(filters['date_to'])) + timedelta(days=1)).date().isoformat()
+                   if filters.get('date_to') else None,
+        "result_limit": limit
+    }
+
     try:
-        response = supabase.table('citizen_requests').select('*').eq('request_id', request_id).maybeSingle().execute()
+        response = supabase.rpc('search_citizen_requests', params).execute()
         return response.data
     except Exception as e:
-        print(f"Error fetching request: {e}")
-        return None
+        print(f"Error searching requests: {e}")
+        increment('backend_query_errors_total', backend='supabase', table='request_search')
+        return []
 
+@timed('backend_insert', backend='supabase', table='citizen_requests')
 def insert_citizen_request(request_data):
     """Insert new citizen request"""
     try:
@@ -86,17 +319,24 @@ def insert_citizen_request(request_data):
         return True
     except Exception as e:
         print(f"Error inserting request: {e}")
+        increment('backend_insert_errors_total', backend='supabase', table='citizen_requests')
         return False
 
+@timed('backend_insert', backend='supabase', table='predictions_log')
 def save_prediction_log(prediction_data):
     """Save AI prediction to database"""
+    # Timestamps go over the wire as ISO-8601 strings
+    prediction_data = {key: value.isoformat() if isinstance(value, datetime) else value
+                       for key, value in prediction_data.items()}
     try:
         response = supabase.table('predictions_log').insert(prediction_data).execute()
         return True
     except Exception as e:
         print(f"Error saving prediction: {e}")
+        increment('backend_insert_errors_total', backend='supabase', table='predictions_log')
         return False
 
+@timed('backend_insert', backend='supabase', table='audit_logs')
 def save_audit_log(log_data):
     """Save action to audit log"""
     try:
@@ -104,11 +344,50 @@ def save_audit_log(log_data):
         return True
     except Exception as e:
         print(f"Error saving audit log: {e}")
+        increment('backend_insert_errors_total', backend='supabase', table='audit_logs')
         return False
 
+@timed('backend_query', backend='supabase', table='log_rows')
+def fetch_log_rows(table, start=None, end=None, raise_errors=False):
+    """Rows of a log table (audit_logs, predictions_log) with start <= timestamp < end"""
+    column = PARTITION_COLUMNS[table][0]
+    filters = []
+    if start:
+        filters.append((column, '>=', start))
+    if end:
+        filters.append((column, '<', end))
+    spec = QuerySpec(table, filters=filters, order_by=column, descending=False)
+    try:
+        df, report = fetch_paged(spec, client=service_supabase)
+        if report['failed_pages']:
+            raise RuntimeError(f"{len(report['failed_pages'])} pages of {table} failed to load")
+        return df
+    except Exception as e:
+        print(f"Error fetching {table} rows: {e}")
+        increment('backend_query_errors_total', backend='supabase', table=table)
+        if raise_errors:
+            raise
+        return pd.DataFrame()
+
+@timed('backend_delete', backend='supabase', table='log_rows')
+def delete_log_rows(table, before):
+    """
+    Delete the rows of a log table older than before; returns the number
+    deleted. Needs SUPABASE_SERVICE_ROLE_KEY: under RLS the anon key
+    deletes nothing without an error.
+    """
+    if service_supabase is None:
+        raise RuntimeError("Deleting log rows needs SUPABASE_SERVICE_ROLE_KEY")
+    column = PARTITION_COLUMNS[table][0]
+    response = service_supabase.table(table).delete().lt(column, before.isoformat()).execute()
+    return len(response.data or [])
+
 # AI Functions
 def analyze_complaint_with_gemini(complaint_data):
     """Use Gemini AI to analyze complaint"""
+    if ANALYSIS_MODE == 'compact':
+        return analyze_compact(gemini_model, complaint_data, get_fallback_prediction)
+
     prompt = f"""
 You are an advanced AI system for Maharashtra Government's predictive governance platform.
 
@@ -143,13 +422,34 @@ Response must be valid JSON only.
 """
 
     try:
-        response = gemini_model.generate_content(prompt, generation_config={"temperature": 0.7})
-        result_text = response.text.replace('```json', '').replace('```', '').strip()
-        return json.loads(result_text)
+        result_text = generate_text(gemini_model, 'analyze_complaint', prompt, {"temperature": 0.7},
+                                    priority=priority_for(complaint_data.get('severity')))
+        prediction = complete_prediction(expand_fields(salvage_json(result_text), VERBOSE_FIELDS),
+                                         get_fallback_prediction(complaint_data), VERBOSE_FIELDS)
+        return prediction
     except Exception as e:
         print(f"Gemini error: {e}")
+        increment('gemini_fallback_total', operation='analyze_complaint', reason=fallback_reason(e))
         return get_fallback_prediction(complaint_data)
 
+def explain_complaint_with_gemini(complaint_data, prediction):
+    """Narrative fields of a compact analysis, fetched when an officer opens them"""
+    return explain_compact(gemini_model, complaint_data, prediction)
+
+def stream_complaint_analysis(complaint_data):
+    """
+    Streamed analyze_complaint_with_gemini: yields the fields parsed so
+    far, and last the complete prediction (verbose mode yields it once)
+    """
+    if ANALYSIS_MODE == 'compact':
+        yield from stream_compact(gemini_model, complaint_data, get_fallback_prediction)
+    else:
+        yield analyze_complaint_with_gemini(complaint_data)
+
+def stream_complaint_details(complaint_data, prediction):
+    """Streamed explain_complaint_with_gemini: narrative fields as they are written, and last the complete set"""
+    yield from stream_details(gemini_model, complaint_data, prediction)
+
 def forecast_demand_with_gemini(historical_data):
     """Use Gemini to forecast service demand"""
     if not historical_data:
@@ -187,11 +487,12 @@ JSON only.
 """
 
     try:
-        response = gemini_model.generate_content(prompt, generation_config={"temperature": 0.7})
-        result_text = response.text.replace('```json', '').replace('```', '').strip()
-        return json.loads(result_text)
+        result_text = generate_text(gemini_model, 'forecast_demand', prompt, {"temperature": 0.7},
+                                    priority=PRIORITY_FORECAST)
+        return salvage_json(result_text)
     except Exception as e:
         print(f"Forecast error: {e}")
+        increment('gemini_fallback_total', operation='forecast_demand', reason=fallback_reason(e))
         return get_fallback_forecast()
 
 def get_fallback_prediction(complaint_data):
@@ -212,7 +513,8 @@ def get_fallback_prediction(complaint_data):
         "similar_patterns": "Analysis based on severity and affected population",
         "prevention_measures": "Regular maintenance recommended",
         "impact_analysis": f"Affects {affected} citizens",
-        "reasoning": f"Based on {severity} severity and {affected} affected citizens"
+        "reasoning": f"Based on {severity} severity and {affected} affected citizens",
+        "source": "rules"
     }
 
 def get_fallback_forecast():
@@ -248,11 +550,12 @@ def calculate_priority_score(complaint_data):
 
     # Calculate days open
     date_submitted = complaint_data.get('date_submitted')
-    if isinstance(date_submitted, str):
-        from dateutil import parser
-        date_submitted = parser.parse(date_submitted)
+    if date_submitted is not None:
+        date_submitted = pd.Timestamp(date_submitted)
+        if date_submitted.tzinfo is not None:
+            date_submitted = date_submitted.tz_convert(None)
 
-    days_open = (datetime.now() - date_submitted.replace(tzinfo=None)).days if date_submitted else 0
+    days_open = (pd.Timestamp.now() - date_submitted).days if date_submitted is not None else 0
     time_factor = min(days_open * 0.5, 3)
 
     return round(base_score + citizen_factor + time_factor, 2)
@@ -284,23 +587,12 @@ def check_data_compliance():
         "network_security": "SSL/TLS Protection Active"
     }
 
-def get_statistics_summary():
-    """Get overall statistics"""
+def get_statistics_summary(requests=None):
+    """Get overall statistics (from already loaded rows or a typed frame when given)"""
     try:
-        requests = fetch_citizen_requests()
-        if not requests:
-            return {}
-
-        total_requests = len(requests)
-        open_requests = len([r for r in requests if r['status'] == 'Open'])
-        critical_requests = len([r for r in requests if r['severity'] == 'Critical'])
-        total_affected = sum(r['affected_count'] for r in requests)
-
-        return {
-            "total_requests": total_requests,
-            "open_requests": open_requests,
-            "critical_requests": critical_requests,
-            "total_affected": total_affected
-        }
-    except:
+        if requests is None:
+            requests = fetch_citizen_requests()
+        return request_statistics(typed_frame(requests))
+    except Exception as e:
+        print(f"Error computing statistics: {e}")
         return {}
@@ -0,0 +1,60 @@
+"""
+Routing scheduler checks for Maharashtra Governance Platform
+
+Usage:
+    python -m pytest -q test_routing_helpers.py
+"""
+
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from routing_helpers import RoutingScheduler
+
+
+def _requests(count=100):
+    start = datetime(2026, 1, 1)
+    rows = []
+    for i in range(count):
+        resolved = i % 2 == 0
+        rows.append({
+            'request_id': f"REQ{i:04d}",
+            'complaint_type': 'Water Supply',
+            'city': 'Pune',
+            'ward': f"Ward {i % 20 + 1}",
+            'severity': 'High',
+            'status': 'Resolved' if resolved else 'Open',
+            'affected_count': 10,
+            'date_submitted': start + timedelta(hours=i),
+            'resolved_date': start + timedelta(hours=i, days=3) if resolved else None
+        })
+    return pd.DataFrame(rows)
+
+
+def _counts(scheduler):
+    return (scheduler._arrival_count, int(scheduler.team_loads()['resolved'].sum()),
+            len(scheduler), scheduler.observed_arrival_rate())
+
+
+def test_resync_under_new_version_does_not_recount():
+    scheduler = RoutingScheduler()
+    frame = _requests()
+    scheduler.sync(frame, version=1)
+    first = _counts(scheduler)
+    assert first[:3] == (100, 50, 50)
+
+    for version in range(2, 6):
+        scheduler.sync(frame, version=version)
+    assert _counts(scheduler) == first
+
+
+def test_resolution_between_snapshots_counts_once():
+    scheduler = RoutingScheduler()
+    frame = _requests()
+    scheduler.sync(frame, version=1)
+
+    frame.loc[1, ['status', 'resolved_date']] = ['Resolved', datetime(2026, 1, 5)]
+    scheduler.sync(frame, version=2)
+    scheduler.sync(frame, version=3)
+    arrivals, resolved, open_requests, _ = _counts(scheduler)
+    assert (arrivals, resolved, open_requests) == (100, 51, 49)
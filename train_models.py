@@ -0,0 +1,63 @@
+"""
+Train the request models for Maharashtra Governance Platform
+
+Fetches citizen_requests and predictions_log history from the backend,
+fits the resolution-time and escalation models (model_helpers), prints
+their hold-out errors next to the rule model's, and saves them for the
+app. The app picks up a newly saved file on its next rerun.
+
+Usage:
+    python train_models.py [--backend bigquery|supabase] [--days 365] [--output ./models/request_models.npz]
+"""
+
+import time
+import argparse
+from datetime import datetime, timedelta
+
+from query_helpers import QuerySpec
+from model_helpers import train_models, MODEL_PATH
+
+TRAINING_COLUMNS = ['request_id', 'complaint_type', 'city', 'severity', 'status', 'affected_count', 'department',
+                    'date_submitted', 'resolved_date']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train resolution-time and escalation models on request history")
+    parser.add_argument('--backend', choices=['bigquery', 'supabase'], default='bigquery')
+    parser.add_argument('--days', type=int, default=365, help="days of history to train on")
+    parser.add_argument('--output', default=MODEL_PATH)
+    args = parser.parse_args()
+
+    if args.backend == 'supabase':
+        from supabase_helpers import fetch_query, fetch_log_rows
+    else:
+        from utils_helpers import fetch_query, fetch_log_rows
+
+    print(f"📥 Fetching {args.days} days of history from {args.backend}...")
+    requests = fetch_query(QuerySpec('citizen_requests', columns=TRAINING_COLUMNS, lookback_days=args.days,
+                                     name='training_requests'), raise_errors=True)
+    predictions = fetch_log_rows('predictions_log', start=datetime.now() - timedelta(days=args.days),
+                                 raise_errors=True)
+    print(f"   {len(requests):,} requests, {len(predictions):,} logged predictions")
+
+    started = time.perf_counter()
+    models, report = train_models(requests, predictions)
+    print(f"\n🧮 Trained in {(time.perf_counter() - started) * 1000:.0f} ms on {models.metadata['resolved']:,} resolved "
+          f"and {models.metadata['labelled']:,} labelled requests")
+
+    if 'resolution_mae_days' in report:
+        print(f"   Resolution time MAE: {report['resolution_mae_days']} days "
+              f"(rules: {report['rules_resolution_mae_days']})")
+    if 'escalation_brier' in report:
+        print(f"   Escalation Brier score: {report['escalation_brier']} (rules: {report['rules_escalation_brier']})")
+
+    started = time.perf_counter()
+    models.predict(requests)
+    print(f"   Batch prediction: {len(requests):,} requests in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    size = models.save(args.output)
+    print(f"\n✅ Saved {args.output} ({size / 1024:.1f} KB)")
+
+
+if __name__ == "__main__":
+    main()
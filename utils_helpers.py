@@ -7,6 +7,13 @@ import hashlib
 from datetime import datetime
 import pandas as pd
 import json
+from metrics_helpers import timed, span, increment
+from query_helpers import lookback_start, PARTITION_COLUMNS
+from gemini_helpers import generate_text, fallback_reason, priority_for, PRIORITY_FORECAST
+from structured_helpers import (analyze_compact, explain_compact, stream_compact, stream_details, salvage_json,
+                                expand_fields, complete_prediction, VERBOSE_FIELDS, ANALYSIS_MODE)
+from replay_helpers import gemini_client
+from cascade_helpers import get_fallback_prediction
 
 # Load environment variables (for local dev)
 load_dotenv()
@@ -83,14 +90,18 @@ def initialize_services():
 bigquery_client, project_id = initialize_services()
 
 # Initialize Gemini model
-gemini_model = genai.GenerativeModel('gemini-1.5-flash')
+gemini_model = gemini_client(genai.GenerativeModel('gemini-1.5-flash'))
 print("✅ Gemini 1.5 Flash model ready")
 
 
 # ==================== BIGQUERY FUNCTIONS ====================
 
-def fetch_citizen_requests():
-    """Fetch all citizen requests from BigQuery"""
+@timed('backend_query', backend='bigquery', table='citizen_requests')
+def fetch_citizen_requests(raise_errors=False):
+    """
+    Fetch citizen requests from BigQuery: the DATA_LOOKBACK_DAYS partitions
+    plus unresolved requests of any age
+    """
     query = f"""
     SELECT 
         request_id,
@@ -110,20 +121,28 @@ def fetch_citizen_requests():
         priority_score,
         resolved_date
     FROM `{project_id}.governance_data.citizen_requests`
+    WHERE date_submitted >= @lookback_start OR status != 'Resolved'
     ORDER BY date_submitted DESC
     """
+    job_config = bigquery.QueryJobConfig(query_parameters=[
+        bigquery.ScalarQueryParameter('lookback_start', 'TIMESTAMP', lookback_start('citizen_requests'))
+    ])
     
     try:
-        df = bigquery_client.query(query).to_dataframe()
+        df = bigquery_client.query(query, job_config=job_config).to_dataframe()
         df['date_submitted'] = pd.to_datetime(df['date_submitted']).dt.tz_localize(None)
         if 'resolved_date' in df.columns:
             df['resolved_date'] = pd.to_datetime(df['resolved_date']).dt.tz_localize(None)
         return df
     except Exception as e:
         print(f"Error fetching citizen requests: {e}")
+        increment('backend_query_errors_total', backend='bigquery', table='citizen_requests')
+        if raise_errors:
+            raise
         return pd.DataFrame()
 
-def fetch_infrastructure_assets():
+@timed('backend_query', backend='bigquery', table='infrastructure_assets')
+def fetch_infrastructure_assets(raise_errors=False):
     """Fetch infrastructure data from BigQuery"""
     query = f"""
     SELECT *
@@ -136,40 +155,200 @@ def fetch_infrastructure_assets():
         return df
     except Exception as e:
         print(f"Error fetching infrastructure: {e}")
+        increment('backend_query_errors_total', backend='bigquery', table='infrastructure_assets')
+        if raise_errors:
+            raise
         return pd.DataFrame()
 
-def fetch_health_surveillance():
-    """Fetch health surveillance data from BigQuery"""
+@timed('backend_query', backend='bigquery', table='health_surveillance')
+def fetch_health_surveillance(raise_errors=False):
+    """Fetch health surveillance data from BigQuery (the DATA_LOOKBACK_DAYS partitions)"""
     query = f"""
     SELECT *
     FROM `{project_id}.governance_data.health_surveillance`
+    WHERE date_reported >= @lookback_start
     ORDER BY date_reported DESC
     """
+    job_config = bigquery.QueryJobConfig(query_parameters=[
+        bigquery.ScalarQueryParameter('lookback_start', 'DATE', lookback_start('health_surveillance'))
+    ])
     
     try:
-        df = bigquery_client.query(query).to_dataframe()
+        df = bigquery_client.query(query, job_config=job_config).to_dataframe()
         return df
     except Exception as e:
         print(f"Error fetching health data: {e}")
+        increment('backend_query_errors_total', backend='bigquery', table='health_surveillance')
+        if raise_errors:
+            raise
         return pd.DataFrame()
 
+def fetch_query(spec, raise_errors=False):
+    """
+    Run a page's QuerySpec in BigQuery: only the declared columns are
+    scanned and the filters, ordering and limit run in SQL
+    """
+    sql, params = spec.to_sql(f"{project_id}.governance_data.{spec.table}")
+    job_config = bigquery.QueryJobConfig(query_parameters=[
+        bigquery.ArrayQueryParameter(p['name'], p['type'], p['value']) if p['array']
+        else bigquery.ScalarQueryParameter(p['name'], p['type'], p['value'])
+        for p in params
+    ])
+    
+    with span('backend_query', backend='bigquery', table=spec.name):
+        try:
+            df = bigquery_client.query(sql, job_config=job_config).to_dataframe()
+            return df
+        except Exception as e:
+            print(f"Error running query {spec.name}: {e}")
+            increment('backend_query_errors_total', backend='bigquery', table=spec.name)
+            if raise_errors:
+                raise
+            return pd.DataFrame()
+
+@timed('backend_query', backend='bigquery', table='request_by_id')
 def get_request_by_id(request_id):
-    """Fetch specific request by ID"""
+    """
+    Fetch specific request by ID. Looks in the DATA_LOOKBACK_DAYS partitions
+    first and only scans the older ones when the request is not there, so
+    no partition is read twice.
+    """
     query = f"""
     SELECT *
     FROM `{project_id}.governance_data.citizen_requests`
-    WHERE request_id = '{request_id}'
+    WHERE request_id = @request_id
+      AND date_submitted {{}} @lookback_start
     """
     
     try:
-        df = bigquery_client.query(query).to_dataframe()
-        if len(df) > 0:
-            return df.iloc[0].to_dict()
+        job_config = bigquery.QueryJobConfig(query_parameters=[
+            bigquery.ScalarQueryParameter('request_id', 'STRING', request_id),
+            bigquery.ScalarQueryParameter('lookback_start', 'TIMESTAMP', lookback_start('citizen_requests'))
+        ])
+        for comparison in ['>=', '<']:
+            df = bigquery_client.query(query.format(comparison), job_config=job_config).to_dataframe()
+            if len(df) > 0:
+                return df.iloc[0].to_dict()
         return None
     except Exception as e:
         print(f"Error fetching request: {e}")
+        increment('backend_query_errors_total', backend='bigquery', table='request_by_id')
         return None
 
+# Columns shown in the paginated request browser (no hashes or descriptions)
+REQUEST_BROWSER_COLUMNS = [
+    'request_id', 'complaint_type', 'city', 'ward', 'severity', 'status',
+    'affected_count', 'department', 'date_submitted'
+]
+
+def _build_request_filters(filters):
+    """
+    Turn a filters dict into SQL WHERE clauses and BigQuery query parameters.
+    Supported keys: city, ward, severity, status, department (value or list),
+    date_from and date_to (dates, inclusive). Without date_from only the
+    DATA_LOOKBACK_DAYS partitions are scanned.
+    """
+    clauses = []
+    params = []
+    
+    for column in ['city', 'ward', 'severity', 'status', 'department']:
+        values = (filters or {}).get(column)
+        if not values:
+            continue
+        if isinstance(values, str):
+            values = [values]
+        clauses.append(f"{column} IN UNNEST(@{column}_values)")
+        params.append(bigquery.ArrayQueryParameter(f"{column}_values", 'STRING', list(values)))
+    
+    date_from = (filters or {}).get('date_from') or lookback_start('citizen_requests')
+    clauses.append("date_submitted >= @date_from")
+    params.append(bigquery.ScalarQueryParameter('date_from', 'TIMESTAMP', pd.Timestamp(date_from).to_pydatetime()))
+    
+    date_to = (filters or {}).get('date_to')
+    if date_to:
+        # Inclusive end date: everything before the following midnight
+        clauses.append("date_submitted < @date_to")
+        params.append(bigquery.ScalarQueryParameter('date_to', 'TIMESTAMP',
+                                                    (pd.Timestamp(date_to) + pd.Timedelta(days=1)).to_pydatetime()))
+    
+    return clauses, params
+
+@timed('backend_query', backend='bigquery', table='requests_page')
+def fetch_requests_page(filters=None, cursor=None, page_size=25):
+    """
+    Fetch one page of citizen requests, newest first, with server-side filters.
+    
+    Uses keyset pagination on (date_submitted, request_id): cursor is the
+    (date_submitted, request_id) of the last row of the previous page.
+    Returns (DataFrame, next_cursor); next_cursor is None on the last page.
+    """
+    clauses, params = _build_request_filters(filters)
+    
+    if cursor:
+        cursor_date, cursor_id = cursor
+        clauses.append("(date_submitted < @cursor_date OR (date_submitted = @cursor_date AND request_id < @cursor_id))")
+        params.append(bigquery.ScalarQueryParameter('cursor_date', 'TIMESTAMP', pd.Timestamp(cursor_date).to_pydatetime()))
+        params.append(bigquery.ScalarQueryParameter('cursor_id', 'STRING', cursor_id))
+    
+    # Fetch one extra row to know whether another page exists
+    params.append(bigquery.ScalarQueryParameter('page_limit', 'INT64', page_size + 1))
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    
+    query = f"""
+    SELECT {', '.join(REQUEST_BROWSER_COLUMNS)}
+    FROM `{project_id}.governance_data.citizen_requests`
+    {where}
+    ORDER BY date_submitted DESC, request_id DESC
+    LIMIT @page_limit
+    """
+    
+    try:
+        job_config = bigquery.QueryJobConfig(query_parameters=params)
+        df = bigquery_client.query(query, job_config=job_config).to_dataframe()
+        df['date_submitted'] = pd.to_datetime(df['date_submitted']).dt.tz_localize(None)
+        
+        next_cursor = None
+        if len(df) > page_size:
+            df = df.iloc[:page_size]
+            last = df.iloc[-1]
+            next_cursor = (last['date_submitted'], last['request_id'])
+        return df, next_cursor
+    except Exception as e:
+        print(f"Error fetching requests page: {e}")
+        increment('backend_query_errors_total', backend='bigquery', table='requests_page')
+        return pd.DataFrame(columns=REQUEST_BROWSER_COLUMNS), None
+
+@timed('backend_query', backend='bigquery', table='request_id_search')
+def search_request_ids(prefix="", limit=20):
+    """
+    Find request IDs starting with prefix (newest first when prefix is
+    empty) among the DATA_LOOKBACK_DAYS partitions
+    """
+    prefix = (prefix or "").strip().upper()
+    order = "request_id" if prefix else "date_submitted DESC"
+    query = f"""
+    SELECT request_id
+    FROM `{project_id}.governance_data.citizen_requests`
+    WHERE STARTS_WITH(request_id, @prefix)
+      AND date_submitted >= @lookback_start
+    ORDER BY {order}
+    LIMIT @limit
+    """
+    job_config = bigquery.QueryJobConfig(query_parameters=[
+        bigquery.ScalarQueryParameter('prefix', 'STRING', prefix),
+        bigquery.ScalarQueryParameter('lookback_start', 'TIMESTAMP', lookback_start('citizen_requests')),
+        bigquery.ScalarQueryParameter('limit', 'INT64', limit)
+    ])
+    
+    try:
+        df = bigquery_client.query(query, job_config=job_config).to_dataframe()
+        return df['request_id'].tolist()
+    except Exception as e:
+        print(f"Error searching request IDs: {e}")
+        increment('backend_query_errors_total', backend='bigquery', table='request_id_search')
+        return []
+
+@timed('backend_insert', backend='bigquery', table='citizen_requests')
 def insert_citizen_request(request_data):
     """Insert new citizen request into BigQuery"""
     table_id = f"{project_id}.governance_data.citizen_requests"
@@ -183,8 +362,10 @@ def insert_citizen_request(request_data):
         return True
     except Exception as e:
         print(f"Error inserting request: {e}")
+        increment('backend_insert_errors_total', backend='bigquery', table='citizen_requests')
         return False
 
+@timed('backend_insert', backend='bigquery', table='predictions_log')
 def save_prediction_log(prediction_data):
     """Save AI prediction to BigQuery for audit"""
     table_id = f"{project_id}.governance_data.predictions_log"
@@ -197,8 +378,10 @@ def save_prediction_log(prediction_data):
         return True
     except Exception as e:
         print(f"Error saving prediction: {e}")
+        increment('backend_insert_errors_total', backend='bigquery', table='predictions_log')
         return False
 
+@timed('backend_insert', backend='bigquery', table='audit_logs')
 def save_audit_log(log_data):
     """Save action to audit log"""
     table_id = f"{project_id}.governance_data.audit_logs"
@@ -211,14 +394,62 @@ def save_audit_log(log_data):
         return True
     except Exception as e:
         print(f"Error saving audit log: {e}")
+        increment('backend_insert_errors_total', backend='bigquery', table='audit_logs')
         return False
 
+@timed('backend_query', backend='bigquery', table='log_rows')
+def fetch_log_rows(table, start=None, end=None, raise_errors=False):
+    """
+    Rows of a log table (audit_logs, predictions_log) with
+    start <= timestamp < end, reading only those partitions
+    """
+    column = PARTITION_COLUMNS[table][0]
+    query = f"""
+    SELECT *
+    FROM `{project_id}.governance_data.{table}`
+    WHERE {column} >= @start
+      AND {column} < @end
+    """
+    job_config = bigquery.QueryJobConfig(query_parameters=[
+        bigquery.ScalarQueryParameter('start', 'TIMESTAMP', start or datetime(1970, 1, 1)),
+        bigquery.ScalarQueryParameter('end', 'TIMESTAMP', end or datetime(9999, 1, 1))
+    ])
+    
+    try:
+        df = bigquery_client.query(query, job_config=job_config).to_dataframe()
+        df[column] = pd.to_datetime(df[column]).dt.tz_localize(None)
+        return df
+    except Exception as e:
+        print(f"Error fetching {table} rows: {e}")
+        increment('backend_query_errors_total', backend='bigquery', table=table)
+        if raise_errors:
+            raise
+        return pd.DataFrame()
+
+@timed('backend_delete', backend='bigquery', table='log_rows')
+def delete_log_rows(table, before):
+    """Delete the rows of a log table older than before; returns the number deleted"""
+    column = PARTITION_COLUMNS[table][0]
+    query = f"""
+    DELETE FROM `{project_id}.governance_data.{table}`
+    WHERE {column} < @before
+    """
+    job_config = bigquery.QueryJobConfig(query_parameters=[
+        bigquery.ScalarQueryParameter('before', 'TIMESTAMP', before)
+    ])
+    job = bigquery_client.query(query, job_config=job_config)
+    job.result()
+    return job.num_dml_affected_rows or 0
+
 # ==================== GEMINI AI FUNCTIONS ====================
 
 def analyze_complaint_with_gemini(complaint_data):
     """
     Use Gemini AI to analyze complaint and predict urgency/priority
     """
+    if ANALYSIS_MODE == 'compact':
+        # Five short-coded fields; the narrative ones come from explain_complaint_with_gemini
+        return analyze_compact(gemini_model, complaint_data, get_fallback_prediction)
     
     prompt = f"""
 You are an advanced AI system for Maharashtra Government's predictive governance platform.
@@ -270,57 +501,43 @@ Provide a comprehensive predictive analysis in this EXACT JSON format:
             "max_output_tokens": 2048,
         }
         
-        response = gemini_model.generate_content(
-            prompt,
-            generation_config=generation_config
-        )
-        result_text = response.text
+        # Officers opening the same request at once share one upstream call
+        result_text = generate_text(gemini_model, 'analyze_complaint', prompt, generation_config,
+                                    priority=priority_for(complaint_data.get('severity')))
         
-        # Clean and parse JSON
-        clean_result = result_text.replace('```json', '').replace('```', '').strip()
-        prediction = json.loads(clean_result)
+        # Keep every field Gemini completed and fill the rest from the rules (a rule answer without the core fields)
+        prediction = complete_prediction(expand_fields(salvage_json(result_text), VERBOSE_FIELDS),
+                                         get_fallback_prediction(complaint_data), VERBOSE_FIELDS)
         
         return prediction
     
     except json.JSONDecodeError as e:
         print(f"JSON parsing error: {e}")
+        increment('gemini_fallback_total', operation='analyze_complaint', reason='parse_error')
         return get_fallback_prediction(complaint_data)
     
     except Exception as e:
         print(f"Gemini API error: {e}")
+        increment('gemini_fallback_total', operation='analyze_complaint', reason=fallback_reason(e))
         return get_fallback_prediction(complaint_data)
 
-def get_fallback_prediction(complaint_data):
-    """Generate a rule-based prediction when AI fails"""
-    severity = complaint_data.get('severity', 'Medium')
-    affected = complaint_data.get('affected_count', 0)
-    days_open = complaint_data.get('days_open', 0)
-    
-    # Calculate urgency score
-    severity_scores = {'Critical': 9.0, 'High': 7.0, 'Medium': 5.0, 'Low': 3.0}
-    base_score = severity_scores.get(severity, 5.0)
-    
-    # Add points for affected citizens and days open
-    urgency_score = min(base_score + (affected / 200) + (days_open * 0.1), 10.0)
-    
-    # Calculate escalation risk
-    escalation_risk = min(40 + (days_open * 2) + (affected / 20), 95)
-    
-    # Estimate resolution days
-    resolution_days = {'Critical': 2, 'High': 5, 'Medium': 7, 'Low': 10}.get(severity, 7)
-    
-    return {
-        "urgency_score": round(urgency_score, 1),
-        "escalation_risk_percent": int(escalation_risk),
-        "predicted_priority": severity,
-        "recommended_action": f"Assign to {complaint_data.get('department', 'relevant department')} immediately. Target resolution: {resolution_days} days.",
-        "estimated_resolution_days": resolution_days,
-        "resource_requirements": f"Deploy {2 if severity == 'Critical' else 1} team(s) with standard equipment and budget allocation.",
-        "similar_patterns": "Analysis based on severity level, affected population, and response time.",
-        "prevention_measures": "Regular infrastructure maintenance and proactive monitoring recommended.",
-        "impact_analysis": f"Affects {affected} citizens. Delayed resolution may increase public dissatisfaction.",
-        "reasoning": f"Based on {severity} severity level, {affected} affected citizens, and {days_open} days already open. Rule-based analysis applied."
-    }
+def explain_complaint_with_gemini(complaint_data, prediction):
+    """Narrative fields of a compact analysis, fetched when an officer opens them"""
+    return explain_compact(gemini_model, complaint_data, prediction)
+
+def stream_complaint_analysis(complaint_data):
+    """
+    Streamed analyze_complaint_with_gemini: yields the fields parsed so
+    far, and last the complete prediction (verbose mode yields it once)
+    """
+    if ANALYSIS_MODE == 'compact':
+        yield from stream_compact(gemini_model, complaint_data, get_fallback_prediction)
+    else:
+        yield analyze_complaint_with_gemini(complaint_data)
+
+def stream_complaint_details(complaint_data, prediction):
+    """Streamed explain_complaint_with_gemini: narrative fields as they are written, and last the complete set"""
+    yield from stream_details(gemini_model, complaint_data, prediction)
 
 def forecast_demand_with_gemini(historical_data):
     """
@@ -411,19 +628,17 @@ Response must be valid JSON only.
             "max_output_tokens": 2048,
         }
         
-        response = gemini_model.generate_content(
-            prompt,
-            generation_config=generation_config
-        )
-        result_text = response.text
+        result_text = generate_text(gemini_model, 'forecast_demand', prompt, generation_config,
+                                    priority=PRIORITY_FORECAST)
         
-        clean_result = result_text.replace('```json', '').replace('```', '').strip()
-        forecast = json.loads(clean_result)
+        # A truncated forecast keeps its complete sections
+        forecast = salvage_json(result_text)
         
         return forecast
     
     except Exception as e:
         print(f"Forecast error: {e}")
+        increment('gemini_fallback_total', operation='forecast_demand', reason=fallback_reason(e))
         return get_fallback_forecast(historical_data)
 
 def get_fallback_forecast(historical_data):
@@ -538,9 +753,10 @@ def calculate_priority_score(complaint_data):
     
     return round(total_score, 2)
 
-def get_statistics_summary():
-    """Get overall statistics"""
-    requests_df = fetch_citizen_requests()
+def get_statistics_summary(requests_df=None):
+    """Get overall statistics (from an already loaded frame when given)"""
+    if requests_df is None:
+        requests_df = fetch_citizen_requests()
     
     if requests_df.empty:
         return {}